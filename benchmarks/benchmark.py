@@ -0,0 +1,372 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import cv2
+import numpy as np
+
+# benchmark and regression suite of the pupil detection methods, outlineContrastConfidence and the calibration
+# helpers on synthetic eye images with known pupils (pp.syntheticEyes) at several resolutions.
+# reports frames/s, p50/p99 latency, peak memory and the error against the ground truth, and compares them to a
+# baseline, i.e. the stored results of a previous run:
+#
+#   python benchmarks/benchmark.py --output baseline.json
+#   python benchmarks/benchmark.py --baseline baseline.json
+#
+# the comparison exits with 1 if any metric regressed by more than its tolerance. each case runs in a fresh
+# process, so the peak memory of a case does not depend on the cases before it
+
+DETECTORS = ['ElSe', 'ExCuSe', 'PuRe', 'PuReST', 'Starburst', 'Swirski2D']
+CASES = DETECTORS + ['outlineContrastConfidence', 'SingleCalibration', 'StereoCalibration']
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 1024)]
+
+HIGHER = 1
+LOWER = -1
+
+# direction, whether the metric measures performance or accuracy, and the smallest change which counts as regression
+METRICS = {
+    'fps': (HIGHER, 'performance', 0.0),
+    'p50Ms': (LOWER, 'performance', 0.01),
+    'p99Ms': (LOWER, 'performance', 0.01),
+    'pupilsPerSecond': (HIGHER, 'performance', 0.0),
+    'peakMB': (LOWER, 'performance', 1.0),
+    'detected': (HIGHER, 'accuracy', 0.01),
+    'hitRate': (HIGHER, 'accuracy', 0.01),
+    'centerError': (LOWER, 'accuracy', 0.01),
+    'diameterError': (LOWER, 'accuracy', 0.001),
+    'confidence': (HIGHER, 'accuracy', 0.01),
+    'maxError': (LOWER, 'accuracy', 1e-6),
+}
+
+
+def runCase(name, size, frames=100, seed=0):
+    # metrics of one case at resolution size (width, height), run in the calling process
+    import pypupilext as pp
+
+    if name in DETECTORS:
+        return _detectorCase(pp, name, size, frames, seed)
+    if name == 'outlineContrastConfidence':
+        return _confidenceCase(pp, size, frames, seed)
+    if name == 'SingleCalibration':
+        return _singleCalibrationCase(pp, size, frames)
+    if name == 'StereoCalibration':
+        return _stereoCalibrationCase(pp, size, frames)
+    raise ValueError('unknown case %s, expected one of %s' % (name, ', '.join(CASES)))
+
+
+def runSuite(cases=CASES, resolutions=RESOLUTIONS, frames=100, seed=0, log=print):
+    # results of all cases at all resolutions, keyed by "case@WIDTHxHEIGHT"
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for size in resolutions:
+        for name in cases:
+            key = caseKey(name, size)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[key] = executor.submit(runCase, name, size, frames, seed).result()
+            if log:
+                log(formatMetrics(key, results[key]))
+
+    meta = {
+        'frames': frames,
+        'seed': seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    return {'meta': meta, 'results': results}
+
+
+def compare(results, baseline, tolerance=0.15, accuracy_tolerance=0.02):
+    # regressions of results against baseline as (case, metric, baseline value, value). a metric regressed if it is
+    # worse than in the baseline by more than tolerance (performance) or accuracy_tolerance (accuracy) relative to
+    # the baseline value, and by more than the smallest change of the metric
+    regressions = []
+    for key, metrics in results['results'].items():
+        reference = baseline['results'].get(key)
+        if reference is None:
+            continue
+        for metric, value in metrics.items():
+            if metric not in METRICS or reference.get(metric) is None or value is None:
+                continue
+            direction, kind, floor = METRICS[metric]
+            old = reference[metric]
+            allowed = max((tolerance if kind == 'performance' else accuracy_tolerance) * abs(old), floor)
+            if direction * (old - value) > allowed:
+                regressions.append((key, metric, old, value))
+    return regressions
+
+
+def caseKey(name, size):
+    return '%s@%dx%d' % (name, size[0], size[1])
+
+
+def formatMetrics(key, metrics):
+    return '%-36s %s' % (key, '  '.join('%s=%.4g' % (metric, value) for metric, value in metrics.items() if value is not None))
+
+
+def _detectorCase(pp, name, size, frames, seed):
+    images, truths = _dataset(pp, size, frames, seed)
+    # peak memory includes the buffers of the detector, but not the images
+    before = _resetPeakMemory()
+    detector = getattr(pp, name)()
+    if name == 'Swirski2D':
+        # the pupil radius range is given in pixels, set to the range of the synthetic pupils
+        detector.params.Radius_Min = int(0.06 * min(size))
+        detector.params.Radius_Max = int(np.ceil(0.15 * min(size)))
+        # a fixed RANSAC seed keeps the accuracy comparable between runs
+        detector.params.Seed = 0
+    # the first call allocates the buffers of the detector, it is neither timed nor part of the results
+    detector.runWithConfidence(images[0])
+    if hasattr(detector, 'reset'):
+        detector.reset()
+
+    durations = []
+    pupils = []
+    for image in images:
+        start = time.perf_counter()
+        pupils.append(detector.runWithConfidence(image))
+        durations.append(time.perf_counter() - start)
+    peak = _peakMemory()
+
+    metrics = _timing(durations)
+    metrics['peakMB'] = (peak - before) / 2 ** 20
+    metrics.update(pp.pupilAccuracy(pupils, truths))
+    return metrics
+
+
+def _confidenceCase(pp, size, frames, seed):
+    # outline contrast confidence of the ground truth pupils, which should be close to 1
+    images, truths = _dataset(pp, size, frames, seed)
+    pupils = [_pupil(pp, truth) for truth in truths]
+
+    before = _resetPeakMemory()
+    durations = []
+    confidences = []
+    for image, pupil in zip(images, pupils):
+        start = time.perf_counter()
+        confidences.append(pp.PupilDetectionMethod.outlineContrastConfidence(image, pupil, 5))
+        durations.append(time.perf_counter() - start)
+    peak = _peakMemory()
+
+    metrics = _timing(durations)
+    metrics['peakMB'] = (peak - before) / 2 ** 20
+    metrics['confidence'] = float(np.mean(confidences))
+    return metrics
+
+
+def _singleCalibrationCase(pp, size, frames):
+    # undistortion of images and of pupil sizes, maxError is the largest difference between the array and the
+    # per pupil versions of the pupil size undistortion
+    image = next(pp.syntheticEyes(1, size))[0]
+    centers, sizes = _pupilArrays(size, 1000 * frames)
+
+    before = _resetPeakMemory()
+    with tempfile.TemporaryDirectory() as directory:
+        path = _writeCalibration(os.path.join(directory, 'single.xml'), size, stereo=False)
+        calibration = pp.SingleCalibration(path, verbose=False)
+
+    durations = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        calibration.undistortImage(image)
+        durations.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    diameters = calibration.undistortPupilSizeArray(centers, sizes)
+    arrayDuration = time.perf_counter() - start
+    peak = _peakMemory()
+
+    single = [calibration.undistortPupilSize(_pupil(pp, (center, axes, 0.0))) for center, axes in zip(centers[:frames], sizes[:frames])]
+
+    metrics = _timing(durations)
+    metrics['pupilsPerSecond'] = len(centers) / arrayDuration
+    metrics['peakMB'] = (peak - before) / 2 ** 20
+    metrics['maxError'] = float(np.max(np.abs(diameters[:frames] - np.asarray(single))))
+    return metrics
+
+
+def _stereoCalibrationCase(pp, size, frames):
+    # rectification of image pairs and triangulation of pupil sizes, maxError is the largest difference between
+    # the array and the per pupil versions of the triangulation
+    image = next(pp.syntheticEyes(1, size))[0]
+    centers, sizes = _pupilArrays(size, 1000 * frames)
+    # the pupil seen by the secondary camera, shifted by the disparity of the stereo setup
+    centersSecondary = centers - np.float32([0.05 * size[0], 0])
+
+    before = _resetPeakMemory()
+    with tempfile.TemporaryDirectory() as directory:
+        path = _writeCalibration(os.path.join(directory, 'stereo.xml'), size, stereo=True)
+        calibration = pp.StereoCalibration(path, verbose=False)
+
+    durations = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        calibration.undistortImages(image, image)
+        durations.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    diameters = calibration.triangulatePupilSizeArray(centers, sizes, centersSecondary, sizes)
+    arrayDuration = time.perf_counter() - start
+    peak = _peakMemory()
+
+    single = [calibration.triangulatePupilSize(_pupil(pp, (center, axes, 0.0)), _pupil(pp, (centerSecondary, axes, 0.0)))
+              for center, centerSecondary, axes in zip(centers[:frames], centersSecondary[:frames], sizes[:frames])]
+
+    metrics = _timing(durations)
+    metrics['pupilsPerSecond'] = len(centers) / arrayDuration
+    metrics['peakMB'] = (peak - before) / 2 ** 20
+    metrics['maxError'] = float(np.max(np.abs(diameters[:frames] - np.asarray(single))))
+    return metrics
+
+
+def _dataset(pp, size, frames, seed):
+    images = []
+    truths = []
+    for image, truth in pp.syntheticEyes(frames, size, seed=seed):
+        images.append(image)
+        truths.append(truth)
+    return images, truths
+
+
+def _pupil(pp, truth):
+    center, axes, angle = truth
+    pupil = pp.Pupil()
+    pupil.center = (float(center[0]), float(center[1]))
+    pupil.size = (float(axes[0]), float(axes[1]))
+    pupil.angle = float(angle)
+    return pupil
+
+
+def _pupilArrays(size, count):
+    rng = np.random.default_rng(0)
+    centers = np.stack([rng.uniform(0.3, 0.7, count) * size[0], rng.uniform(0.35, 0.65, count) * size[1]], axis=-1)
+    diameters = rng.uniform(0.12, 0.3, count) * min(size)
+    sizes = np.stack([diameters, diameters * rng.uniform(0.7, 1.0, count)], axis=-1)
+    return centers.astype(np.float32), sizes.astype(np.float32)
+
+
+def _timing(durations):
+    durations = 1000.0 * np.asarray(durations)
+    return {
+        'fps': 1000.0 * len(durations) / durations.sum(),
+        'p50Ms': float(np.percentile(durations, 50)),
+        'p99Ms': float(np.percentile(durations, 99)),
+    }
+
+
+def _writeCalibration(path, size, stereo):
+    # calibration file of a camera with moderate radial distortion, and for stereo of a second camera 60 mm beside it
+    width, height = size
+    cameraMatrix = np.array([[1.2 * width, 0, width / 2], [0, 1.2 * width, height / 2], [0, 0, 1]], dtype=np.float64)
+    distCoeffs = np.array([[-0.2, 0.05, 0.001, -0.001, 0.0]], dtype=np.float64)
+
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+    fs.write('cameraMatrix', cameraMatrix)
+    fs.write('distCoeffs', distCoeffs)
+    _writeSequence(fs, 'imageSize', [width, height])
+    fs.write('boardSize_width', 9)
+    fs.write('boardSize_height', 6)
+    fs.write('squareSize', 10)
+    fs.write('intrinsicRMSE', 0.1)
+    fs.write('avgMAE', 0.1)
+    if not stereo:
+        _writeSequence(fs, 'reprojectionPointsMAE', [0.1] * 10)
+        fs.release()
+        return path
+
+    rotation = cv2.Rodrigues(np.array([0.0, 0.1, 0.0]))[0]
+    translation = np.array([[-60.0], [0.0], [0.0]])
+    R1, R2, P1, P2 = cv2.stereoRectify(cameraMatrix, distCoeffs, cameraMatrix, distCoeffs, size, rotation, translation)[:4]
+    _writeSequence(fs, 'reprojectionWorldPointsMAE', [10.1] * 10)
+    fs.write('intrinsicRMSESec', 0.1)
+    fs.write('avgMAESec', 0.1)
+    fs.write('stereoRMSE', 0.1)
+    fs.write('avgWorldMAE', 10.1)
+    fs.write('cameraMatrixSecondary', cameraMatrix)
+    fs.write('distCoeffsSecondary', distCoeffs)
+    fs.write('rotationMatrix', rotation)
+    fs.write('translationMatrix', translation)
+    fs.write('essentialMatrix', np.eye(3))
+    fs.write('fundamentalMatrix', np.eye(3))
+    fs.write('rectificationTransform', R1)
+    fs.write('rectificationTransformSecondary', R2)
+    fs.write('projectionMatrix', P1)
+    fs.write('projectionMatrixSecondary', P2)
+    fs.release()
+    return path
+
+
+def _writeSequence(fs, name, values):
+    fs.startWriteStruct(name, cv2.FileNode_SEQ)
+    for value in values:
+        fs.write('', value)
+    fs.endWriteStruct()
+
+
+def _resetPeakMemory():
+    # resets the peak resident memory to the current one where the system supports it (Linux) and returns it
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    return _peakMemory()
+
+
+def _peakMemory():
+    # peak resident memory of the process in bytes
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _parseResolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark and regression suite of PyPupilEXT on synthetic eye images.')
+    parser.add_argument('--cases', nargs='+', default=CASES, choices=CASES, help='cases to run, all by default')
+    parser.add_argument('--resolutions', nargs='+', type=_parseResolution, default=RESOLUTIONS, help='i.e. 320x240 640x480')
+    parser.add_argument('--frames', type=int, default=100, help='frames per case')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic eye images')
+    parser.add_argument('--output', help='json file to store the results, i.e. as a baseline')
+    parser.add_argument('--baseline', help='json file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative regression of performance metrics')
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.02, help='allowed relative regression of accuracy metrics')
+    args = parser.parse_args(argv)
+
+    results = runSuite(args.cases, args.resolutions, args.frames, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline['meta'].get('frames'), baseline['meta'].get('seed')) != (args.frames, args.seed):
+            print('warning: the baseline was run with other frames or seed, accuracy metrics are not comparable')
+        regressions = compare(results, baseline, args.tolerance, args.accuracy_tolerance)
+        for key, metric, old, value in regressions:
+            print('REGRESSION %-36s %-14s %.4g -> %.4g' % (key, metric, old, value))
+        print('%d regressions against %s' % (len(regressions), args.baseline))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,12 @@
 from .stereo_calibration import StereoCalibration
 from .single_calibration import SingleCalibration
+from .pupil_data import readPupilData
+from .pupil_stream import stream, syntheticFrames, StreamResult
+from .synthetic_eye import syntheticEye, syntheticEyes, syntheticFrame, pupilAccuracy
+from .detection_cache import DetectionCache, CachedDetector
+from .parameter_sweep import sweepParameters, parameterGrid
+from . import parallel
+from .video_chunks import indexVideo, processVideoChunks, mergeChunks, VideoIndex, VideoChunk
 import os
 import sys
 
@@ -0,0 +1,63 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# on-disk cache of the arrays derived from a calibration file, e.g. the undistortion maps
+# entries are keyed by the content hash of the calibration file and stored as .npy files, which are memory mapped
+# when loaded so that many processes using the same calibration share one copy of the maps
+
+CACHE_VERSION = 1
+
+
+def calibrationCacheKey(file_path, kind):
+    # content hash of the calibration file, kind separates the entries of different calibration classes
+    h = hashlib.sha256()
+    h.update(('%s:%d:' % (kind, CACHE_VERSION)).encode())
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def loadCalibrationCache(cache_dir, file_path, kind, compute):
+    # returns a dict of memory mapped arrays, compute() is called to create the arrays if the entry does not exist yet
+    entry_dir = os.path.join(cache_dir, calibrationCacheKey(file_path, kind))
+
+    arrays = _loadEntry(entry_dir)
+    if arrays is not None:
+        return arrays
+
+    os.makedirs(entry_dir, exist_ok=True)
+    computed = compute()
+
+    # files are written under a temporary name and renamed, concurrent readers never see partial files.
+    # the names file is written last and marks the entry as complete
+    for name, array in computed.items():
+        _saveAtomic(os.path.join(entry_dir, name + '.npy'), lambda f, a=array: np.save(f, np.ascontiguousarray(a)))
+    _saveAtomic(os.path.join(entry_dir, 'names.txt'), lambda f: f.write('\n'.join(computed.keys()).encode()))
+
+    return _loadEntry(entry_dir)
+
+
+def _loadEntry(entry_dir):
+    names_file = os.path.join(entry_dir, 'names.txt')
+    if not os.path.exists(names_file):
+        return None
+
+    with open(names_file) as f:
+        names = f.read().split()
+
+    return {name: np.load(os.path.join(entry_dir, name + '.npy'), mmap_mode='r') for name in names}
+
+
+def _saveAtomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
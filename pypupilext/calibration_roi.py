@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+
+# undistortion of a region of interest of the camera images, shared by the single and stereo calibrations. only the
+# window around the pupil is remapped instead of the whole image
+
+
+def clipROI(roi, size, padding=0):
+    # region of interest (x, y, w, h) grown by padding on each side and clipped to an image of size (width, height)
+    x, y, w, h = (int(round(v)) for v in roi)
+    x0 = min(max(x - padding, 0), size[0])
+    y0 = min(max(y - padding, 0), size[1])
+    x1 = min(max(x + w + padding, x0), size[0])
+    y1 = min(max(y + h + padding, y0), size[1])
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def undistortROI(img, map1, map2, roi, padding=0):
+    # undistorts only the window roi=(x, y, w, h) of the undistorted image, grown by padding pixels on each side,
+    # by remapping with sub-views of the undistortion maps map1 and map2. returns the patch and its offset (x, y) in
+    # the undistorted image. without maps the window of img itself is returned
+    size = (img.shape[1], img.shape[0]) if map1 is None else (map1.shape[1], map1.shape[0])
+    x, y, w, h = clipROI(roi, size, padding)
+
+    if map1 is None or map2 is None:
+        return img[y:y + h, x:x + w], (x, y)
+    if w == 0 or h == 0:
+        return np.zeros((h, w) + img.shape[2:], dtype=img.dtype), (x, y)
+
+    return cv2.remap(img, map1[y:y + h, x:x + w], map2[y:y + h, x:x + w], cv2.INTER_LINEAR), (x, y)
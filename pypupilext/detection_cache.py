@@ -0,0 +1,218 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# on-disk cache of detection results for reprocessing the same recordings with the same detector settings.
+# entries are keyed by a hash of the frame, the detector class, title and detection parameters and the library version,
+# and stored in a sqlite database which is shared by all processes using the same path.
+# the least recently used entries are evicted once the stored pupils exceed max_bytes.
+# pupils are stored as a fixed record of their fields, so reading a shared database never unpickles its contents
+
+CACHE_VERSION = 3
+
+# detectors whose result depends on the previous frames and can therefore not be cached per frame
+STATEFUL_DETECTORS = ('PuReST',)
+
+# stored fields of a pupil, in the order of its pickle state
+PUPIL_RECORD = np.dtype([
+    ('center', '<f4', (2,)),
+    ('size', '<f4', (2,)),
+    ('angle', '<f4'),
+    ('confidence', '<f4'),
+    ('outline_confidence', '<f4'),
+    ('eyelid', '<f4'),
+    ('physicalDiameter', '<f4'),
+    ('undistortedDiameter', '<f4'),
+    ('workingScale', '<f4'),
+    ('algorithmName', 'S32'),
+])
+
+
+class DetectionCache:
+
+    def __init__(self, path, max_bytes=256 << 20):
+        # path of the sqlite database, created if it does not exist
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        # the write-ahead log lets other processes read while one writes, and commits without waiting for the disk
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, pupil BLOB NOT NULL, '
+                                'size INTEGER NOT NULL, used INTEGER NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+        self.storedBytes = self._storedBytes()
+
+    def key(self, detector, frame, method='runWithConfidence'):
+        # content hash of the frame and of everything else the result of method depends on
+        from . import _pypupil
+
+        if type(detector).__name__ in STATEFUL_DETECTORS:
+            raise ValueError('%s tracks the pupil between frames, its results can not be cached per frame' % type(detector).__name__)
+        # in the latency target mode the working resolution follows the durations of the previous frames
+        resolution = getattr(detector, 'resolution', None)
+        if resolution is not None and resolution.enabled:
+            raise ValueError('%s adapts its resolution between frames in the latency target mode, its results can not be '
+                             'cached per frame' % type(detector).__name__)
+        try:
+            parameters = pickle.dumps(_detectionParameters(detector), protocol=4)
+        except (AttributeError, TypeError) as e:
+            raise TypeError('the parameters of %s can not be read to key the cache: %s' % (type(detector).__name__, e))
+
+        frame = np.ascontiguousarray(frame)
+        # sha256 is hardware accelerated on current CPUs and the fastest hash of hashlib there
+        h = hashlib.sha256()
+        h.update(('%d:%s:%s:%s:%s:%s:' % (CACHE_VERSION, _pypupil.__version__, method, detector.title(), frame.dtype.str, frame.shape)).encode())
+        h.update(parameters)
+        h.update(frame.data)
+        return h.digest()
+
+    def get(self, key):
+        # cached pupil of key or None, counts a hit or a miss
+        with self.lock:
+            row = self.connection.execute('SELECT pupil FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute('UPDATE entries SET used = ? WHERE key = ?', (time.time_ns(), key))
+        return _decodePupil(row[0])
+
+    def put(self, key, pupil):
+        data = _encodePupil(pupil)
+        with self.lock:
+            previous = self.connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO entries (key, pupil, size, used) VALUES (?, ?, ?, ?)',
+                                    (key, data, len(data), time.time_ns()))
+            self.storedBytes += len(data) - (previous[0] if previous else 0)
+            if self.storedBytes > self.max_bytes:
+                self._evict()
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM entries')
+            self.storedBytes = 0
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _storedBytes(self):
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _evict(self):
+        # other processes may have added entries, the stored size is read again before evicting down to 90% of the
+        # limit, which keeps the eviction from running on every put
+        self.storedBytes = self._storedBytes()
+        target = 0.9 * self.max_bytes
+        while self.storedBytes > target:
+            excess = self.storedBytes - target
+            rows = self.connection.execute('SELECT key, size FROM entries ORDER BY used LIMIT 256').fetchall()
+            if not rows:
+                break
+            keys = []
+            for key, size in rows:
+                keys.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            self.connection.executemany('DELETE FROM entries WHERE key = ?', keys)
+            self.evictions += len(keys)
+            self.storedBytes = self._storedBytes()
+
+
+class CachedDetector:
+    # detector whose run and runWithConfidence results are looked up in a DetectionCache before detecting.
+    # other attributes are those of the wrapped detector, parameters changed on it are part of the cache key
+
+    def __init__(self, detector, cache):
+        # cache is a DetectionCache or the path of its database
+        self.detector = detector
+        self.cache = cache if isinstance(cache, DetectionCache) else DetectionCache(cache)
+        # fails here instead of on the first frame if the detector can not be cached
+        self.cache.key(detector, np.zeros((1, 1), np.uint8))
+
+    def run(self, frame):
+        return self._cached('run', frame)
+
+    def runWithConfidence(self, frame):
+        return self._cached('runWithConfidence', frame)
+
+    def __getattr__(self, name):
+        return getattr(self.detector, name)
+
+    def __setattr__(self, name, value):
+        if name in ('detector', 'cache'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.detector, name, value)
+
+    def _cached(self, method, frame):
+        key = self.cache.key(self.detector, frame, method)
+        pupil = self.cache.get(key)
+        if pupil is None:
+            pupil = getattr(self.detector, method)(frame)
+            self.cache.put(key, pupil)
+        return pupil
+
+
+def _detectionParameters(detector):
+    # pickle state of detector without the settings of the base class, its first element.
+    # these are the profiler, which only measures, and the latency target mode, which key() rejects while enabled
+    state = detector.__getstate__()
+    return state[1:]
+
+
+def _encodePupil(pupil):
+    record = np.zeros((), PUPIL_RECORD)
+    for name in PUPIL_RECORD.names:
+        record[name] = getattr(pupil, name).encode() if name == 'algorithmName' else getattr(pupil, name)
+    return record.tobytes()
+
+
+def _decodePupil(data):
+    from . import _pypupil
+
+    if len(data) != PUPIL_RECORD.itemsize:
+        raise ValueError('cache entry of %d bytes is not a pupil record' % len(data))
+    record = np.frombuffer(data, PUPIL_RECORD)[0]
+    pupil = _pypupil.Pupil()
+    for name in PUPIL_RECORD.names:
+        value = record[name]
+        if name == 'algorithmName':
+            pupil.algorithmName = value.decode()
+        elif value.shape:
+            setattr(pupil, name, tuple(float(v) for v in value))
+        else:
+            setattr(pupil, name, float(value))
+    return pupil
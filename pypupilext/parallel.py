@@ -0,0 +1,84 @@
+import math
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# pupil detection on several processes, for detectors which must not be shared between threads or to scale beyond
+# one process. the frames are copied once into shared memory which the worker processes map, only the pickled
+# detector, frame indices and the pupils are sent between the processes
+
+_worker = {}
+
+
+def map_frames(detector, frames, workers=None, chunksize=None, mp_context=None):
+    # returns the pupils detected with outline confidence on all frames, in frame order.
+    # detector is pickled and each worker process detects with its own copy, so the state of tracking detectors
+    # like PuReST only carries over between the consecutive frames of a chunk.
+    # frames is a 3-D uint8 array (frames x rows x cols) or a list of 2-D uint8 images of any size.
+    # workers defaults to the number of cores, chunksize to a quarter of the frames per worker
+    if not isinstance(frames, np.ndarray):
+        frames = list(frames)
+    layout, size = _frameLayout(frames)
+    if not layout:
+        return []
+
+    workers = workers or multiprocessing.cpu_count()
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(layout) / (4 * workers)))
+
+    # fails here instead of in the workers if the detector cannot be pickled
+    state = pickle.dumps(detector)
+
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        buffer = np.ndarray((size,), dtype=np.uint8, buffer=memory.buf)
+        for (offset, shape), frame in zip(layout, frames):
+            buffer[offset:offset + shape[0] * shape[1]].reshape(shape)[...] = frame
+        del buffer
+
+        chunks = [(start, min(start + chunksize, len(layout))) for start in range(0, len(layout), chunksize)]
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=mp_context,
+                                 initializer=_initWorker, initargs=(memory.name, layout, state)) as executor:
+            pupils = []
+            for chunk in executor.map(_detectChunk, chunks):
+                pupils.extend(chunk)
+            return pupils
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def _frameLayout(frames):
+    # offset and (rows, cols) of each frame in the shared memory, and the total size
+    layout = []
+    offset = 0
+    for frame in frames:
+        frame = np.asarray(frame)
+        if frame.ndim != 2 or frame.dtype != np.uint8:
+            raise TypeError('frames must be 2-D uint8 images')
+        layout.append((offset, frame.shape))
+        offset += frame.size
+    return layout, offset
+
+
+def _initWorker(name, layout, state):
+    # the workers share the resource tracker of the parent process, which removes the memory if the parent dies
+    memory = shared_memory.SharedMemory(name=name)
+    buffer = np.ndarray((memory.size,), dtype=np.uint8, buffer=memory.buf)
+    _worker['memory'] = memory
+    _worker['frames'] = [buffer[offset:offset + shape[0] * shape[1]].reshape(shape) for offset, shape in layout]
+    _worker['detector'] = pickle.loads(state)
+
+
+def _detectChunk(chunk):
+    detector = _worker['detector']
+    frames = _worker['frames']
+    # the chunks of a worker are not adjacent, tracking detectors start over at each chunk
+    if hasattr(detector, 'reset'):
+        detector.reset()
+    return [detector.runWithConfidence(frames[i]) for i in range(*chunk)]
@@ -0,0 +1,101 @@
+import itertools
+import os
+import pickle
+
+import numpy as np
+
+from .detection_cache import STATEFUL_DETECTORS
+from .synthetic_eye import pupilAccuracy
+
+# grid search over the parameters of a detection method on a set of frames. every configuration detects every frame,
+# the stages which do not depend on the swept parameters, like the downscaling, normalization and edge detection of
+# PuRe, ElSe and ExCuSe or the Haar features and pupil region of Swirski2D, are computed once per frame and shared by
+# the configurations. frames are detected in parallel, each thread with its own copy of the configured detectors
+
+
+def parameterGrid(grid):
+    # list of configurations, dicts of parameter name and value. grid is a dict of parameter names and lists of
+    # values which are combined in all ways, in the order of the names, or already a list of such dicts
+    if isinstance(grid, dict):
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    return [dict(configuration) for configuration in grid]
+
+
+def sweepParameters(method, frames, grid, params=None, workers=None, share_stages=True, truth=None, keep_pupils=False):
+    # detects frames, a 3-D uint8 array (frames x rows x cols) or a list of 2-D uint8 images, with every
+    # configuration of grid (see parameterGrid) and returns one row per configuration in grid order.
+    # method is a detector name or class, params the parameters shared by all configurations. parameter names are
+    # attributes of the detector, those of nested parameters like TrackerParams are dotted, e.g.
+    # 'params.CannyThreshold1' for Swirski2D.
+    # a row holds the parameters of its configuration and
+    #   detected     share of frames with a valid pupil
+    #   confidence   mean outline confidence of the frames
+    #   fps, p50Ms, p99Ms  detection rate and latencies, including the shared stages computed by the configuration
+    # with truth, the ground truth pupils ((x, y), (width, height), angle) of the frames as given by syntheticEyes,
+    # also hitRate, centerError and diameterError, see pupilAccuracy
+    # and with keep_pupils the structured array of the detected pupils as pupils, see detect_batch.
+    # workers defaults to the number of cores
+    from . import _pypupil
+
+    configurations = parameterGrid(grid)
+    if not configurations:
+        return []
+    if not isinstance(frames, np.ndarray):
+        frames = list(frames)
+    if len(frames) == 0:
+        raise ValueError('at least one frame is required')
+    if truth is not None and len(truth) != len(frames):
+        raise ValueError('truth must hold one pupil per frame')
+
+    detectorClass = getattr(_pypupil, method) if isinstance(method, str) else method
+    if detectorClass.__name__ in STATEFUL_DETECTORS:
+        raise ValueError('%s tracks the pupil between frames, its frames can not be detected in parallel' % detectorClass.__name__)
+
+    detectors = []
+    for configuration in configurations:
+        detector = detectorClass()
+        for name, value in dict(params or {}, **configuration).items():
+            _setParameter(detector, name, value)
+        detectors.append(detector)
+
+    workers = min(workers or os.cpu_count(), len(frames))
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    # the other threads work with copies of the configured detectors
+    state = pickle.dumps(detectors)
+    detectorSets = [detectors] + [pickle.loads(state) for _ in range(workers - 1)]
+
+    pupils, durations = _pypupil.sweep_parameters(frames, detectorSets, share_stages)
+
+    rows = []
+    for i, configuration in enumerate(configurations):
+        row = dict(configuration)
+        row.update(_metrics(pupils[:, i], durations[:, i], truth))
+        if keep_pupils:
+            row['pupils'] = pupils[:, i].copy()
+        rows.append(row)
+    return rows
+
+
+def _setParameter(detector, name, value):
+    *path, attribute = name.split('.')
+    target = detector
+    for part in path:
+        target = getattr(target, part)
+    if not hasattr(target, attribute):
+        raise AttributeError('%s has no parameter %s' % (type(detector).__name__, name))
+    setattr(target, attribute, value)
+
+
+def _metrics(pupils, durations, truth):
+    accuracy = pupilAccuracy(pupils, truth)
+    metrics = {
+        'detected': accuracy.pop('detected'),
+        'confidence': float(pupils['outline_confidence'].mean()),
+        'fps': float(1000.0 * len(durations) / durations.sum()) if durations.sum() > 0 else float('inf'),
+        'p50Ms': float(np.percentile(durations, 50)),
+        'p99Ms': float(np.percentile(durations, 99)),
+    }
+    metrics.update(accuracy)
+    return metrics
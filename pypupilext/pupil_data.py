@@ -0,0 +1,97 @@
+import numpy as np
+
+# reader for the structured .npy files of the BinaryDataWriter and helpers for arrays of pupils
+
+
+def readPupilData(file_path, mmap=True):
+    # returns a numpy structured array with one record per pupil, columns are accessed by name, e.g. data['diameter']
+    # with mmap the file is memory mapped read-only instead of being loaded into memory
+    with open(file_path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+        f.seek(0, 2)
+        file_size = f.tell()
+
+    # a writer that was not closed leaves the row count at 0, the rows that were written can still be read
+    rows = (file_size - offset) // dtype.itemsize
+    if len(shape) == 1 and shape[0] > 0:
+        rows = min(rows, shape[0])
+
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+
+    if mmap:
+        return np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=(rows,))
+
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return np.fromfile(f, dtype=dtype, count=rows)
+
+
+def pupilArrays(centers, sizes=None):
+    # returns the pupil centers and sizes as float32 arrays of shape (N, 2)
+    # without sizes, centers must be a structured array of detect_batch (center, size) or readPupilData (center, width, height)
+    if sizes is None:
+        records = np.asarray(centers)
+        if records.dtype.names is None:
+            raise ValueError('sizes are required unless a structured pupil array is given')
+        centers = records['center']
+        if 'size' in records.dtype.names:
+            sizes = records['size']
+        else:
+            sizes = np.stack([records['width'], records['height']], axis=-1)
+
+    centers = np.asarray(centers, dtype=np.float32).reshape(-1, 2)
+    sizes = np.asarray(sizes, dtype=np.float32).reshape(-1, 2)
+    if len(centers) != len(sizes):
+        raise ValueError('centers and sizes must have the same length')
+
+    return centers, sizes
+
+
+def pupilDiameters(sizes):
+    # diameter as returned by Pupil.diameter(), the major axis of the truncated size
+    return np.maximum(np.trunc(sizes[:, 0]), np.trunc(sizes[:, 1])).astype(np.int64)
+
+
+def pupilValid(centers, sizes):
+    # vectorized Pupil.valid(-2)
+    return (centers[:, 0] > 0) & (centers[:, 1] > 0) & (sizes[:, 0] > 0) & (sizes[:, 1] > 0)
+
+
+def pupilHorizontal(sizes):
+    # whether the major axis of the pupils is horizontal, compared on the truncated size as Pupil.width() > Pupil.height()
+    return np.trunc(sizes[:, 0]) > np.trunc(sizes[:, 1])
+
+
+def pupilCornerPoints(centers, sizes, horizontal=None):
+    # corner points used to measure the pupil size in the calibrations, shape (N, 2, 2) as float64
+    # the pupil is rotated to 360 degrees and its topLeft and topRight corners are used if the major axis is horizontal,
+    # else topLeft and bottomLeft. computed with the same arithmetic as cv::RotatedRect::points of a single pupil
+    # horizontal overrides the orientation, e.g. to select the corners of a secondary pupil by its main pupil
+    angle = 360 * np.pi / 180.
+    b = np.float32(np.cos(angle)) * np.float32(0.5)
+    a = np.float32(np.sin(angle)) * np.float32(0.5)
+
+    cx, cy = centers[:, 0], centers[:, 1]
+    w, h = sizes[:, 0], sizes[:, 1]
+
+    bottomLeft = np.stack([cx - a * h - b * w, cy + b * h - a * w], axis=-1)
+    topLeft = np.stack([cx + a * h - b * w, cy - b * h - a * w], axis=-1)
+    topRight = np.float32(2) * centers - bottomLeft
+
+    if horizontal is None:
+        horizontal = pupilHorizontal(sizes)
+    secondPoints = np.where(np.asarray(horizontal)[:, None], topRight, bottomLeft)
+
+    return np.stack([topLeft, secondPoints], axis=1).astype(np.float64)
+
+
+def cornerDistances(points):
+    # distances between the two corner points of each pupil, points of shape (N, 2, D)
+    diff = points[:, 0] - points[:, 1]
+    return np.sqrt(np.sum(diff * diff, axis=-1))
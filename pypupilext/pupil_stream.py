@@ -0,0 +1,223 @@
+import asyncio
+import collections
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .synthetic_eye import syntheticFrame
+
+# asyncio streaming of live frames through pupil detection. frames are read from an async iterator into a bounded
+# queue and detected on worker threads, one detector instance per worker. the detection methods release the GIL
+# while they run, so capture and the event loop keep running while a frame is detected
+
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+BLOCK = 'block'
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class StreamResult:
+    # pupil of one frame of a stream. times are time.perf_counter() seconds, dropped is the number of frames
+    # dropped by the stream before this result
+
+    __slots__ = ('index', 'pupil', 'captureTime', 'resultTime', 'dropped')
+
+    def __init__(self, index, pupil, captureTime, resultTime, dropped):
+        self.index = index
+        self.pupil = pupil
+        self.captureTime = captureTime
+        self.resultTime = resultTime
+        self.dropped = dropped
+
+    @property
+    def latency(self):
+        # capture to result latency in ms
+        return 1000.0 * (self.resultTime - self.captureTime)
+
+    def __repr__(self):
+        return 'StreamResult(index=%d, latency=%.2f ms, dropped=%d)' % (self.index, self.latency, self.dropped)
+
+
+async def stream(source, method, params=None, workers=1, queue_size=4, policy=DROP_OLDEST, latency_budget=None, copy=False):
+    # async generator of StreamResult in frame order for the frames of the async iterator source.
+    # source yields frames or (frame, captureTime) tuples with a time.perf_counter() timestamp, otherwise the
+    # capture time is the time the frame is received. frames are detected with outline confidence.
+    # method is a detector name or class, i.e. "PuRe" or pp.PuRe, of which workers instances are created with the
+    # attributes of params, or a detector instance which is then used by a single worker.
+    # at most queue_size frames wait for a worker. when the queue is full, drop-oldest replaces the oldest waiting
+    # frame, drop-newest drops the new frame and block stops reading the source until a frame is taken.
+    # frames which waited longer than latency_budget ms when a worker takes them are dropped as well.
+    # with copy, frames are copied when received, needed if the source reuses its frame buffers
+    if policy not in POLICIES:
+        raise ValueError('policy must be one of %s' % ', '.join(POLICIES))
+    if queue_size < 1:
+        raise ValueError('queue_size must be at least 1')
+
+    detectors = _createDetectors(method, params, workers)
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=len(detectors), thread_name_prefix='pypupilext-stream')
+    queue = _FrameQueue(queue_size, policy)
+    results = {}
+    resultAdded = asyncio.Condition()
+    running = set()
+    state = {'finished': 0}
+    # frames are numbered when taken from the queue, results are yielded in that order
+    sequence = itertools.count()
+
+    async def publish(seq, result):
+        async with resultAdded:
+            results[seq] = result
+            resultAdded.notify_all()
+
+    async def read():
+        index = 0
+        try:
+            async for item in source:
+                if isinstance(item, tuple):
+                    frame, captureTime = item
+                else:
+                    frame, captureTime = item, time.perf_counter()
+                if copy:
+                    frame = np.array(frame, copy=True)
+                await queue.put((index, frame, captureTime))
+                index += 1
+        finally:
+            queue.close()
+
+    async def work(detector):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            seq = next(sequence)
+            index, frame, captureTime = item
+
+            if latency_budget is not None and 1000.0 * (time.perf_counter() - captureTime) > latency_budget:
+                queue.dropped += 1
+                await publish(seq, None)
+                continue
+
+            future = executor.submit(detector.runWithConfidence, frame)
+            running.add(future)
+            try:
+                pupil = await asyncio.wrap_future(future)
+            finally:
+                running.discard(future)
+            await publish(seq, StreamResult(index, pupil, captureTime, time.perf_counter(), queue.dropped))
+
+    tasks = [loop.create_task(read())] + [loop.create_task(work(detector)) for detector in detectors]
+
+    async def wait():
+        # the next result in frame order, None if it was dropped, raises if a task failed and ends the stream
+        # once all tasks are done and every result was yielded
+        async with resultAdded:
+            while True:
+                if state['finished'] in results:
+                    return True
+                failed = [task for task in tasks if task.done() and not task.cancelled() and task.exception() is not None]
+                if failed:
+                    raise failed[0].exception()
+                if all(task.done() for task in tasks):
+                    return False
+                await resultAdded.wait()
+
+    def taskDone(task):
+        loop.create_task(_notify(resultAdded))
+
+    for task in tasks:
+        task.add_done_callback(taskDone)
+
+    try:
+        while await wait():
+            result = results.pop(state['finished'])
+            state['finished'] += 1
+            if result is not None:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # detections which already started finish before the detectors are released to the caller
+        if running:
+            await asyncio.wait([asyncio.wrap_future(future) for future in running])
+        executor.shutdown(wait=False)
+
+
+async def syntheticFrames(count=None, size=(320, 240), fps=30.0, noise=4.0, seed=0):
+    # async iterator of synthetic eye images of syntheticFrame at the given frame rate, endless if count is None.
+    # frames are paced against the start time, a slow consumer does not shift later frames
+    start = time.perf_counter()
+    frames = range(count) if count is not None else itertools.count()
+    for index in frames:
+        delay = start + index / fps - time.perf_counter() if fps else 0
+        # always yield to the event loop, like a camera waiting for its next frame
+        await asyncio.sleep(max(delay, 0))
+        frame, _ = syntheticFrame(index, size, noise, seed)
+        yield frame
+
+
+def _createDetectors(method, params, workers):
+    from . import _pypupil
+
+    if isinstance(method, _pypupil.PupilDetectionMethod):
+        if workers != 1:
+            raise ValueError('a detector instance can only be used by one worker, pass its class for several workers')
+        detectors = [method]
+    else:
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        detectorClass = getattr(_pypupil, method) if isinstance(method, str) else method
+        detectors = [detectorClass() for _ in range(workers)]
+
+    for detector in detectors:
+        for name, value in (params or {}).items():
+            setattr(detector, name, value)
+    return detectors
+
+
+async def _notify(condition):
+    async with condition:
+        condition.notify_all()
+
+
+class _FrameQueue:
+    # bounded queue of frames waiting for a worker with the drop policy of the stream
+
+    def __init__(self, size, policy):
+        self.size = size
+        self.policy = policy
+        self.items = collections.deque()
+        self.closed = False
+        self.dropped = 0
+        self.changed = asyncio.Condition()
+
+    async def put(self, item):
+        async with self.changed:
+            if len(self.items) >= self.size:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self.policy == DROP_OLDEST:
+                    self.items.popleft()
+                    self.dropped += 1
+                else:
+                    await self.changed.wait_for(lambda: len(self.items) < self.size)
+            self.items.append(item)
+            self.changed.notify_all()
+
+    async def get(self):
+        # next frame, None once the queue is closed and empty
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.items or self.closed)
+            if not self.items:
+                return None
+            item = self.items.popleft()
+            self.changed.notify_all()
+            return item
+
+    def close(self):
+        self.closed = True
+        asyncio.get_running_loop().create_task(_notify(self.changed))
@@ -1,13 +1,17 @@
 import cv2
 import numpy as np
 
+from .calibration_cache import loadCalibrationCache
+from .calibration_roi import undistortROI
+from .pupil_data import pupilArrays, pupilDiameters, pupilValid, pupilCornerPoints, cornerDistances
+
 # look into mixing python code with the c++ module
 # https://stackoverflow.com/questions/54317280/how-to-mix-python-code-into-a-python-extension-module
 
 
 class SingleCalibration:
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, verbose=True, cache_dir=None):
         # load calibration file
         # FILE_STORAGE_READ
         self.file_path = file_path
@@ -29,12 +33,29 @@ class SingleCalibration:
         cv_file.release()
 
         # additional calculations for undistortion maps
-        self.newCameraMatrix = cv2.getOptimalNewCameraMatrix(self.cameraMatrix, self.distCoeffs, self.imageSize, 1)[0]
+        if cache_dir is None:
+            self.newCameraMatrix = cv2.getOptimalNewCameraMatrix(self.cameraMatrix, self.distCoeffs, self.imageSize, 1)[0]
+
+            self.map1, self.map2 = cv2.initUndistortRectifyMap(self.cameraMatrix, self.distCoeffs, None, self.newCameraMatrix, self.imageSize, 5)
+        else:
+            # fixed point maps from the cache, memory mapped and shared by all processes using the same calibration file
+            cached = loadCalibrationCache(cache_dir, file_path, 'SingleCalibration', self.computeUndistortionMaps)
 
-        self.map1, self.map2 = cv2.initUndistortRectifyMap(self.cameraMatrix, self.distCoeffs, None, self.newCameraMatrix, self.imageSize, 5)
+            self.newCameraMatrix = np.array(cached['newCameraMatrix'])
+            self.map1, self.map2 = cached['map1'], cached['map2']
 
         # get node retrieves a entity, we also have to specify the type to retrieve other wise we only get a FileNode object back instead of a matrix
-        self.printMeta()
+        if verbose:
+            self.printMeta()
+
+
+    def computeUndistortionMaps(self):
+        # new camera matrix and undistortion maps in the compact CV_16SC2 fixed point format
+        newCameraMatrix = cv2.getOptimalNewCameraMatrix(self.cameraMatrix, self.distCoeffs, self.imageSize, 1)[0]
+
+        map1, map2 = cv2.initUndistortRectifyMap(self.cameraMatrix, self.distCoeffs, None, newCameraMatrix, self.imageSize, cv2.CV_16SC2)
+
+        return {'newCameraMatrix': newCameraMatrix, 'map1': map1, 'map2': map2}
 
 
     def printMeta(self):
@@ -59,6 +80,14 @@ class SingleCalibration:
             return cv2.remap(img, self.map1, self.map2, cv2.INTER_LINEAR)
 
 
+    def undistortImageROI(self, img, roi, padding=0):
+        # undistorts only the window roi=(x, y, w, h) of the undistorted image, grown by padding pixels on each side,
+        # by remapping with sub-views of the undistortion maps. returns the patch and its offset (x, y) in the undistorted image,
+        # pupils detected in the patch are moved to image coordinates with pupil.shift(offset)
+
+        return undistortROI(img, self.map1, self.map2, roi, padding)
+
+
 
     def undistortPupilSize(self, pupil):
 
@@ -81,3 +110,21 @@ class SingleCalibration:
 
         return cv2.norm(undistCornerPointsBuf[0] - undistCornerPointsBuf[1])
 
+
+    def undistortPupilSizeArray(self, centers, sizes=None):
+        # array version of undistortPupilSize for N pupils, given as center and size arrays of shape (N, 2)
+        # or as a structured array of detect_batch or readPupilData. all corner points are undistorted in one call
+
+        centers, sizes = pupilArrays(centers, sizes)
+        result = pupilDiameters(sizes).astype(np.float64)
+
+        valid = pupilValid(centers, sizes)
+        if self.cameraMatrix is None or not valid.any():
+            return result
+
+        points = pupilCornerPoints(centers[valid], sizes[valid])
+
+        undistPoints = cv2.undistortPoints(points.reshape(-1, 1, 2), self.cameraMatrix, self.distCoeffs, R=None, P=self.newCameraMatrix)
+
+        result[valid] = cornerDistances(undistPoints.reshape(-1, 2, 2))
+        return result
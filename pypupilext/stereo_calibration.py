@@ -1,6 +1,11 @@
 import cv2
 import numpy as np
 
+from ._pypupil import StereoPupilPipeline
+from .calibration_cache import loadCalibrationCache
+from .calibration_roi import undistortROI
+from .pupil_data import pupilArrays, pupilDiameters, pupilValid, pupilHorizontal, pupilCornerPoints, cornerDistances
+
 # look into mixing python code with the c++ module
 # https://stackoverflow.com/questions/54317280/how-to-mix-python-code-into-a-python-extension-module
 
@@ -8,7 +13,7 @@ import numpy as np
 
 class StereoCalibration:
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, verbose=True, cache_dir=None):
 
         # load calibration file
         # FILE_STORAGE_READ
@@ -49,14 +54,37 @@ class StereoCalibration:
 
         cv_file.release()
 
-        self.printMeta()
+        if verbose:
+            self.printMeta()
+
+
+        if cache_dir is None:
+            self.newCameraMatrix = cv2.getOptimalNewCameraMatrix(self.cameraMatrix, self.distCoeffs, self.imageSize, 1, self.imageSize, 0)[0]
+            self.newCameraMatrixSecondary = cv2.getOptimalNewCameraMatrix(self.cameraMatrixSecondary, self.distCoeffsSecondary, self.imageSize, 1, self.imageSize, 0)[0]
+
+            self.map1, self.map2 = cv2.initUndistortRectifyMap(self.cameraMatrix, self.distCoeffs, None, self.newCameraMatrix, self.imageSize, 5)
+            self.map1Sec, self.map2Sec = cv2.initUndistortRectifyMap(self.cameraMatrixSecondary, self.distCoeffsSecondary, None, self.newCameraMatrixSecondary, self.imageSize, 5)
+        else:
+            # fixed point maps from the cache, memory mapped and shared by all processes using the same calibration file
+            cached = loadCalibrationCache(cache_dir, file_path, 'StereoCalibration', self.computeUndistortionMaps)
+
+            self.newCameraMatrix = np.array(cached['newCameraMatrix'])
+            self.newCameraMatrixSecondary = np.array(cached['newCameraMatrixSecondary'])
+
+            self.map1, self.map2 = cached['map1'], cached['map2']
+            self.map1Sec, self.map2Sec = cached['map1Sec'], cached['map2Sec']
+
 
+    def computeUndistortionMaps(self):
+        # new camera matrices and undistortion maps of both cameras in the compact CV_16SC2 fixed point format
+        newCameraMatrix = cv2.getOptimalNewCameraMatrix(self.cameraMatrix, self.distCoeffs, self.imageSize, 1, self.imageSize, 0)[0]
+        newCameraMatrixSecondary = cv2.getOptimalNewCameraMatrix(self.cameraMatrixSecondary, self.distCoeffsSecondary, self.imageSize, 1, self.imageSize, 0)[0]
 
-        self.newCameraMatrix = cv2.getOptimalNewCameraMatrix(self.cameraMatrix, self.distCoeffs, self.imageSize, 1, self.imageSize, 0)[0]
-        self.newCameraMatrixSecondary = cv2.getOptimalNewCameraMatrix(self.cameraMatrixSecondary, self.distCoeffsSecondary, self.imageSize, 1, self.imageSize, 0)[0]
+        map1, map2 = cv2.initUndistortRectifyMap(self.cameraMatrix, self.distCoeffs, None, newCameraMatrix, self.imageSize, cv2.CV_16SC2)
+        map1Sec, map2Sec = cv2.initUndistortRectifyMap(self.cameraMatrixSecondary, self.distCoeffsSecondary, None, newCameraMatrixSecondary, self.imageSize, cv2.CV_16SC2)
 
-        self.map1, self.map2 = cv2.initUndistortRectifyMap(self.cameraMatrix, self.distCoeffs, None, self.newCameraMatrix, self.imageSize, 5)
-        self.map1Sec, self.map2Sec = cv2.initUndistortRectifyMap(self.cameraMatrixSecondary, self.distCoeffsSecondary, None, self.newCameraMatrixSecondary, self.imageSize, 5)
+        return {'newCameraMatrix': newCameraMatrix, 'newCameraMatrixSecondary': newCameraMatrixSecondary,
+                'map1': map1, 'map2': map2, 'map1Sec': map1Sec, 'map2Sec': map2Sec}
 
 
     def printMeta(self):
@@ -80,7 +108,17 @@ class StereoCalibration:
         if self.map1 is None or self.map2 is None:
             return img, imgSecondary
         else:
-            return cv2.remap(img, self.map1, self.map2, cv2.INTER_LINEAR), cv2.remap(img, self.map1Sec, self.map2Sec, cv2.INTER_LINEAR)
+            return cv2.remap(img, self.map1, self.map2, cv2.INTER_LINEAR), cv2.remap(imgSecondary, self.map1Sec, self.map2Sec, cv2.INTER_LINEAR)
+
+
+    def undistortImagesROI(self, img, imgSecondary, roi, roiSecondary=None, padding=0):
+        # undistorts only the windows roi and roiSecondary=(x, y, w, h) of the undistorted images, see SingleCalibration.undistortImageROI
+        # roiSecondary defaults to roi. returns (patch, offset), (patchSecondary, offsetSecondary)
+
+        if roiSecondary is None:
+            roiSecondary = roi
+
+        return undistortROI(img, self.map1, self.map2, roi, padding), undistortROI(imgSecondary, self.map1Sec, self.map2Sec, roiSecondary, padding)
 
 
     def undistortPupilSizes(self, pupil, pupilSecondary):
@@ -144,6 +182,73 @@ class StereoCalibration:
         return cv2.norm(worldPoints[0] - worldPoints[1])
 
 
+    def createPupilPipeline(self, detector, detectorSecondary):
+        # native pipeline detecting on both frames concurrently and triangulating like triangulatePupilSize,
+        # detector and detectorSecondary must be separate detector instances
+
+        matrices = [self.cameraMatrix, self.distCoeffs, self.rectificationTransform, self.projectionMatrix,
+                    self.cameraMatrixSecondary, self.distCoeffsSecondary, self.rectificationTransformSecondary, self.projectionMatrixSecondary]
+        if any(matrix is None for matrix in matrices):
+            raise ValueError('the calibration file does not contain the stereo rectification matrices')
+
+        return StereoPupilPipeline(detector, detectorSecondary, *matrices)
+
+
+    def undistortPupilSizesArray(self, centers, sizes, centersSecondary, sizesSecondary):
+        # array version of undistortPupilSizes for N pupil pairs, given as center and size arrays of shape (N, 2)
+        # or with sizes set to None as structured arrays of detect_batch or readPupilData
+
+        centers, sizes = pupilArrays(centers, sizes)
+        centersSecondary, sizesSecondary = pupilArrays(centersSecondary, sizesSecondary)
+        if len(centers) != len(centersSecondary):
+            raise ValueError('main and secondary pupils must have the same length')
+
+        result = pupilDiameters(sizes).astype(np.float64)
+        resultSecondary = pupilDiameters(sizesSecondary).astype(np.float64)
+
+        # as for a single pair, only the main pupil decides whether the pair is undistorted
+        valid = pupilValid(centers, sizes)
+        if self.cameraMatrix is None or self.cameraMatrixSecondary is None or not valid.any():
+            return result, resultSecondary
+
+        # the corners of both pupils are selected by the orientation of the main pupil
+        points = pupilCornerPoints(centers[valid], sizes[valid])
+        pointsSecondary = pupilCornerPoints(centersSecondary[valid], sizesSecondary[valid], pupilHorizontal(sizes[valid]))
+
+        undistPoints = cv2.undistortPoints(points.reshape(-1, 1, 2), self.cameraMatrix, self.distCoeffs, R=None, P=self.newCameraMatrix)
+        undistPointsSecondary = cv2.undistortPoints(pointsSecondary.reshape(-1, 1, 2), self.cameraMatrixSecondary, self.distCoeffsSecondary, R=None, P=self.newCameraMatrixSecondary)
+
+        result[valid] = cornerDistances(undistPoints.reshape(-1, 2, 2))
+        resultSecondary[valid] = cornerDistances(undistPointsSecondary.reshape(-1, 2, 2))
+        return result, resultSecondary
+
+
+    def triangulatePupilSizeArray(self, centers, sizes, centersSecondary, sizesSecondary):
+        # array version of triangulatePupilSize for N pupil pairs, all corner points are undistorted and triangulated in one call each
+        # pairs with an invalid pupil get -1.0
+
+        centers, sizes = pupilArrays(centers, sizes)
+        centersSecondary, sizesSecondary = pupilArrays(centersSecondary, sizesSecondary)
+        if len(centers) != len(centersSecondary):
+            raise ValueError('main and secondary pupils must have the same length')
+
+        result = np.full(len(centers), -1.0)
+
+        valid = pupilValid(centers, sizes) & pupilValid(centersSecondary, sizesSecondary)
+        if self.cameraMatrix is None or self.cameraMatrixSecondary is None or not valid.any():
+            return result
+
+        points = pupilCornerPoints(centers[valid], sizes[valid])
+        pointsSecondary = pupilCornerPoints(centersSecondary[valid], sizesSecondary[valid], pupilHorizontal(sizes[valid]))
+
+        undistPoints = cv2.undistortPoints(points.reshape(-1, 1, 2), self.cameraMatrix, self.distCoeffs, R=self.rectificationTransform, P=self.projectionMatrix)
+        undistPointsSecondary = cv2.undistortPoints(pointsSecondary.reshape(-1, 1, 2), self.cameraMatrixSecondary, self.distCoeffsSecondary, R=self.rectificationTransformSecondary, P=self.projectionMatrixSecondary)
+
+        homogenPoints = cv2.triangulatePoints(self.projectionMatrix, self.projectionMatrixSecondary, undistPoints.reshape(-1, 2).T, undistPointsSecondary.reshape(-1, 2).T)
 
+        scale = np.where(homogenPoints[3] != 0, homogenPoints[3], 1.0)
+        worldPoints = (homogenPoints[:3] / scale).T
 
+        result[valid] = cornerDistances(worldPoints.reshape(-1, 2, 3))
+        return result
 
@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+
+# deterministic synthetic eye images with a known pupil ellipse, for testing and benchmarking the detection methods
+# without recordings. pupils are given like cv2.ellipse as ((x, y), (width, height), angle)
+
+
+def syntheticEye(size, center, axes, angle, glints=(), eyelid=None, noise=4.0, seed=0):
+    # grayscale image of size (width, height) with a dark elliptical pupil inside a darker iris on a brighter sclera.
+    # glints are bright corneal reflections as (x, y, radius), eyelid is the y coordinate of the lowest point of an
+    # upper eyelid which covers the image above it. the same arguments give the same image
+    width, height = size
+
+    # darker iris around the pupil on a brighter sclera, drawn with 4 fractional bits for subpixel positions
+    # the smooth iris is drawn at 1/8 of the size, which keeps large frames cheap
+    shift = 16
+    diameter = max(axes)
+    small = np.full(((height + 7) // 8, (width + 7) // 8), 190, np.uint8)
+    cv2.circle(small, (int(round(center[0] / 8 * shift)), int(round(center[1] / 8 * shift))), int(round(0.9 * diameter / 8 * shift)), 120, -1, cv2.LINE_AA, 4)
+    small = cv2.GaussianBlur(small, (0, 0), 0.15 * diameter / 8)
+    frame = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    c = (int(round(center[0] * shift)), int(round(center[1] * shift)))
+    cv2.ellipse(frame, c, (int(round(0.5 * axes[0] * shift)), int(round(0.5 * axes[1] * shift))), angle, 0, 360, 30, -1, cv2.LINE_AA, 4)
+
+    for x, y, radius in glints:
+        cv2.circle(frame, (int(round(x * shift)), int(round(y * shift))), int(round(radius * shift)), 250, -1, cv2.LINE_AA, 4)
+
+    if eyelid is not None:
+        # skin above a parabola through the lowest point below the pupil center, with a dark margin of lashes
+        xs = np.linspace(0, width, 33)
+        ys = eyelid - 0.6 * height * ((xs - center[0]) / width) ** 2
+        margin = np.round(np.stack([xs, ys], axis=-1) * shift).astype(np.int32)
+        skin = np.concatenate([margin, [[width * shift, -shift], [0, -shift]]]).astype(np.int32)
+        cv2.fillPoly(frame, [skin], 150, cv2.LINE_AA, 4)
+        cv2.polylines(frame, [margin], False, 60, max(1, int(round(0.01 * min(width, height)))), cv2.LINE_AA, 4)
+
+    if noise:
+        rng = np.random.default_rng(seed)
+        frame = cv2.add(frame, noise * rng.standard_normal(frame.shape, dtype=np.float32), dtype=cv2.CV_8U)
+
+    return frame
+
+
+def syntheticFrame(index, size=(320, 240), noise=4.0, seed=0):
+    # synthetic eye image of size (width, height) with the pupil moving on a smooth path, and the ground truth pupil.
+    # the same index and seed give the same image
+    width, height = size
+    t = 0.05 * index
+    center = (width * (0.5 + 0.2 * np.sin(t)), height * (0.5 + 0.15 * np.sin(1.7 * t)))
+    diameter = min(width, height) * (0.22 + 0.04 * np.sin(0.3 * t))
+    axes = (diameter, diameter * (0.85 + 0.1 * np.cos(0.5 * t)))
+    angle = (30.0 + 25.0 * np.sin(0.4 * t)) % 180.0
+
+    return syntheticEye(size, center, axes, angle, noise=noise, seed=(seed, index)), (center, axes, angle)
+
+
+def syntheticEyes(count, size=(320, 240), glints=2, eyelids=True, noise=4.0, seed=0):
+    # generator of count synthetic eye images and their ground truth pupils with random pupil sizes, shapes and
+    # positions, glints glints near each pupil and upper eyelids which cover up to 30% of the pupil height in half of
+    # the images. the same arguments give the same images
+    width, height = size
+    for index in range(count):
+        rng = np.random.default_rng((seed, width, height, index))
+        diameter = min(width, height) * rng.uniform(0.12, 0.3)
+        axes = (diameter, diameter * rng.uniform(0.7, 1.0))
+        angle = rng.uniform(0.0, 180.0)
+        center = (width * rng.uniform(0.3, 0.7), height * rng.uniform(0.35, 0.65))
+
+        radius = max(1.5, 0.012 * min(width, height))
+        points = []
+        for _ in range(glints):
+            offset = rng.uniform(0.2, 0.8) * diameter
+            direction = rng.uniform(0.0, 2 * np.pi)
+            points.append((center[0] + offset * np.cos(direction), center[1] + offset * np.sin(direction), radius))
+
+        eyelid = None
+        if eyelids and rng.uniform() < 0.5:
+            eyelid = center[1] - 0.5 * axes[1] * rng.uniform(0.4, 2.0)
+
+        yield syntheticEye(size, center, axes, angle, points, eyelid, noise, (seed, index)), (center, axes, angle)
+
+
+def pupilAccuracy(pupils, truths=None):
+    # accuracy of detected pupils against the ground truth pupils ((x, y), (width, height), angle) of the same frames,
+    # as given by syntheticEyes. pupils are Pupil objects or the structured array of detect_batch. returns
+    #   detected       share of frames with a valid pupil (see Pupil.valid(-2))
+    # and unless truths is None
+    #   hitRate        share of frames with a valid pupil whose center is within 10% and whose diameter is within 20%
+    #                  of the true diameter
+    #   centerError    median center error [px] of the valid pupils, None without any
+    #   diameterError  median relative diameter error of the valid pupils, None without any
+    if len(pupils) == 0:
+        raise ValueError('at least one frame is required')
+    if truths is not None and len(truths) != len(pupils):
+        raise ValueError('truths must hold one pupil per frame')
+
+    if isinstance(pupils, np.ndarray):
+        centers, sizes = pupils['center'], pupils['size']
+        confidences, outlineConfidences = pupils['confidence'], pupils['outline_confidence']
+    else:
+        centers = np.array([pupil.center for pupil in pupils], dtype=np.float64)
+        sizes = np.array([pupil.size for pupil in pupils], dtype=np.float64)
+        confidences = np.array([pupil.confidence for pupil in pupils], dtype=np.float64)
+        outlineConfidences = np.array([pupil.outline_confidence for pupil in pupils], dtype=np.float64)
+    valid = (centers > 0).all(axis=1) & (sizes > 0).all(axis=1) & ((confidences > -2) | (outlineConfidences > -2))
+    if truths is None:
+        return {'detected': float(valid.mean())}
+
+    trueCenters = np.array([center for center, axes, angle in truths], dtype=np.float64)
+    diameters = np.array([max(axes) for center, axes, angle in truths], dtype=np.float64)
+    centerErrors = np.hypot(*(centers - trueCenters).T)
+    diameterErrors = np.abs(sizes.max(axis=1) - diameters) / diameters
+    hits = valid & (centerErrors <= 0.1 * diameters) & (diameterErrors <= 0.2)
+    return {
+        'detected': float(valid.mean()),
+        'hitRate': float(hits.mean()),
+        'centerError': float(np.median(centerErrors[valid])) if valid.any() else None,
+        'diameterError': float(np.median(diameterErrors[valid])) if valid.any() else None,
+    }
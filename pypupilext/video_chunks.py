@@ -0,0 +1,170 @@
+import collections
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from .pupil_data import readPupilData
+
+# chunked processing of one long video. the video is scanned once into a persistent index of its frames and
+# keyframes, split into chunks at keyframes which are decoded and detected independently by process_video, i.e. in
+# several processes or on several machines, and the chunk results are merged into one file in frame order
+
+INDEX_SUFFIX = '.index.npz'
+
+VideoChunk = collections.namedtuple('VideoChunk', ['start', 'end'])
+
+
+class VideoIndex:
+    # frame timestamps [ms] and keyframe indices of a video, and the size and modification time of the file it was
+    # built from. keyframes are only known with the FFmpeg backend of OpenCV, otherwise every frame is a keyframe
+
+    def __init__(self, path, timestamps, keyframes, fps, size, fileSize, fileTime):
+        self.path = path
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+        self.fps = fps
+        self.size = size
+        self.fileSize = fileSize
+        self.fileTime = fileTime
+
+    @property
+    def frameCount(self):
+        return len(self.timestamps)
+
+    def matches(self, path):
+        # whether the index was built from the current version of the video file
+        stat = os.stat(path)
+        return stat.st_size == self.fileSize and stat.st_mtime_ns == self.fileTime
+
+    def save(self, index_path):
+        with open(index_path, 'wb') as f:
+            np.savez(f, timestamps=self.timestamps, keyframes=self.keyframes, fps=self.fps, size=self.size,
+                     fileSize=self.fileSize, fileTime=self.fileTime)
+
+    @classmethod
+    def load(cls, index_path, path):
+        with np.load(index_path) as data:
+            return cls(path, data['timestamps'], data['keyframes'], float(data['fps']), tuple(int(v) for v in data['size']),
+                       int(data['fileSize']), int(data['fileTime']))
+
+    def chunks(self, count=None, frames=None):
+        # splits the video into count chunks or chunks of about frames frames. each chunk starts at the keyframe
+        # closest to its even split point, so decoding can start at the chunk itself. the warmup frames of
+        # processVideoChunks lie in the previous chunk and are decoded from the keyframe before them
+        if (count is None) == (frames is None):
+            raise ValueError('either count or frames must be given')
+        if count is None:
+            count = -(-self.frameCount // max(int(frames), 1))
+        if count < 1:
+            raise ValueError('count must be at least 1')
+
+        starts = [0]
+        for split in np.linspace(0, self.frameCount, count + 1)[1:-1]:
+            start = int(self.keyframes[np.argmin(np.abs(self.keyframes - split))]) if len(self.keyframes) else int(split)
+            if start > starts[-1]:
+                starts.append(start)
+        return [VideoChunk(start, end) for start, end in zip(starts, starts[1:] + [self.frameCount]) if end > start]
+
+
+def indexVideo(path, index_path=None, rebuild=False):
+    # returns the VideoIndex of the video at path. the index is loaded from index_path, by default the video path
+    # with INDEX_SUFFIX, unless it is missing, outdated or rebuild is set, then the video is scanned and the index saved
+    if index_path is None:
+        index_path = path + INDEX_SUFFIX
+    if not rebuild and os.path.exists(index_path):
+        index = VideoIndex.load(index_path, path)
+        if index.matches(path):
+            return index
+
+    stat = os.stat(path)
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise RuntimeError('Could not open video: %s' % path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        size = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        # the FFmpeg backend can return the encoded packets instead of decoding them, which also tells the keyframes
+        raw = capture.set(cv2.CAP_PROP_FORMAT, -1)
+        timestamps = []
+        keyframes = []
+        while capture.grab():
+            if not raw or capture.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append(len(timestamps))
+            timestamps.append(capture.get(cv2.CAP_PROP_POS_MSEC))
+    finally:
+        capture.release()
+
+    index = VideoIndex(path, timestamps, keyframes, fps, size, stat.st_size, stat.st_mtime_ns)
+    index.save(index_path)
+    return index
+
+
+def mergeChunks(chunk_paths, out_path):
+    # writes the results of the chunk files, csv or .npy as written by process_video, in the given order to out_path
+    # returns the number of rows
+    if out_path.endswith('.npy'):
+        parts = [readPupilData(chunk_path) for chunk_path in chunk_paths]
+        rows = sum(len(part) for part in parts)
+        merged = np.lib.format.open_memmap(out_path, mode='w+', dtype=parts[0].dtype if parts else None, shape=(rows,))
+        offset = 0
+        for part in parts:
+            merged[offset:offset + len(part)] = part
+            offset += len(part)
+        merged.flush()
+        del merged
+        return rows
+
+    rows = 0
+    with open(out_path, 'w') as out:
+        for i, chunk_path in enumerate(chunk_paths):
+            with open(chunk_path) as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                for line in f:
+                    out.write(line)
+                    rows += 1
+    return rows
+
+
+def processVideoChunks(path, method, params, out_path, workers=None, chunks=None, warmup=30, index=None, mp_context=None):
+    # applies process_video to the chunks of the video in workers processes, one detector instance per process, and
+    # merges the results into out_path in frame order, csv or .npy as process_video. returns the number of frames.
+    # method is a detector name or class, chunks the number of chunks, by default one per worker. each chunk is
+    # preceded by warmup frames which are detected but not written, so tracking detectors like PuReST converge
+    workers = workers or os.cpu_count()
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    if index is None:
+        index = indexVideo(path)
+    videoChunks = index.chunks(count=chunks or workers)
+    if not videoChunks:
+        from . import _pypupil
+        return _pypupil.process_video(path, method, params, out_path, 1)
+
+    extension = '.npy' if out_path.endswith('.npy') else '.csv'
+    chunkDir = tempfile.mkdtemp(prefix='pypupilext-chunks-', dir=os.path.dirname(os.path.abspath(out_path)))
+    try:
+        chunkPaths = [os.path.join(chunkDir, 'chunk_%05d%s' % (i, extension)) for i in range(len(videoChunks))]
+        with ProcessPoolExecutor(max_workers=min(workers, len(videoChunks)), mp_context=mp_context) as executor:
+            futures = [executor.submit(_processChunk, path, method, params, chunkPath, chunk, warmup)
+                       for chunkPath, chunk in zip(chunkPaths, videoChunks)]
+            for chunk, future in zip(videoChunks, futures):
+                if future.result() != chunk.end - chunk.start:
+                    raise RuntimeError('Chunk %d-%d of %s returned %d frames, the video does not match its index'
+                                       % (chunk.start, chunk.end, path, future.result()))
+        return mergeChunks(chunkPaths, out_path)
+    finally:
+        shutil.rmtree(chunkDir, ignore_errors=True)
+
+
+def _processChunk(path, method, params, out_path, chunk, warmup):
+    from . import _pypupil
+
+    return _pypupil.process_video(path, method, params, out_path, 1, first_frame=chunk.start,
+                                  frame_count=chunk.end - chunk.start, warmup=warmup)
@@ -0,0 +1,105 @@
+#include <iostream>
+#include <cstdint>
+#include <cstdio>
+#include "binaryDataWriter.h"
+
+static_assert(sizeof(BinaryDataWriter::Record) == 48, "BinaryDataWriter::Record must not contain padding");
+
+// The header has a fixed size so that it can be rewritten in place once the row count is known
+static const size_t HEADER_SIZE = 384;
+
+static const char *DESCR = "[('timestamp', '<u8'), ('diameter', '<f4'), ('physicalDiameter', '<f4'), ('width', '<f4'), ('height', '<f4'), "
+                           "('center', '<f4', (2,)), ('angle', '<f4'), ('circumference', '<f4'), ('confidence', '<f4'), ('outline_confidence', '<f4')]";
+
+
+BinaryDataWriter::BinaryDataWriter(const std::string& fileName, size_t blockSize) : dataFile(), blockSize(blockSize > 0 ? blockSize : 1), rowCount(0) {
+
+    dataFile.open(fileName, std::ofstream::out | std::ofstream::trunc | std::ofstream::binary);
+
+    if (!dataFile.good() || !dataFile.is_open()) {
+        std::cout << "Data writer failure. Could not open: " << fileName << std::endl;
+        dataFile.close();
+        return;
+    }
+
+    buffer.reserve(this->blockSize);
+    writeHeader();
+}
+
+BinaryDataWriter::~BinaryDataWriter() {
+    close();
+}
+
+void BinaryDataWriter::writeHeader() {
+
+    // Format version 1.0, the row count is padded to a fixed width. Records are written in host byte order,
+    // which is little endian on all supported platforms.
+    char dict[HEADER_SIZE];
+    int len = std::snprintf(dict, sizeof(dict), "{'descr': %s, 'fortran_order': False, 'shape': (%20zu,), }", DESCR, rowCount);
+
+    std::string header = "\x93NUMPY";
+    header += (char) 1;
+    header += (char) 0;
+    uint16_t headerLen = (uint16_t) (HEADER_SIZE - 10);
+    header += (char) (headerLen & 0xff);
+    header += (char) (headerLen >> 8);
+    header.append(dict, len);
+    header.append(HEADER_SIZE - 1 - header.size(), ' ');
+    header += '\n';
+
+    dataFile.seekp(0);
+    dataFile.write(header.data(), header.size());
+}
+
+void BinaryDataWriter::appendPupilData(uint64 timestamp, const Pupil &pupil) {
+
+    if (!dataFile.is_open())
+        return;
+
+    Record record{};
+    record.timestamp = timestamp;
+    record.diameter = (float) pupil.diameter();
+    record.physicalDiameter = pupil.physicalDiameter;
+    record.width = (float) pupil.width();
+    record.height = (float) pupil.height();
+    record.center[0] = pupil.center.x;
+    record.center[1] = pupil.center.y;
+    record.angle = pupil.angle;
+    record.circumference = pupil.circumference();
+    record.confidence = pupil.confidence;
+    record.outline_confidence = pupil.outline_confidence;
+    buffer.push_back(record);
+
+    if (buffer.size() >= blockSize)
+        flush();
+}
+
+void BinaryDataWriter::writePupilData(const std::vector<Pupil>& pupilData) {
+
+    uint64 framePos = 0;
+    for(const auto& pupil: pupilData) {
+        appendPupilData(framePos, pupil);
+        ++framePos;
+    }
+}
+
+void BinaryDataWriter::flush() {
+
+    if (!dataFile.is_open() || buffer.empty())
+        return;
+
+    dataFile.write(reinterpret_cast<const char *>(buffer.data()), (std::streamsize) (buffer.size() * sizeof(Record)));
+    rowCount += buffer.size();
+    buffer.clear();
+    dataFile.flush();
+}
+
+void BinaryDataWriter::close() {
+
+    if (!dataFile.is_open())
+        return;
+
+    flush();
+    writeHeader();
+    dataFile.close();
+}
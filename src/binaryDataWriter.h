@@ -0,0 +1,50 @@
+#ifndef PUPILALGOSIMPLE_BINARYDATAWRITER_H
+#define PUPILALGOSIMPLE_BINARYDATAWRITER_H
+
+#include "pupil-detection-methods/Pupil.h"
+#include <fstream>
+#include <vector>
+
+// Writes pupil data as a structured NumPy .npy file with one fixed-width record per pupil.
+// Records are buffered in memory and written in blocks, the row count in the header is updated on close.
+class BinaryDataWriter {
+
+public:
+
+    // Row layout of the file, matching the numpy dtype written to the header
+    struct Record {
+        uint64 timestamp;
+        float diameter;
+        float physicalDiameter;
+        float width;
+        float height;
+        float center[2];
+        float angle;
+        float circumference;
+        float confidence;
+        float outline_confidence;
+    };
+
+    explicit BinaryDataWriter(const std::string& fileName, size_t blockSize = 4096);
+    ~BinaryDataWriter();
+
+    void writePupilData(const std::vector<Pupil>& pupilData);
+    void appendPupilData(uint64 timestamp, const Pupil &pupil);
+    void flush();
+    void close();
+
+    size_t size() const { return rowCount; }
+
+private:
+
+    std::ofstream dataFile;
+    std::vector<Record> buffer;
+    size_t blockSize;
+    size_t rowCount;
+
+    void writeHeader();
+
+};
+
+
+#endif //PUPILALGOSIMPLE_BINARYDATAWRITER_H
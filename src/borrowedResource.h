@@ -0,0 +1,45 @@
+#ifndef PUPILALGOSIMPLE_BORROWEDRESOURCE_H
+#define PUPILALGOSIMPLE_BORROWEDRESOURCE_H
+
+#include <tbb/concurrent_queue.h>
+#include <tbb/task_arena.h>
+
+// Borrows an idle resource, e.g. a detector which is not thread-safe, from a queue for the lifetime of the guard and
+// returns it even if the work with it throws. There are as many resources as threads in the arena.
+// The work with the resource has to run through isolate(): detectors start nested TBB work, and a thread waiting
+// for it may otherwise take up another outer task, which then blocks waiting for a resource while the thread still
+// holds its own.
+template <typename T>
+class BorrowedResource {
+public:
+    explicit BorrowedResource(tbb::concurrent_bounded_queue<T *> &idle) : idle(idle) {
+        idle.pop(resource);
+    }
+
+    ~BorrowedResource() {
+        idle.push(resource);
+    }
+
+    BorrowedResource(const BorrowedResource &) = delete;
+    BorrowedResource &operator=(const BorrowedResource &) = delete;
+
+    T *operator->() const {
+        return resource;
+    }
+
+    T &operator*() const {
+        return *resource;
+    }
+
+    // Runs work() so that the nested TBB work it starts does not run other outer tasks meanwhile
+    template <typename Work>
+    void isolate(const Work &work) const {
+        tbb::this_task_arena::isolate(work);
+    }
+
+private:
+    tbb::concurrent_bounded_queue<T *> &idle;
+    T *resource = nullptr;
+};
+
+#endif //PUPILALGOSIMPLE_BORROWEDRESOURCE_H
@@ -18,7 +18,7 @@ DataWriter::DataWriter(const std::string& fileName) : dataFile() {
         return;
     }
 
-    dataFile << header << std::endl;
+    dataFile << header << '\n';
 }
 
 DataWriter::~DataWriter() {
@@ -33,7 +33,8 @@ void DataWriter::close() {
 void DataWriter::appendPupilData(uint64 timestamp, const Pupil &pupil, const std::string &filename) {
 
     if (dataFile.good() && dataFile.is_open()) {
-        dataFile<<pupilToQString(timestamp, pupil, filename)<<std::endl;
+        // No flush per row, the stream is flushed when its buffer is full and on close
+        dataFile<<pupilToQString(timestamp, pupil, filename)<<'\n';
     }
 }
 
@@ -49,7 +50,7 @@ void DataWriter::writePupilData(const std::vector<Pupil>& pupilData) {
     int framePos = 0;
     for(const auto& pupil: pupilData) {
         if (dataFile.good() && dataFile.is_open()) {
-            dataFile<<pupilToQString(framePos, pupil, "")<<std::endl;
+            dataFile<<pupilToQString(framePos, pupil, "")<<'\n';
         }
         ++framePos;
     }
@@ -8,12 +8,149 @@
 #include <PuReST.h>
 #include <Starburst.h>
 #include <Swirski2D.h>
+#include <Swirski3D.h>
+#include <PupilTracker.h>
+#include <DetectorCascade.h>
 
 #include "type_converter.h"
 #include "dataWriter.h"
+#include "binaryDataWriter.h"
+#include "videoPipeline.h"
+#include "stereoPipeline.h"
+#include "parameterSweep.h"
 
 namespace py = pybind11;
 
+// Record layout of the structured arrays returned by the batch interfaces
+struct PupilRecord
+{
+    float center[2];
+    float size[2];
+    float angle;
+    float diameter;
+    float confidence;
+    float outline_confidence;
+};
+
+static py::dtype pupilRecordDtype()
+{
+    py::list fields;
+    fields.append(py::make_tuple("center", "<f4", py::make_tuple(2)));
+    fields.append(py::make_tuple("size", "<f4", py::make_tuple(2)));
+    fields.append(py::make_tuple("angle", "<f4"));
+    fields.append(py::make_tuple("diameter", "<f4"));
+    fields.append(py::make_tuple("confidence", "<f4"));
+    fields.append(py::make_tuple("outline_confidence", "<f4"));
+    return py::dtype::from_args(fields);
+}
+
+static py::array pupilsToRecords(const std::vector<Pupil> &pupils)
+{
+    py::array records(pupilRecordDtype(), std::vector<py::ssize_t>{(py::ssize_t)pupils.size()});
+    PupilRecord *record = static_cast<PupilRecord *>(records.mutable_data());
+
+    for (const Pupil &pupil : pupils)
+    {
+        record->center[0] = pupil.center.x;
+        record->center[1] = pupil.center.y;
+        record->size[0] = pupil.size.width;
+        record->size[1] = pupil.size.height;
+        record->angle = pupil.angle;
+        record->diameter = pupil.diameter();
+        record->confidence = pupil.confidence;
+        record->outline_confidence = pupil.outline_confidence;
+        record++;
+    }
+
+    return records;
+}
+
+// Collects the frames of a list of images or of a 3-D uint8 array (frames x rows x cols).
+// Frames of an array reference its memory, which is kept alive through keepAlive.
+static std::vector<cv::Mat> framesFromPython(const py::object &frames, py::object &keepAlive, bool allowCopy)
+{
+    std::vector<cv::Mat> mats;
+
+    if (py::isinstance<py::array>(frames))
+    {
+        py::array array = frames.cast<py::array>();
+        if (array.ndim() != 3)
+            throw py::value_error("frames array must be 3-dimensional (frames x rows x cols)");
+        if (!py::isinstance<py::array_t<uint8_t>>(array))
+            throw py::type_error("frames array must be of type uint8");
+
+        if (array.strides(2) != 1 || array.strides(1) < array.shape(2) || array.strides(0) < 0)
+        {
+            if (!allowCopy)
+                throw py::type_error("frames array cannot be used without a copy: its pixels are not contiguous within a row");
+            array = py::array_t<uint8_t, py::array::c_style>::ensure(array);
+        }
+
+        const uint8_t *data = static_cast<const uint8_t *>(array.data());
+        mats.reserve(array.shape(0));
+        for (py::ssize_t i = 0; i < array.shape(0); i++)
+            mats.emplace_back((int)array.shape(1), (int)array.shape(2), CV_8UC1, const_cast<uint8_t *>(data + i * array.strides(0)), (size_t)array.strides(1));
+
+        keepAlive = array;
+        return mats;
+    }
+
+    if (!py::isinstance<py::sequence>(frames) || py::isinstance<py::str>(frames))
+        throw py::type_error("frames must be a list of images or a 3-D uint8 array");
+
+    for (const py::handle &frame : frames)
+    {
+        mats.emplace_back();
+        if (!NDArrayConverter::toMat(frame.ptr(), mats.back(), allowCopy))
+            throw py::error_already_set();
+    }
+
+    return mats;
+}
+
+// Pickle support: the state of a detection method is its configuration, not the state of the last frames.
+// The first element of every detector state holds the settings of the base class.
+static void checkState(const py::tuple &state, size_t size, const char *name)
+{
+    if (state.size() != size)
+        throw std::runtime_error(std::string("invalid pickle state of ") + name);
+}
+
+static py::tuple methodState(const PupilDetectionMethod &self)
+{
+    const ResolutionController &resolution = self.resolution;
+    return py::make_tuple(self.profiler.enabled, resolution.enabled, resolution.targetMs, resolution.minScale, resolution.maxScale,
+                          resolution.minConfidence, resolution.smoothing, resolution.step);
+}
+
+static void setMethodState(PupilDetectionMethod &self, const py::tuple &state)
+{
+    checkState(state, 8, "PupilDetectionMethod");
+    ResolutionController &resolution = self.resolution;
+    self.profiler.enabled = state[0].cast<bool>();
+    resolution.enabled = state[1].cast<bool>();
+    resolution.targetMs = state[2].cast<double>();
+    resolution.minScale = state[3].cast<float>();
+    resolution.maxScale = state[4].cast<float>();
+    resolution.minConfidence = state[5].cast<float>();
+    resolution.smoothing = state[6].cast<double>();
+    resolution.step = state[7].cast<float>();
+}
+
+static py::tuple pureState(const PuRe &self)
+{
+    return py::make_tuple(methodState(self), self.meanCanthiDistanceMM, self.maxPupilDiameterMM, self.minPupilDiameterMM, self.baseSize);
+}
+
+static void setPureState(PuRe &self, const py::tuple &state)
+{
+    setMethodState(self, state[0].cast<py::tuple>());
+    self.meanCanthiDistanceMM = state[1].cast<float>();
+    self.maxPupilDiameterMM = state[2].cast<float>();
+    self.minPupilDiameterMM = state[3].cast<float>();
+    self.baseSize = state[4].cast<cv::Size>();
+}
+
 PYBIND11_MODULE(_pypupil, m)
 {
 
@@ -25,6 +162,9 @@ PYBIND11_MODULE(_pypupil, m)
 
         NDArrayConverter::init_numpy();
 
+        m.def("setAllowFrameCopy", &NDArrayConverter::setAllowCopy, py::arg("allow"));
+        m.def("allowFrameCopy", &NDArrayConverter::allowCopy);
+
         py::class_<Pupil>(m, "Pupil")
             .def(py::init<>())
             .def_readwrite("confidence", &Pupil::confidence)
@@ -32,6 +172,8 @@ PYBIND11_MODULE(_pypupil, m)
             .def_readwrite("eyelid", &Pupil::eyelid)
             .def_readwrite("physicalDiameter", &Pupil::physicalDiameter)
             .def_readwrite("undistortedDiameter", &Pupil::undistortedDiameter)
+            .def_readwrite("workingScale", &Pupil::workingScale)
+            .def_readwrite("algorithmName", &Pupil::algorithmName)
             .def_readwrite("angle", &Pupil::angle)
             .def_readwrite("center", &Pupil::center)
             .def_readwrite("size", &Pupil::size)
@@ -47,7 +189,29 @@ PYBIND11_MODULE(_pypupil, m)
             .def("minorAxis", &Pupil::minorAxis)
             .def("diameter", &Pupil::diameter)
             .def("circumference", &Pupil::circumference)
-            .def("clear", &Pupil::clear);
+            .def("clear", &Pupil::clear)
+            .def(py::pickle(
+                [](const Pupil &self)
+                {
+                        return py::make_tuple(self.center, self.size, self.angle, self.confidence, self.outline_confidence, self.eyelid,
+                                              self.physicalDiameter, self.undistortedDiameter, self.workingScale, self.algorithmName);
+                },
+                [](const py::tuple &state)
+                {
+                        checkState(state, 10, "Pupil");
+                        Pupil pupil;
+                        pupil.center = state[0].cast<cv::Point2f>();
+                        pupil.size = state[1].cast<cv::Size2f>();
+                        pupil.angle = state[2].cast<float>();
+                        pupil.confidence = state[3].cast<float>();
+                        pupil.outline_confidence = state[4].cast<float>();
+                        pupil.eyelid = state[5].cast<float>();
+                        pupil.physicalDiameter = state[6].cast<float>();
+                        pupil.undistortedDiameter = state[7].cast<float>();
+                        pupil.workingScale = state[8].cast<float>();
+                        pupil.algorithmName = state[9].cast<std::string>();
+                        return pupil;
+                }));
 
         py::class_<DataWriter>(m, "DataWriter")
             .def(py::init<const std::string &>())
@@ -55,20 +219,178 @@ PYBIND11_MODULE(_pypupil, m)
             .def("appendPupilData", &DataWriter::appendPupilData)
             .def("close", &DataWriter::close);
 
+        py::class_<BinaryDataWriter>(m, "BinaryDataWriter")
+            .def(py::init<const std::string &, size_t>(), py::arg("fileName"), py::arg("blockSize") = 4096)
+            .def("writePupilData", &BinaryDataWriter::writePupilData)
+            .def("appendPupilData", &BinaryDataWriter::appendPupilData)
+            .def("flush", &BinaryDataWriter::flush)
+            .def("close", &BinaryDataWriter::close)
+            .def("size", &BinaryDataWriter::size);
+
+        m.def(
+            "process_video", [m](const std::string &path, const py::object &method, const py::object &params, const std::string &outPath, int threads,
+                                 size_t firstFrame, const py::object &frameCount, size_t warmup)
+            {
+                    if (threads < 1)
+                            throw py::value_error("threads must be at least 1");
+                    size_t count = frameCount.is_none() ? std::numeric_limits<size_t>::max() : frameCount.cast<size_t>();
+
+                    // One detector instance per thread, created from the detector class or its name
+                    py::object detectorClass = py::isinstance<py::str>(method) ? m.attr(method) : method;
+
+                    std::vector<py::object> instances;
+                    std::vector<PupilDetectionMethod *> detectors;
+                    for (int i = 0; i < threads; i++)
+                    {
+                            py::object instance = detectorClass();
+                            if (!params.is_none())
+                            {
+                                    for (const auto &item : params.cast<py::dict>())
+                                            py::setattr(instance, item.first, item.second);
+                            }
+                            detectors.push_back(instance.cast<PupilDetectionMethod *>());
+                            instances.push_back(instance);
+                    }
+                    // Tracking detectors depend on the previous frame, which another thread may still be detecting
+                    if (threads > 1 && (dynamic_cast<PuReST *>(detectors[0]) || dynamic_cast<PupilTracker *>(detectors[0])))
+                            throw py::value_error(detectors[0]->title() + " tracks the pupil between frames, its frames can not be detected with more than one thread");
+
+                    py::gil_scoped_release release;
+                    return processVideo(path, outPath, detectors, 0, firstFrame, count, warmup);
+            },
+            py::arg("path"), py::arg("method"), py::arg("params").none(true), py::arg("out_path"), py::arg("threads") = 1,
+            py::arg("first_frame") = 0, py::arg("frame_count") = py::none(), py::arg("warmup") = 0);
+
+        m.def(
+            "sweep_parameters", [](const py::object &frames, const py::list &detectorSets, bool shareStages, const py::object &copy)
+            {
+                    bool allowCopy = copy.is_none() ? NDArrayConverter::allowCopy() : copy.cast<bool>();
+
+                    // One list of detectors per thread, each with one detector per configuration
+                    std::vector<std::vector<PupilDetectionMethod *>> detectors;
+                    for (const auto &set : detectorSets)
+                    {
+                            detectors.emplace_back();
+                            for (const auto &detector : set.cast<py::list>())
+                                    detectors.back().push_back(detector.cast<PupilDetectionMethod *>());
+                    }
+
+                    py::object keepAlive;
+                    std::vector<cv::Mat> mats = framesFromPython(frames, keepAlive, allowCopy);
+                    std::vector<Pupil> pupils;
+                    std::vector<double> durationsMs;
+                    {
+                            py::gil_scoped_release release;
+                            sweepParameters(mats, detectors, shareStages, pupils, durationsMs);
+                    }
+
+                    // Both as frames x configurations
+                    py::ssize_t configurations = detectors.empty() ? 0 : (py::ssize_t)detectors[0].size();
+                    py::array records = pupilsToRecords(pupils).attr("reshape")((py::ssize_t)mats.size(), configurations);
+                    py::array_t<double> durations({(py::ssize_t)mats.size(), configurations});
+                    std::copy(durationsMs.begin(), durationsMs.end(), durations.mutable_data());
+                    return py::make_tuple(records, durations);
+            },
+            py::arg("frames"), py::arg("detector_sets"), py::arg("share_stages") = true, py::arg("copy") = py::none());
+
+        py::class_<StereoPupilPipeline>(m, "StereoPupilPipeline")
+            .def(py::init<PupilDetectionMethod *, PupilDetectionMethod *,
+                          const cv::Mat &, const cv::Mat &, const cv::Mat &, const cv::Mat &,
+                          const cv::Mat &, const cv::Mat &, const cv::Mat &, const cv::Mat &>(),
+                 py::arg("detector"), py::arg("detectorSecondary"),
+                 py::arg("cameraMatrix"), py::arg("distCoeffs"), py::arg("rectificationTransform"), py::arg("projectionMatrix"),
+                 py::arg("cameraMatrixSecondary"), py::arg("distCoeffsSecondary"), py::arg("rectificationTransformSecondary"), py::arg("projectionMatrixSecondary"),
+                 py::keep_alive<1, 2>(), py::keep_alive<1, 3>())
+            .def(
+                "run", [](StereoPupilPipeline &self, const cv::Mat &frame, const cv::Mat &frameSecondary)
+                {
+                        Pupil pupil, pupilSecondary;
+                        double diameter;
+                        {
+                                py::gil_scoped_release release;
+                                diameter = self.run(frame, frameSecondary, pupil, pupilSecondary);
+                        }
+                        return py::make_tuple(pupil, pupilSecondary, diameter);
+                },
+                py::arg("frame"), py::arg("frameSecondary"))
+            .def("triangulate", &StereoPupilPipeline::triangulate, py::arg("pupil"), py::arg("pupilSecondary"));
+
+        py::class_<StageProfiler>(m, "StageProfiler")
+            .def_readwrite("enabled", &StageProfiler::enabled)
+            .def("reset", &StageProfiler::reset)
+            .def(
+                "stats", [](const StageProfiler &self)
+                {
+                        py::dict result;
+                        for (const auto &item : self.stats())
+                        {
+                                const StageProfiler::Statistic &statistic = item.second;
+                                py::dict stage;
+                                stage["unit"] = statistic.timing ? "ms" : "count";
+                                stage["calls"] = statistic.calls;
+                                stage["total"] = statistic.total;
+                                stage["mean"] = statistic.total / statistic.calls;
+                                stage["min"] = statistic.min;
+                                stage["max"] = statistic.max;
+                                stage["histogram"] = py::array_t<size_t>(statistic.histogram.size(), statistic.histogram.data());
+                                result[py::str(item.first)] = stage;
+                        }
+                        return result;
+                });
+
+        py::class_<ResolutionController>(m, "ResolutionController")
+            .def_readwrite("enabled", &ResolutionController::enabled)
+            .def_readwrite("targetMs", &ResolutionController::targetMs)
+            .def_readwrite("minScale", &ResolutionController::minScale)
+            .def_readwrite("maxScale", &ResolutionController::maxScale)
+            .def_readwrite("minConfidence", &ResolutionController::minConfidence)
+            .def_readwrite("smoothing", &ResolutionController::smoothing)
+            .def_readwrite("step", &ResolutionController::step)
+            .def("scale", &ResolutionController::scale)
+            .def("averageMs", &ResolutionController::averageMs)
+            .def("adjustments", &ResolutionController::adjustments)
+            .def("reset", &ResolutionController::reset);
+
         py::class_<PupilDetectionMethod>(m, "PupilDetectionMethod")
             //.def(py::init<>())
             .def("title", &PupilDetectionMethod::title)
             .def("description", &PupilDetectionMethod::description)
+            .def_property_readonly(
+                "profiler", [](PupilDetectionMethod &self) -> StageProfiler &
+                { return self.profiler; },
+                py::return_value_policy::reference_internal)
+            .def_property_readonly(
+                "resolution", [](PupilDetectionMethod &self) -> ResolutionController &
+                { return self.resolution; },
+                py::return_value_policy::reference_internal)
+            .def("hasAdaptiveResolution", &PupilDetectionMethod::hasAdaptiveResolution)
             .def("hasConfidence", &PupilDetectionMethod::hasConfidence)
             .def("hasCoarseLocation", &PupilDetectionMethod::hasCoarseLocation)
             .def("hasInliers", &PupilDetectionMethod::hasInliers)
-            .def("runWithConfidence", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::runWithConfidence)
-            .def("runWithConfidence", (Pupil(PupilDetectionMethod::*)(const cv::Mat &)) & PupilDetectionMethod::runWithConfidence)
-            .def("runWithConfidence", (void(PupilDetectionMethod::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PupilDetectionMethod::runWithConfidence)
+            .def("seedPupil", &PupilDetectionMethod::seedPupil, py::arg("pupil"))
+            .def("runWithConfidence", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::runWithConfidence, py::call_guard<py::gil_scoped_release>())
+            .def("runWithConfidence", (Pupil(PupilDetectionMethod::*)(const cv::Mat &)) & PupilDetectionMethod::runWithConfidence, py::call_guard<py::gil_scoped_release>())
+            .def("runWithConfidence", (void(PupilDetectionMethod::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PupilDetectionMethod::runWithConfidence, py::call_guard<py::gil_scoped_release>())
+
+            .def("run", (Pupil(PupilDetectionMethod::*)(const cv::Mat &)) & PupilDetectionMethod::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PupilDetectionMethod::run, py::call_guard<py::gil_scoped_release>())
+
+            .def(
+                "detect_batch", [](PupilDetectionMethod &self, const py::object &frames, const py::object &copy)
+                {
+                        bool allowCopy = copy.is_none() ? NDArrayConverter::allowCopy() : copy.cast<bool>();
 
-            .def("run", (Pupil(PupilDetectionMethod::*)(const cv::Mat &)) & PupilDetectionMethod::run)
-            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::run)
-            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PupilDetectionMethod::run)
+                        py::object keepAlive;
+                        std::vector<cv::Mat> mats = framesFromPython(frames, keepAlive, allowCopy);
+                        std::vector<Pupil> pupils;
+                        {
+                                py::gil_scoped_release release;
+                                self.runWithConfidence(mats, pupils);
+                        }
+                        return pupilsToRecords(pupils);
+                },
+                py::arg("frames"), py::arg("copy") = py::none())
 
             .def_static("outlineContrastConfidence", &PupilDetectionMethod::outlineContrastConfidence)
             .def_static("coarsePupilDetection", &PupilDetectionMethod::coarsePupilDetection)
@@ -81,27 +403,55 @@ PYBIND11_MODULE(_pypupil, m)
             .def(py::init<>())
             .def_readwrite("minAreaRatio", &ElSe::minAreaRatio)
             .def_readwrite("maxAreaRatio", &ElSe::maxAreaRatio)
+            .def_readwrite("threads", &ElSe::threads)
+            .def(py::pickle(
+                [](const ElSe &self)
+                { return py::make_tuple(methodState(self), self.minAreaRatio, self.maxAreaRatio, self.threads); },
+                [](const py::tuple &state)
+                {
+                        checkState(state, 4, "ElSe");
+                        auto detector = std::make_unique<ElSe>();
+                        setMethodState(*detector, state[0].cast<py::tuple>());
+                        detector->minAreaRatio = state[1].cast<float>();
+                        detector->maxAreaRatio = state[2].cast<float>();
+                        detector->threads = state[3].cast<int>();
+                        return detector;
+                }))
 
             .def("hasConfidence", &ElSe::hasConfidence)
             .def("hasCoarseLocation", &ElSe::hasCoarseLocation)
             .def("hasInliers", &ElSe::hasInliers)
 
-            .def("run", (Pupil(ElSe::*)(const cv::Mat &)) & ElSe::run)
-            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::run)
-            .def("run", (void(ElSe::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & ElSe::run);
+            .def("run", (Pupil(ElSe::*)(const cv::Mat &)) & ElSe::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(ElSe::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & ElSe::run, py::call_guard<py::gil_scoped_release>());
 
         py::class_<ExCuSe, PupilDetectionMethod>(m, "ExCuSe")
             .def(py::init<>())
             .def_readwrite("max_ellipse_radi", &ExCuSe::max_ellipse_radi)
             .def_readwrite("good_ellipse_threshold", &ExCuSe::good_ellipse_threshold)
+            .def_readwrite("threads", &ExCuSe::threads)
+            .def(py::pickle(
+                [](const ExCuSe &self)
+                { return py::make_tuple(methodState(self), self.max_ellipse_radi, self.good_ellipse_threshold, self.threads); },
+                [](const py::tuple &state)
+                {
+                        checkState(state, 4, "ExCuSe");
+                        auto detector = std::make_unique<ExCuSe>();
+                        setMethodState(*detector, state[0].cast<py::tuple>());
+                        detector->max_ellipse_radi = state[1].cast<int>();
+                        detector->good_ellipse_threshold = state[2].cast<int>();
+                        detector->threads = state[3].cast<int>();
+                        return detector;
+                }))
 
             .def("hasConfidence", &ExCuSe::hasConfidence)
             .def("hasCoarseLocation", &ExCuSe::hasCoarseLocation)
             .def("hasInliers", &ExCuSe::hasInliers)
 
-            .def("run", (Pupil(ExCuSe::*)(const cv::Mat &)) & ExCuSe::run)
-            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::run)
-            .def("run", (void(ExCuSe::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & ExCuSe::run);
+            .def("run", (Pupil(ExCuSe::*)(const cv::Mat &)) & ExCuSe::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(ExCuSe::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & ExCuSe::run, py::call_guard<py::gil_scoped_release>());
 
         py::class_<PuRe, PupilDetectionMethod>(m, "PuRe")
             .def(py::init<>())
@@ -109,34 +459,80 @@ PYBIND11_MODULE(_pypupil, m)
             .def_readwrite("maxPupilDiameterMM", &PuRe::maxPupilDiameterMM)
             .def_readwrite("minPupilDiameterMM", &PuRe::minPupilDiameterMM)
             .def_readwrite("baseSize", &PuRe::baseSize)
+            .def(py::pickle(
+                [](const PuRe &self)
+                { return pureState(self); },
+                [](const py::tuple &state)
+                {
+                        checkState(state, 5, "PuRe");
+                        auto detector = std::make_unique<PuRe>();
+                        setPureState(*detector, state);
+                        return detector;
+                }))
 
             .def("hasPupilOutline", &PuRe::hasPupilOutline)
+            .def("allocationCount", &PuRe::allocationCount)
             .def("hasConfidence", &PuRe::hasConfidence)
             .def("hasCoarseLocation", &PuRe::hasCoarseLocation)
             .def("hasInliers", &PuRe::hasInliers)
 
-            .def("run", (Pupil(PuRe::*)(const cv::Mat &)) & PuRe::run)
-            .def("run", (void(PuRe::*)(const cv::Mat &, Pupil &)) & PuRe::run)
-            .def("run", (void(PuRe::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PuRe::run);
+            .def("run", (Pupil(PuRe::*)(const cv::Mat &)) & PuRe::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PuRe::*)(const cv::Mat &, Pupil &)) & PuRe::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PuRe::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PuRe::run, py::call_guard<py::gil_scoped_release>());
 
-        py::class_<PuReST, PupilDetectionMethod>(m, "PuReST")
+        py::class_<PuReST, PupilDetectionMethod> puReST(m, "PuReST");
+
+        py::enum_<PuReST::Branch>(puReST, "Branch")
+            .value("NoPupil", PuReST::Branch::NoPupil)
+            .value("Detection", PuReST::Branch::Detection)
+            .value("OutlineTracking", PuReST::Branch::OutlineTracking)
+            .value("GreedySearch", PuReST::Branch::GreedySearch)
+            .value("Fallback", PuReST::Branch::Fallback);
+
+        puReST
             .def(py::init<>())
+            .def_readwrite("fullFrameFallback", &PuReST::fullFrameFallback)
             .def_readwrite("meanCanthiDistanceMM", &PuReST::meanCanthiDistanceMM)
             .def_readwrite("maxPupilDiameterMM", &PuReST::maxPupilDiameterMM)
             .def_readwrite("minPupilDiameterMM", &PuReST::minPupilDiameterMM)
             .def_readwrite("baseSize", &PuReST::baseSize)
+            .def(py::pickle(
+                [](const PuReST &self)
+                { return py::make_tuple(pureState(self), self.fullFrameFallback); },
+                [](const py::tuple &state)
+                {
+                        checkState(state, 2, "PuReST");
+                        auto detector = std::make_unique<PuReST>();
+                        setPureState(*detector, state[0].cast<py::tuple>());
+                        detector->fullFrameFallback = state[1].cast<bool>();
+                        return detector;
+                }))
 
             .def("hasPupilOutline", &PuReST::hasPupilOutline)
+            .def("allocationCount", &PuReST::allocationCount)
             .def("hasConfidence", &PuReST::hasConfidence)
             .def("hasCoarseLocation", &PuReST::hasCoarseLocation)
             .def("hasInliers", &PuReST::hasInliers)
 
             .def("reset", &PuReST::reset)
+            .def("lastBranch", &PuReST::lastBranch)
+            .def(
+                "lastTimings", [](const PuReST &self)
+                {
+                        const PuReST::Timings &timings = self.lastTimings();
+                        py::dict result;
+                        result["preprocessing"] = timings.preprocessing;
+                        result["outlineTracking"] = timings.outlineTracking;
+                        result["greedySearch"] = timings.greedySearch;
+                        result["fallback"] = timings.fallback;
+                        result["total"] = timings.total;
+                        return result;
+                })
 
-            .def("run", (Pupil(PuReST::*)(const cv::Mat &)) & PuReST::run)
-            .def("run", (void(PuReST::*)(const cv::Mat &, Pupil &)) & PuReST::run)
-            .def("run", (void(PuReST::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PuReST::run)
-            .def("runTracking", &PuReST::runTracking);
+            .def("run", (Pupil(PuReST::*)(const cv::Mat &)) & PuReST::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PuReST::*)(const cv::Mat &, Pupil &)) & PuReST::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PuReST::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PuReST::run, py::call_guard<py::gil_scoped_release>())
+            .def("runTracking", &PuReST::runTracking, py::call_guard<py::gil_scoped_release>());
 
         py::class_<Starburst, PupilDetectionMethod>(m, "Starburst")
             .def(py::init<>())
@@ -145,13 +541,37 @@ PYBIND11_MODULE(_pypupil, m)
             .def_readwrite("min_feature_candidates", &Starburst::min_feature_candidates)
             .def_readwrite("corneal_reflection_ratio_to_image_size", &Starburst::corneal_reflection_ratio_to_image_size)
             .def_readwrite("crWindowSize", &Starburst::crWindowSize)
+            .def_readwrite("ransac_seed", &Starburst::ransac_seed)
+            .def_readwrite("ransac_confidence", &Starburst::ransac_confidence)
+            .def_readwrite("ransac_max_iterations", &Starburst::ransac_max_iterations)
+            .def(py::pickle(
+                [](const Starburst &self)
+                {
+                        return py::make_tuple(methodState(self), self.edge_threshold, self.rays, self.min_feature_candidates, self.corneal_reflection_ratio_to_image_size,
+                                              self.crWindowSize, self.ransac_seed, self.ransac_confidence, self.ransac_max_iterations);
+                },
+                [](const py::tuple &state)
+                {
+                        checkState(state, 9, "Starburst");
+                        auto detector = std::make_unique<Starburst>();
+                        setMethodState(*detector, state[0].cast<py::tuple>());
+                        detector->edge_threshold = state[1].cast<int>();
+                        detector->rays = state[2].cast<int>();
+                        detector->min_feature_candidates = state[3].cast<int>();
+                        detector->corneal_reflection_ratio_to_image_size = state[4].cast<int>();
+                        detector->crWindowSize = state[5].cast<int>();
+                        detector->ransac_seed = state[6].cast<unsigned int>();
+                        detector->ransac_confidence = state[7].cast<double>();
+                        detector->ransac_max_iterations = state[8].cast<int>();
+                        return detector;
+                }))
 
             .def("hasConfidence", &Starburst::hasConfidence)
             .def("hasCoarseLocation", &Starburst::hasCoarseLocation)
             .def("hasInliers", &Starburst::hasInliers)
 
-            .def("run", (Pupil(Starburst::*)(const cv::Mat &)) & Starburst::run)
-            .def("run", (void(Starburst::*)(const cv::Mat &, Pupil &)) & Starburst::run);
+            .def("run", (Pupil(Starburst::*)(const cv::Mat &)) & Starburst::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(Starburst::*)(const cv::Mat &, Pupil &)) & Starburst::run, py::call_guard<py::gil_scoped_release>());
 
         py::class_<TrackerParams>(m, "TrackerParams")
             .def_readwrite("Radius_Min", &TrackerParams::Radius_Min)
@@ -165,17 +585,131 @@ PYBIND11_MODULE(_pypupil, m)
             .def_readwrite("ImageAwareSupport", &TrackerParams::ImageAwareSupport)
             .def_readwrite("EarlyTerminationPercentage", &TrackerParams::EarlyTerminationPercentage)
             .def_readwrite("EarlyRejection", &TrackerParams::EarlyRejection)
-            .def_readwrite("Seed", &TrackerParams::Seed);
+            .def_readwrite("Seed", &TrackerParams::Seed)
+            .def(py::pickle(
+                [](const TrackerParams &self)
+                {
+                        return py::make_tuple(self.Radius_Min, self.Radius_Max, self.CannyBlur, self.CannyThreshold1, self.CannyThreshold2, self.StarburstPoints,
+                                              self.PercentageInliers, self.InlierIterations, self.ImageAwareSupport, self.EarlyTerminationPercentage, self.EarlyRejection, self.Seed);
+                },
+                [](const py::tuple &state)
+                {
+                        checkState(state, 12, "TrackerParams");
+                        TrackerParams params;
+                        params.Radius_Min = state[0].cast<int>();
+                        params.Radius_Max = state[1].cast<int>();
+                        params.CannyBlur = state[2].cast<double>();
+                        params.CannyThreshold1 = state[3].cast<double>();
+                        params.CannyThreshold2 = state[4].cast<double>();
+                        params.StarburstPoints = state[5].cast<int>();
+                        params.PercentageInliers = state[6].cast<int>();
+                        params.InlierIterations = state[7].cast<int>();
+                        params.ImageAwareSupport = state[8].cast<bool>();
+                        params.EarlyTerminationPercentage = state[9].cast<int>();
+                        params.EarlyRejection = state[10].cast<bool>();
+                        params.Seed = state[11].cast<int>();
+                        return params;
+                }));
 
         py::class_<Swirski2D, PupilDetectionMethod>(m, "Swirski2D")
             .def(py::init<>())
             .def_readwrite("params", &Swirski2D::params)
+            .def(py::pickle(
+                [](const Swirski2D &self)
+                { return py::make_tuple(methodState(self), self.params); },
+                [](const py::tuple &state)
+                {
+                        checkState(state, 2, "Swirski2D");
+                        auto detector = std::make_unique<Swirski2D>();
+                        setMethodState(*detector, state[0].cast<py::tuple>());
+                        detector->params = state[1].cast<TrackerParams>();
+                        return detector;
+                }))
 
             .def("hasConfidence", &Swirski2D::hasConfidence)
             .def("hasCoarseLocation", &Swirski2D::hasCoarseLocation)
             .def("hasInliers", &Swirski2D::hasInliers)
 
-            .def("run", (Pupil(Swirski2D::*)(const cv::Mat &)) & Swirski2D::run)
-            .def("run", (void(Swirski2D::*)(const cv::Mat &, Pupil &)) & Swirski2D::run)
-            .def("run", (void(Swirski2D::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & Swirski2D::run);
+            .def("run", (Pupil(Swirski2D::*)(const cv::Mat &)) & Swirski2D::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(Swirski2D::*)(const cv::Mat &, Pupil &)) & Swirski2D::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(Swirski2D::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & Swirski2D::run, py::call_guard<py::gil_scoped_release>());
+
+        py::class_<Swirski3D, PupilDetectionMethod>(m, "Swirski3D")
+            .def(py::init<double, double, double>(),
+                 py::arg("focalLength"), py::arg("regionBandWidth") = 5.0, py::arg("regionStepEpsilon") = 0.5)
+            .def(py::init<PupilDetectionMethod *, double, double, double>(),
+                 py::arg("detector"), py::arg("focalLength"), py::arg("regionBandWidth") = 5.0, py::arg("regionStepEpsilon") = 0.5,
+                 py::keep_alive<1, 2>())
+            .def_readwrite("fitterMaxCount", &Swirski3D::fitter_max_count)
+            .def_readwrite("reliabilityThreshold", &Swirski3D::reliability_threshold)
+
+            .def("hasConfidence", &Swirski3D::hasConfidence)
+            .def("hasCoarseLocation", &Swirski3D::hasCoarseLocation)
+            .def("hasInliers", &Swirski3D::hasInliers)
+
+            .def("isModelBuilt", &Swirski3D::is_model_built)
+            .def("observationCount", &Swirski3D::observation_count)
+            .def("pendingObservations", &Swirski3D::pending_observations)
+            .def("modelVersion", &Swirski3D::model_version)
+            .def("failedFits", &Swirski3D::failed_fits)
+            .def("lastReliability", &Swirski3D::last_reliability)
+            .def("isLastReliable", &Swirski3D::is_last_reliable)
+            .def(
+                "eyeModel", [](Swirski3D &self) -> py::object
+                {
+                        const sef::EyeModelFitter::Sphere eye = self.eye_model();
+                        if (!eye)
+                                return py::none();
+                        py::dict result;
+                        result["centre"] = py::make_tuple(eye.centre[0], eye.centre[1], eye.centre[2]);
+                        result["radius"] = eye.radius;
+                        return result;
+                })
+            .def("waitForModel", &Swirski3D::wait_for_model, py::arg("timeoutMs") = -1, py::call_guard<py::gil_scoped_release>())
+            .def("resetModel", &Swirski3D::reset_model)
+
+            .def("run", (Pupil(Swirski3D::*)(const cv::Mat &)) & Swirski3D::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PupilDetectionMethod::*)(const cv::Mat &, Pupil &)) & PupilDetectionMethod::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(Swirski3D::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & Swirski3D::run, py::call_guard<py::gil_scoped_release>());
+
+        py::class_<PupilTracker, PupilDetectionMethod>(m, "PupilTracker")
+            .def(py::init<PupilDetectionMethod *>(), py::arg("detector"), py::keep_alive<1, 2>())
+            .def_readwrite("minConfidence", &PupilTracker::minConfidence)
+            .def_readwrite("roiScale", &PupilTracker::roiScale)
+            .def_readwrite("minRoiSize", &PupilTracker::minRoiSize)
+            .def_readwrite("roiGrowth", &PupilTracker::roiGrowth)
+            .def_readwrite("diameterTolerance", &PupilTracker::diameterTolerance)
+            .def_readwrite("maxMisses", &PupilTracker::maxMisses)
+
+            .def("hasConfidence", &PupilTracker::hasConfidence)
+            .def("hasCoarseLocation", &PupilTracker::hasCoarseLocation)
+            .def("hasInliers", &PupilTracker::hasInliers)
+
+            .def("reset", &PupilTracker::reset)
+            .def("isTracking", &PupilTracker::isTracking)
+            .def("searchWindow", &PupilTracker::searchWindow)
+            .def("hitCount", &PupilTracker::hitCount)
+            .def("missCount", &PupilTracker::missCount)
+            .def("resetCount", &PupilTracker::resetCount)
+
+            .def("run", (Pupil(PupilTracker::*)(const cv::Mat &)) & PupilTracker::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PupilTracker::*)(const cv::Mat &, Pupil &)) & PupilTracker::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(PupilTracker::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & PupilTracker::run, py::call_guard<py::gil_scoped_release>());
+
+        py::class_<DetectorCascade, PupilDetectionMethod>(m, "DetectorCascade")
+            .def(py::init<>())
+            .def("addStage", &DetectorCascade::addStage, py::arg("detector"), py::arg("minConfidence"), py::keep_alive<1, 2>())
+            .def("stageCount", &DetectorCascade::stageCount)
+            .def("lastStage", &DetectorCascade::lastStage)
+            .def("stageRuns", &DetectorCascade::stageRuns)
+            .def("stageResults", &DetectorCascade::stageResults)
+            .def("resetCounters", &DetectorCascade::resetCounters)
+
+            .def("hasConfidence", &DetectorCascade::hasConfidence)
+            .def("hasCoarseLocation", &DetectorCascade::hasCoarseLocation)
+            .def("hasInliers", &DetectorCascade::hasInliers)
+
+            .def("run", (Pupil(DetectorCascade::*)(const cv::Mat &)) & DetectorCascade::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(DetectorCascade::*)(const cv::Mat &, Pupil &)) & DetectorCascade::run, py::call_guard<py::gil_scoped_release>())
+            .def("run", (void(DetectorCascade::*)(const cv::Mat &, const cv::Rect &, Pupil &, const float &, const float &)) & DetectorCascade::run, py::call_guard<py::gil_scoped_release>());
 }
\ No newline at end of file
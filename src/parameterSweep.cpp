@@ -0,0 +1,76 @@
+#include "parameterSweep.h"
+#include "borrowedResource.h"
+
+#include <tbb/tbb.h>
+#include <memory>
+#include <stdexcept>
+
+namespace {
+
+struct SweepWorker {
+    const std::vector<PupilDetectionMethod *> *detectors;
+    FrameStages stages;
+};
+
+}
+
+void sweepParameters(const std::vector<cv::Mat> &frames, const std::vector<std::vector<PupilDetectionMethod *>> &detectorSets, bool shareStages,
+                     std::vector<Pupil> &pupils, std::vector<double> &durationsMs) {
+
+    if (detectorSets.empty() || detectorSets[0].empty())
+        throw std::invalid_argument("At least one detector is required.");
+    size_t configurations = detectorSets[0].size();
+    for (const auto &detectors : detectorSets) {
+        if (detectors.size() != configurations)
+            throw std::invalid_argument("All detector sets must have the same number of detectors.");
+    }
+
+    pupils.assign(frames.size() * configurations, Pupil());
+    durationsMs.assign(frames.size() * configurations, 0.0);
+
+    // Detectors are not thread-safe, each frame borrows an idle set for the detection of all configurations
+    std::vector<std::unique_ptr<SweepWorker>> workers;
+    tbb::concurrent_bounded_queue<SweepWorker *> idleWorkers;
+    for (const auto &detectors : detectorSets) {
+        workers.emplace_back(new SweepWorker());
+        workers.back()->detectors = &detectors;
+        idleWorkers.push(workers.back().get());
+    }
+
+    // The detectors must not keep pointers to the stages of the workers once they are gone
+    auto detachStages = [&] {
+        for (const auto &detectors : detectorSets) {
+            for (PupilDetectionMethod *detector : detectors)
+                detector->sharedStages = nullptr;
+        }
+    };
+
+    try {
+        tbb::task_arena arena((int) detectorSets.size());
+        arena.execute([&] {
+            tbb::parallel_for(size_t(0), frames.size(), [&](size_t i) {
+                BorrowedResource<SweepWorker> worker(idleWorkers);
+                worker.isolate([&] {
+                    if (shareStages)
+                        worker->stages.reset(frames[i]);
+
+                    for (size_t c = 0; c < configurations; c++) {
+                        PupilDetectionMethod *detector = (*worker->detectors)[c];
+                        detector->sharedStages = shareStages ? &worker->stages : nullptr;
+                        int64 tick = cv::getTickCount();
+                        detector->runWithConfidence(frames[i], pupils[i * configurations + c]);
+                        durationsMs[i * configurations + c] = 1000.0 * (cv::getTickCount() - tick) / cv::getTickFrequency();
+                    }
+
+                    // Releases the stages of the frame before the worker is borrowed again
+                    if (shareStages)
+                        worker->stages.reset(cv::Mat());
+                });
+            });
+        });
+    } catch (...) {
+        detachStages();
+        throw;
+    }
+    detachStages();
+}
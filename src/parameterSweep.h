@@ -0,0 +1,17 @@
+#ifndef PUPILALGOSIMPLE_PARAMETERSWEEP_H
+#define PUPILALGOSIMPLE_PARAMETERSWEEP_H
+
+#include "pupil-detection-methods/PupilDetectionMethod.h"
+#include <vector>
+
+// Pupil detection with several configurations of detectors on the same frames, e.g. to tune their parameters.
+// Every detector set holds one detector per configuration, in the same order, and is used by one thread at a time,
+// so there are as many threads as sets. Each frame is detected with outline confidence by all detectors of an idle
+// set. With shareStages the detectors of the set share the stages of the frame which do not depend on their
+// parameters, see FrameStages, which are then computed by the first configuration that needs them.
+// pupils and durationsMs are filled frame by frame with one entry per configuration, the durations include the
+// shared stages computed during the detection.
+void sweepParameters(const std::vector<cv::Mat> &frames, const std::vector<std::vector<PupilDetectionMethod *>> &detectorSets, bool shareStages,
+                     std::vector<Pupil> &pupils, std::vector<double> &durationsMs);
+
+#endif //PUPILALGOSIMPLE_PARAMETERSWEEP_H
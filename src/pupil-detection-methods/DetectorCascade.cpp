@@ -0,0 +1,116 @@
+#include "DetectorCascade.h"
+
+#include <algorithm>
+#include <stdexcept>
+
+DetectorCascade::DetectorCascade()
+{
+    mTitle = "Cascade";
+    mDesc = "Confidence gated cascade of pupil detection methods";
+}
+
+void DetectorCascade::addStage(PupilDetectionMethod *detector, const float &minConfidence)
+{
+    if (detector == nullptr)
+        throw std::invalid_argument("DetectorCascade requires a detector.");
+
+    stages.push_back({detector, minConfidence, 0, 0});
+    if (stages.size() > 1)
+        mTitle += " > ";
+    else
+        mTitle += " ";
+    mTitle += detector->title();
+}
+
+std::vector<size_t> DetectorCascade::stageRuns() const
+{
+    std::vector<size_t> runs;
+    for (const Stage &stage : stages)
+        runs.push_back(stage.runs);
+    return runs;
+}
+
+std::vector<size_t> DetectorCascade::stageResults() const
+{
+    std::vector<size_t> results;
+    for (const Stage &stage : stages)
+        results.push_back(stage.results);
+    return results;
+}
+
+void DetectorCascade::resetCounters()
+{
+    for (Stage &stage : stages)
+    {
+        stage.runs = 0;
+        stage.results = 0;
+    }
+    resultStage = -1;
+}
+
+bool DetectorCascade::hasConfidence()
+{
+    return !stages.empty() && std::all_of(stages.begin(), stages.end(), [](const Stage &stage)
+                                          { return stage.detector->hasConfidence(); });
+}
+
+bool DetectorCascade::hasCoarseLocation()
+{
+    return !stages.empty() && std::all_of(stages.begin(), stages.end(), [](const Stage &stage)
+                                          { return stage.detector->hasCoarseLocation(); });
+}
+
+bool DetectorCascade::hasInliers()
+{
+    return !stages.empty() && std::all_of(stages.begin(), stages.end(), [](const Stage &stage)
+                                          { return stage.detector->hasInliers(); });
+}
+
+template <typename Detect>
+void DetectorCascade::runStages(Pupil &pupil, Detect detect)
+{
+    if (stages.empty())
+        throw std::logic_error("DetectorCascade has no stages.");
+
+    pupil.clear();
+    resultStage = -1;
+
+    Pupil candidate;
+    for (size_t i = 0; i < stages.size(); i++)
+    {
+        Stage &stage = stages[i];
+        detect(stage.detector, candidate);
+        stage.runs++;
+
+        if (resultStage < 0 || candidate.outline_confidence > pupil.outline_confidence)
+        {
+            pupil = candidate;
+            resultStage = (int)i;
+        }
+
+        if (candidate.outline_confidence >= stage.minConfidence)
+            break;
+    }
+
+    stages[resultStage].results++;
+    pupil.algorithmName = stages[resultStage].detector->title();
+
+    // Tracking stages continue from the result instead of detecting the next frame from scratch
+    for (size_t i = 0; i < stages.size(); i++)
+    {
+        if ((int)i != resultStage)
+            stages[i].detector->seedPupil(pupil);
+    }
+}
+
+void DetectorCascade::run(const cv::Mat &frame, Pupil &pupil)
+{
+    runStages(pupil, [&](PupilDetectionMethod *detector, Pupil &candidate)
+              { detector->runWithConfidence(frame, candidate); });
+}
+
+void DetectorCascade::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx, const float &maxPupilDiameterPx)
+{
+    runStages(pupil, [&](PupilDetectionMethod *detector, Pupil &candidate)
+              { detector->runWithConfidence(frame, roi, candidate, minPupilDiameterPx, maxPupilDiameterPx); });
+}
@@ -0,0 +1,73 @@
+#ifndef PUPILALGOSIMPLE_DETECTORCASCADE_H
+#define PUPILALGOSIMPLE_DETECTORCASCADE_H
+
+#include <opencv2/core/mat.hpp>
+#include <vector>
+#include "Pupil.h"
+#include "PupilDetectionMethod.h"
+
+// Runs detection methods from the cheapest to the most expensive one, a stage only runs if the
+// outline confidence of the previous stage stays below the threshold of that previous stage.
+// The result is the first pupil reaching its stage threshold, otherwise the one with the highest
+// outline confidence. Its algorithmName is set to the title of the stage that produced it.
+// The other stages are seeded with the result, so tracking stages like PuReST continue from it in the next frame.
+// The detectors are not owned and must outlive the cascade.
+class DetectorCascade : public PupilDetectionMethod
+{
+
+public:
+    DetectorCascade();
+
+    // Appends a stage, minConfidence is the outline confidence at which the cascade stops
+    void addStage(PupilDetectionMethod *detector, const float &minConfidence);
+
+    size_t stageCount() const
+    {
+        return stages.size();
+    }
+
+    Pupil run(const cv::Mat &frame) override
+    {
+        Pupil pupil;
+        run(frame, pupil);
+        return pupil;
+    }
+
+    void run(const cv::Mat &frame, Pupil &pupil) override;
+    void run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx = -1, const float &maxPupilDiameterPx = -1) override;
+
+    // Index of the stage which produced the last result, -1 before the first frame
+    int lastStage() const
+    {
+        return resultStage;
+    }
+
+    // Number of frames each stage was run on
+    std::vector<size_t> stageRuns() const;
+
+    // Number of results each stage produced
+    std::vector<size_t> stageResults() const;
+
+    void resetCounters();
+
+    bool hasConfidence() override;
+    bool hasCoarseLocation() override;
+    bool hasInliers() override;
+
+protected:
+    struct Stage
+    {
+        PupilDetectionMethod *detector;
+        float minConfidence;
+        size_t runs;
+        size_t results;
+    };
+
+    std::vector<Stage> stages;
+    int resultStage = -1;
+
+    template <typename Detect>
+    void runStages(Pupil &pupil, Detect detect);
+};
+
+#endif // PUPILALGOSIMPLE_DETECTORCASCADE_H
@@ -9,14 +9,15 @@
 #include <opencv2/core/mat.hpp>
 #include <opencv2/imgproc.hpp>
 
+#include <array>
 #include <iostream>
 #include <opencv2/opencv.hpp>
+#include <tbb/tbb.h>
 #include "ElSe.h"
+#include "RowParallel.h"
 
 using namespace cv;
 
-float ElSe::minArea = 0;
-float ElSe::maxArea = 0;
 
 #define IMG_SIZE 640 // 400
 #define MAX_LINE 10000
@@ -133,7 +134,7 @@ static int calc_inner_gray(Mat *pic, std::vector<Point> curve, RotatedRect ellip
     return gray_val;
 }
 
-static std::vector<std::vector<Point>> get_curves(Mat *pic, Mat *edge, Mat *magni, int start_x, int end_x, int start_y, int end_y, double mean_dist, int inner_color_range)
+static std::vector<std::vector<Point>> get_curves(Mat *pic, Mat *edge, Mat *magni, int start_x, int end_x, int start_y, int end_y, double mean_dist, int inner_color_range, float min_area, float max_area)
 {
 
     (void)magni;
@@ -262,8 +263,8 @@ static std::vector<std::vector<Point>> get_curves(Mat *pic, Mat *edge, Mat *magn
 
             if (add_curve)
             { // pupil area
-                if (ellipse.size.width * ellipse.size.height < ElSe::minArea ||
-                    ellipse.size.width * ellipse.size.height > ElSe::maxArea)
+                if (ellipse.size.width * ellipse.size.height < min_area ||
+                    ellipse.size.width * ellipse.size.height > max_area)
                     add_curve = false;
             }
 
@@ -307,7 +308,7 @@ static std::vector<std::vector<Point>> get_curves(Mat *pic, Mat *edge, Mat *magn
     return all_curves;
 }
 
-static RotatedRect find_best_edge(Mat *pic, Mat *edge, Mat *magni, int start_x, int end_x, int start_y, int end_y, double mean_dist, int inner_color_range)
+static RotatedRect find_best_edge(Mat *pic, Mat *edge, Mat *magni, int start_x, int end_x, int start_y, int end_y, double mean_dist, int inner_color_range, float min_area, float max_area)
 {
 
     RotatedRect ellipse;
@@ -317,7 +318,7 @@ static RotatedRect find_best_edge(Mat *pic, Mat *edge, Mat *magni, int start_x,
     ellipse.size.height = 0.0;
     ellipse.size.width = 0.0;
 
-    std::vector<std::vector<Point>> all_curves = get_curves(pic, edge, magni, start_x, end_x, start_y, end_y, mean_dist, inner_color_range);
+    std::vector<std::vector<Point>> all_curves = get_curves(pic, edge, magni, start_x, end_x, start_y, end_y, mean_dist, inner_color_range, min_area, max_area);
 
     if (all_curves.size() == 1)
     {
@@ -361,6 +362,7 @@ static void filter_edges(Mat *edge, int start_xx, int end_xx, int start_yy, int
     if (end_y > edge->rows - 5)
         end_y = edge->rows - 5;
 
+    // The passes thin the edges in place and stay sequential, see RowParallel.h
     for (int j = start_y; j < end_y; j++)
         for (int i = start_x; i < end_x; i++)
         {
@@ -741,24 +743,25 @@ static Mat canny_impl(Mat *pic, Mat *magni)
 
     *magni = Mat::zeros(pic->rows, pic->cols, CV_32FC1);
 
-    float *p_res, *p_x, *p_y;
-    for (int i = 0; i < magni->rows; i++)
-    {
-        p_res = magni->ptr<float>(i);
-        p_x = res_x.ptr<float>(i);
-        p_y = res_y.ptr<float>(i);
-
-        for (int j = 0; j < magni->cols; j++)
+    parallel_rows(0, magni->rows, [&](int begin, int end)
+                  {
+        for (int i = begin; i < end; i++)
         {
-            // res.at<float>(j, i)= sqrt( (res_x.at<float>(j, i)*res_x.at<float>(j, i)) + (res_y.at<float>(j, i)*res_y.at<float>(j, i)) );
-            // res.at<float>(j, i)=robust_pytagoras_after_MOLAR_MORRIS(res_x.at<float>(j, i), res_y.at<float>(j, i));
-            // res.at<float>(j, i)=hypot(res_x.at<float>(j, i), res_y.at<float>(j, i));
+            float *p_res = magni->ptr<float>(i);
+            const float *p_x = res_x.ptr<float>(i);
+            const float *p_y = res_y.ptr<float>(i);
 
-            // p_res[j]=__ieee754_hypot(p_x[j], p_y[j]);
+            for (int j = 0; j < magni->cols; j++)
+            {
+                // res.at<float>(j, i)= sqrt( (res_x.at<float>(j, i)*res_x.at<float>(j, i)) + (res_y.at<float>(j, i)*res_y.at<float>(j, i)) );
+                // res.at<float>(j, i)=robust_pytagoras_after_MOLAR_MORRIS(res_x.at<float>(j, i), res_y.at<float>(j, i));
+                // res.at<float>(j, i)=hypot(res_x.at<float>(j, i), res_y.at<float>(j, i));
 
-            p_res[j] = hypot(p_x[j], p_y[j]);
-        }
-    }
+                // p_res[j]=__ieee754_hypot(p_x[j], p_y[j]);
+
+                p_res[j] = hypot(p_x[j], p_y[j]);
+            }
+        } });
 
     // th selection
     int PercentOfPixelsNotEdges = (int)round(0.7 * magni->cols * magni->rows);
@@ -767,25 +770,31 @@ static Mat canny_impl(Mat *pic, Mat *magni)
     float high_th = 0;
     float low_th = 0;
 
-    int h_sz = 64;
-    int hist[64];
-    for (int i = 0; i < h_sz; i++)
-        hist[i] = 0;
+    const int h_sz = 64;
 
     normalize(*magni, *magni, 0, 1, NORM_MINMAX, CV_32FC1);
 
     Mat res_idx = Mat::zeros(pic->rows, pic->cols, CV_8U);
     normalize(*magni, res_idx, 0, 63, NORM_MINMAX, CV_32S);
 
-    int *p_res_idx = 0;
-    for (int i = 0; i < magni->rows; i++)
-    {
-        p_res_idx = res_idx.ptr<int>(i);
-        for (int j = 0; j < magni->cols; j++)
+    std::array<int, h_sz> hist = tbb::parallel_reduce(
+        tbb::blocked_range<int>(0, magni->rows, ROW_GRAIN), std::array<int, h_sz>{},
+        [&](const tbb::blocked_range<int> &range, std::array<int, h_sz> partial)
         {
-            hist[p_res_idx[j]]++;
-        }
-    }
+            for (int i = range.begin(); i < range.end(); i++)
+            {
+                const int *p_res_idx = res_idx.ptr<int>(i);
+                for (int j = 0; j < magni->cols; j++)
+                    partial[p_res_idx[j]]++;
+            }
+            return partial;
+        },
+        [](std::array<int, h_sz> a, const std::array<int, h_sz> &b)
+        {
+            for (int k = 0; k < h_sz; k++)
+                a[k] += b[k];
+            return a;
+        });
 
     int sum = 0;
     for (int i = 0; i < h_sz; i++)
@@ -804,87 +813,87 @@ static Mat canny_impl(Mat *pic, Mat *magni)
     Mat non_ms = Mat::zeros(pic->rows, pic->cols, CV_8U);
     Mat non_ms_hth = Mat::zeros(pic->rows, pic->cols, CV_8U);
 
-    float ix, iy, grad1, grad2, d;
-
-    char *p_non_ms, *p_non_ms_hth;
-    float *p_res_t, *p_res_b;
-    for (int i = 1; i < magni->rows - 1; i++)
-    {
-        p_non_ms = non_ms.ptr<char>(i);
-        p_non_ms_hth = non_ms_hth.ptr<char>(i);
-
-        p_res = magni->ptr<float>(i);
-        p_res_t = magni->ptr<float>(i - 1);
-        p_res_b = magni->ptr<float>(i + 1);
-
-        p_x = res_x.ptr<float>(i);
-        p_y = res_y.ptr<float>(i);
-
-        for (int j = 1; j < magni->cols - 1; j++)
+    // Rows are independent, each band only writes its own rows of non_ms and non_ms_hth
+    parallel_rows(1, magni->rows - 1, [&](int begin, int end)
+                  {
+        for (int i = begin; i < end; i++)
         {
+            char *p_non_ms = non_ms.ptr<char>(i);
+            char *p_non_ms_hth = non_ms_hth.ptr<char>(i);
+
+            const float *p_res = magni->ptr<float>(i);
+            const float *p_res_t = magni->ptr<float>(i - 1);
+            const float *p_res_b = magni->ptr<float>(i + 1);
 
-            iy = p_y[j];
-            ix = p_x[j];
+            const float *p_x = res_x.ptr<float>(i);
+            const float *p_y = res_y.ptr<float>(i);
 
-            if ((iy <= 0 && ix > -iy) || (iy >= 0 && ix < -iy))
+            for (int j = 1; j < magni->cols - 1; j++)
             {
+                float ix, iy, grad1, grad2, d;
 
-                d = abs(iy / ix);
-                grad1 = (p_res[j + 1] * (1 - d)) + (p_res_t[j + 1] * d);
-                grad2 = (p_res[j - 1] * (1 - d)) + (p_res_b[j - 1] * d);
+                iy = p_y[j];
+                ix = p_x[j];
 
-                if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                if ((iy <= 0 && ix > -iy) || (iy >= 0 && ix < -iy))
                 {
-                    p_non_ms[j] = (char)255;
 
-                    if (p_res[j] > high_th)
-                        p_non_ms_hth[j] = (char)255;
-                }
-            }
+                    d = abs(iy / ix);
+                    grad1 = (p_res[j + 1] * (1 - d)) + (p_res_t[j + 1] * d);
+                    grad2 = (p_res[j - 1] * (1 - d)) + (p_res_b[j - 1] * d);
 
-            if ((ix > 0 && -iy >= ix) || (ix < 0 && -iy <= ix))
-            {
-                d = abs(ix / iy);
-                grad1 = (p_res_t[j] * (1 - d)) + (p_res_t[j + 1] * d);
-                grad2 = (p_res_b[j] * (1 - d)) + (p_res_b[j - 1] * d);
+                    if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                    {
+                        p_non_ms[j] = (char)255;
 
-                if (p_res[j] >= grad1 && p_res[j] >= grad2)
-                {
-                    p_non_ms[j] = (char)255;
-                    if (p_res[j] > high_th)
-                        p_non_ms_hth[j] = (char)255;
+                        if (p_res[j] > high_th)
+                            p_non_ms_hth[j] = (char)255;
+                    }
                 }
-            }
-
-            if ((ix <= 0 && ix > iy) || (ix >= 0 && ix < iy))
-            {
-                d = abs(ix / iy);
-                grad1 = (p_res_t[j] * (1 - d)) + (p_res_t[j - 1] * d);
-                grad2 = (p_res_b[j] * (1 - d)) + (p_res_b[j + 1] * d);
 
-                if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                if ((ix > 0 && -iy >= ix) || (ix < 0 && -iy <= ix))
                 {
-                    p_non_ms[j] = (char)255;
-                    if (p_res[j] > high_th)
-                        p_non_ms_hth[j] = (char)255;
+                    d = abs(ix / iy);
+                    grad1 = (p_res_t[j] * (1 - d)) + (p_res_t[j + 1] * d);
+                    grad2 = (p_res_b[j] * (1 - d)) + (p_res_b[j - 1] * d);
+
+                    if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                    {
+                        p_non_ms[j] = (char)255;
+                        if (p_res[j] > high_th)
+                            p_non_ms_hth[j] = (char)255;
+                    }
                 }
-            }
 
-            if ((iy < 0 && ix <= iy) || (iy > 0 && ix >= iy))
-            {
-                d = abs(iy / ix);
-                grad1 = (p_res[j - 1] * (1 - d)) + (p_res_t[j - 1] * d);
-                grad2 = (p_res[j + 1] * (1 - d)) + (p_res_b[j + 1] * d);
+                if ((ix <= 0 && ix > iy) || (ix >= 0 && ix < iy))
+                {
+                    d = abs(ix / iy);
+                    grad1 = (p_res_t[j] * (1 - d)) + (p_res_t[j - 1] * d);
+                    grad2 = (p_res_b[j] * (1 - d)) + (p_res_b[j + 1] * d);
+
+                    if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                    {
+                        p_non_ms[j] = (char)255;
+                        if (p_res[j] > high_th)
+                            p_non_ms_hth[j] = (char)255;
+                    }
+                }
 
-                if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                if ((iy < 0 && ix <= iy) || (iy > 0 && ix >= iy))
                 {
-                    p_non_ms[j] = (char)255;
-                    if (p_res[j] > high_th)
-                        p_non_ms_hth[j] = (char)255;
+                    d = abs(iy / ix);
+                    grad1 = (p_res[j - 1] * (1 - d)) + (p_res_t[j - 1] * d);
+                    grad2 = (p_res[j + 1] * (1 - d)) + (p_res_b[j + 1] * d);
+
+                    if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                    {
+                        p_non_ms[j] = (char)255;
+                        if (p_res[j] > high_th)
+                            p_non_ms_hth[j] = (char)255;
+                    }
                 }
             }
-        }
-    }
+        } });
     ////bw select
 
     // Mat res_lin = Mat::zeros(pic->rows, pic->cols, CV_8U);
@@ -906,61 +915,54 @@ static void mum(Mat *pic, Mat *result, int fak)
 
     *result = Mat::zeros(sz_y, sz_x, CV_8U);
 
-    int hist[256];
-    int mean = 0;
-    int cnt = 0;
-    int mean_2 = 0;
-
-    int idx = 0;
-    int idy = 0;
-
-    for (int i = 0; i < sz_y; i++)
-    {
-        idy += fak_ges;
+    // Every result pixel only reads its own neighbourhood of the (8 bit) input
+    parallel_rows(0, sz_y, [&](int begin, int end)
+                  {
+        int hist[256];
 
-        for (int j = 0; j < sz_x; j++)
+        for (int i = begin; i < end; i++)
         {
-            idx += fak_ges;
+            int idy = (i + 1) * fak_ges;
 
-            for (int k = 0; k < 256; k++)
-                hist[k] = 0;
+            for (int j = 0; j < sz_x; j++)
+            {
+                int idx = (j + 1) * fak_ges;
 
-            mean = 0;
-            cnt = 0;
+                for (int k = 0; k < 256; k++)
+                    hist[k] = 0;
 
-            for (int ii = -fak; ii <= fak; ii++)
-                for (int jj = -fak; jj <= fak; jj++)
-                {
+                int mean = 0;
+                int cnt = 0;
 
-                    if (idy + ii > 0 && idy + ii < pic->rows && idx + jj > 0 && idx + jj < pic->cols)
+                for (int ii = -fak; ii <= fak; ii++)
+                    for (int jj = -fak; jj <= fak; jj++)
                     {
-                        if ((unsigned int)pic->data[(pic->cols * (idy + ii)) + (idx + jj)] > 255)
-                            pic->data[(pic->cols * (idy + ii)) + (idx + jj)] = 255;
 
-                        hist[pic->data[(pic->cols * (idy + ii)) + (idx + jj)]]++;
-                        cnt++;
-                        mean += pic->data[(pic->cols * (idy + ii)) + (idx + jj)];
+                        if (idy + ii > 0 && idy + ii < pic->rows && idx + jj > 0 && idx + jj < pic->cols)
+                        {
+                            hist[pic->data[(pic->cols * (idy + ii)) + (idx + jj)]]++;
+                            cnt++;
+                            mean += pic->data[(pic->cols * (idy + ii)) + (idx + jj)];
+                        }
                     }
-                }
-            mean = mean / cnt;
+                mean = mean / cnt;
 
-            mean_2 = 0;
-            cnt = 0;
-            for (int ii = 0; ii <= mean; ii++)
-            {
-                mean_2 += ii * hist[ii];
-                cnt += hist[ii];
-            }
+                int mean_2 = 0;
+                cnt = 0;
+                for (int ii = 0; ii <= mean; ii++)
+                {
+                    mean_2 += ii * hist[ii];
+                    cnt += hist[ii];
+                }
 
-            if (cnt == 0)
-                mean_2 = mean;
-            else
-                mean_2 = mean_2 / cnt;
+                if (cnt == 0)
+                    mean_2 = mean;
+                else
+                    mean_2 = mean_2 / cnt;
 
-            result->data[(sz_x * (i)) + (j)] = mean_2;
-        }
-        idx = 0;
-    }
+                result->data[(sz_x * (i)) + (j)] = mean_2;
+            }
+        } });
 }
 
 static void gen_blob_neu(int rad, Mat *all_mat, Mat *all_mat_neg)
@@ -1104,7 +1106,6 @@ static RotatedRect blob_finder(Mat *pic)
     Point pos(0, 0);
     float abs_max = 0;
 
-    float *p_erg;
     Mat blob_mat, blob_mat_neg;
 
     int fak_mum = 5;
@@ -1121,48 +1122,64 @@ static RotatedRect blob_finder(Mat *pic)
     img.convertTo(img, CV_32FC1);
     filter2D(img, result, -1, blob_mat, Point(-1, -1), 0, BORDER_REPLICATE);
 
-    float *p_res, *p_neg_res;
-    for (int i = 0; i < result.rows; i++)
-    {
-        p_res = result.ptr<float>(i);
-
-        for (int j = 0; j < result.cols; j++)
+    parallel_rows(0, result.rows, [&](int begin, int end)
+                  {
+        for (int i = begin; i < end; i++)
         {
-            if (p_res[j] < 0)
-                p_res[j] = 0;
-        }
-    }
+            float *p_res = result.ptr<float>(i);
 
-    filter2D(img, result_neg, -1, blob_mat_neg, Point(-1, -1), 0, BORDER_REPLICATE);
+            for (int j = 0; j < result.cols; j++)
+            {
+                if (p_res[j] < 0)
+                    p_res[j] = 0;
+            }
+        } });
 
-    for (int i = 0; i < result.rows; i++)
-    {
-        p_res = result.ptr<float>(i);
-        p_neg_res = result_neg.ptr<float>(i);
-        p_erg = erg.ptr<float>(i);
+    filter2D(img, result_neg, -1, blob_mat_neg, Point(-1, -1), 0, BORDER_REPLICATE);
 
-        for (int j = 0; j < result.cols; j++)
+    parallel_rows(0, result.rows, [&](int begin, int end)
+                  {
+        for (int i = begin; i < end; i++)
         {
-            p_neg_res[j] = (255.0f - p_neg_res[j]);
-            p_erg[j] = (p_neg_res[j]) * (p_res[j]);
-        }
-    }
+            float *p_res = result.ptr<float>(i);
+            float *p_neg_res = result_neg.ptr<float>(i);
+            float *p_erg = erg.ptr<float>(i);
 
-    for (int i = 0; i < erg.rows; i++)
-    {
-        p_erg = erg.ptr<float>(i);
+            for (int j = 0; j < result.cols; j++)
+            {
+                p_neg_res[j] = (255.0f - p_neg_res[j]);
+                p_erg[j] = (p_neg_res[j]) * (p_res[j]);
+            }
+        } });
 
-        for (int j = 0; j < erg.cols; j++)
+    // First maximum in row major order, bands are joined left to right so ties resolve as in a sequential scan
+    std::pair<float, Point> best = tbb::parallel_reduce(
+        tbb::blocked_range<int>(0, erg.rows, ROW_GRAIN), std::make_pair(abs_max, pos),
+        [&](const tbb::blocked_range<int> &range, std::pair<float, Point> partial)
         {
-            if (abs_max < p_erg[j])
+            for (int i = range.begin(); i < range.end(); i++)
             {
-                abs_max = p_erg[j];
+                const float *p_erg = erg.ptr<float>(i);
 
-                pos.x = (fak_mum + 1) + (j * (fak_mum + 1));
-                pos.y = (fak_mum + 1) + (i * (fak_mum + 1));
+                for (int j = 0; j < erg.cols; j++)
+                {
+                    if (partial.first < p_erg[j])
+                    {
+                        partial.first = p_erg[j];
+
+                        partial.second.x = (fak_mum + 1) + (j * (fak_mum + 1));
+                        partial.second.y = (fak_mum + 1) + (i * (fak_mum + 1));
+                    }
+                }
             }
-        }
-    }
+            return partial;
+        },
+        [](const std::pair<float, Point> &left, const std::pair<float, Point> &right)
+        {
+            return left.first < right.first ? right : left;
+        });
+    abs_max = best.first;
+    pos = best.second;
 
     if (pos.y > 0 && pos.y < pic->rows && pos.x > 0 && pos.x < pic->cols)
     {
@@ -1258,28 +1275,50 @@ static RotatedRect blob_finder(Mat *pic)
 }
 
 Pupil ElSe::run(const Mat &frame)
+{
+    Pupil pupil;
+    arena.limit(threads).execute([&]
+                          { pupil = detect(frame); });
+    return pupil;
+}
+
+Pupil ElSe::detect(const Mat &frame)
 {
 
     RotatedRect ellipse;
     Point pos(0, 0);
 
+    // The latency target mode can only lower the working size, the edge buffers hold at most IMG_SIZE pixels
+    int maxSize = (int)(IMG_SIZE * std::min(resolution.scale(), 1.0f));
+
+    // The stages up to the edge selection only depend on the frame and the working size, other instances on the
+    // same frame store them in or take them from the shared stages
+    FrameStages *stages = stagesOf(frame);
+    std::string stageKey = stages ? format("ElSe:%d", maxSize) : std::string();
+    const FrameStages::Stage *shared = stages ? stages->find(stageKey) : nullptr;
+
     Mat downscaled = frame;
     float scalingRatio = 1.0;
-    if (frame.rows > IMG_SIZE || frame.cols > IMG_SIZE)
+    if (frame.rows > maxSize || frame.cols > maxSize)
     {
         // return ellipse;
         // Downscaling
-        float rw = IMG_SIZE / (float)frame.cols;
-        float rh = IMG_SIZE / (float)frame.rows;
+        float rw = maxSize / (float)frame.cols;
+        float rh = maxSize / (float)frame.rows;
         scalingRatio = min<float>(min<float>(rw, rh), 1.0);
-        cv::resize(frame, downscaled, Size(), scalingRatio, scalingRatio, INTER_LINEAR);
+        if (!shared)
+            cv::resize(frame, downscaled, Size(), scalingRatio, scalingRatio, INTER_LINEAR);
     }
 
+    // find_best_edge and blob_finder only read the image and the magnitudes
     Mat pic;
-    normalize(downscaled, pic, 0, 255, NORM_MINMAX, CV_8U);
+    if (shared)
+        pic = shared->images[0];
+    else
+        normalize(downscaled, pic, 0, 255, NORM_MINMAX, CV_8U);
 
-    minArea = downscaled.cols * downscaled.rows * minAreaRatio;
-    maxArea = downscaled.cols * downscaled.rows * maxAreaRatio;
+    minArea = pic.cols * pic.rows * minAreaRatio;
+    maxArea = pic.cols * pic.rows * maxAreaRatio;
 
     double border = 0.0; // ER takes care of setting an ROI
     double mean_dist = 3;
@@ -1291,45 +1330,61 @@ Pupil ElSe::run(const Mat &frame)
     int end_x = pic.cols - start_x;
     int end_y = pic.rows - start_y;
 
-    Mat picpic = Mat::zeros(end_y - start_y, end_x - start_x, CV_8U);
+    Rect region(start_x, start_y, end_x - start_x, end_y - start_y);
+
     Mat magni;
+    Mat detected_edges;
 
-    for (int i = 0; i < picpic.cols; i++)
+    int64 tick = profiler.start();
+    if (shared)
     {
-        for (int j = 0; j < picpic.rows; j++)
-        {
-            picpic.data[(picpic.cols * j) + i] = pic.data[(pic.cols * (start_y + j)) + (start_x + i)];
-        }
+        // find_best_edge removes edges
+        magni = shared->images[1];
+        shared->images[2].copyTo(detected_edges);
+        tick = profiler.lap("sharedStages", tick);
     }
+    else
+    {
+        Mat picpic;
+        pic(region).copyTo(picpic);
 
-    Mat detected_edges2 = canny_impl(&picpic, &magni);
+        Mat detected_edges2 = canny_impl(&picpic, &magni);
+        tick = profiler.lap("canny_impl", tick);
 
-    Mat detected_edges = Mat::zeros(pic.rows, pic.cols, CV_8U);
-    for (int i = 0; i < detected_edges2.cols; i++)
-        for (int j = 0; j < detected_edges2.rows; j++)
-        {
-            detected_edges.data[(detected_edges.cols * (start_y + j)) + (start_x + i)] = detected_edges2.data[(detected_edges2.cols * j) + i];
-        }
+        detected_edges = Mat::zeros(pic.rows, pic.cols, CV_8U);
+        detected_edges2.copyTo(detected_edges(region));
+
+        // cv::imwrite( "edge_image.jpg", detected_edges);
 
-    // cv::imwrite( "edge_image.jpg", detected_edges);
+        filter_edges(&detected_edges, start_x, end_x, start_y, end_y);
+        tick = profiler.lap("filter_edges", tick);
 
-    filter_edges(&detected_edges, start_x, end_x, start_y, end_y);
+        if (stages)
+        {
+            FrameStages::Stage &stage = stages->store(stageKey);
+            stage.images = {pic, magni, detected_edges.clone()};
+        }
+    }
 
     // cv::imwrite( "filtered_edge_image.jpg", detected_edges );
 
-    ellipse = find_best_edge(&pic, &detected_edges, &magni, start_x, end_x, start_y, end_y, mean_dist, inner_color_range);
+    ellipse = find_best_edge(&pic, &detected_edges, &magni, start_x, end_x, start_y, end_y, mean_dist, inner_color_range, minArea, maxArea);
+    tick = profiler.lap("find_best_edge", tick);
 
     if ((ellipse.center.x <= 0 && ellipse.center.y <= 0) || ellipse.center.x >= pic.cols || ellipse.center.y >= pic.rows)
     {
 
         ellipse = blob_finder(&pic);
+        profiler.lap("blob_finder", tick);
         ellipse.angle = 0;
         ellipse.size = Size(0, 0);
     }
 
     cv::RotatedRect scaledEllipse(cv::Point2f(ellipse.center.x / scalingRatio, ellipse.center.y / scalingRatio), cv::Size2f(ellipse.size.width / scalingRatio, ellipse.size.height / scalingRatio), ellipse.angle);
 
-    return Pupil(scaledEllipse);
+    Pupil pupil(scaledEllipse);
+    pupil.workingScale = scalingRatio;
+    return pupil;
 }
 
 void ElSe::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx = -1, const float &maxPupilDiameterPx = -1)
@@ -12,13 +12,16 @@
 */
 
 #include "PupilDetectionMethod.h"
+#include "RowParallel.h"
 
 class ElSe : public PupilDetectionMethod
 {
 
 public:
-    static float minArea;
-    static float maxArea;
+    // Area limits of the current frame, kept per instance so that separate
+    // ElSe objects can run concurrently on different threads
+    float minArea = 0;
+    float maxArea = 0;
 
     ElSe()
     {
@@ -44,8 +47,21 @@ public:
         return false;
     }
 
+    bool hasAdaptiveResolution() override
+    {
+        return true;
+    }
+
     float minAreaRatio = 0.005;
     float maxAreaRatio = 0.2;
+
+    // Number of threads working on the per-pixel stages of a single frame, 0 uses all available cores
+    int threads = 1;
+
+protected:
+    ThreadArena arena;
+
+    Pupil detect(const cv::Mat &frame);
 };
 
 #endif // PUPILALGOSIMPLE_ELSE_H
@@ -9,8 +9,11 @@
 #include <opencv2/core/mat.hpp>
 #include <opencv2/core.hpp>
 #include <opencv2/imgproc.hpp>
+#include <array>
 #include <iostream>
+#include <tbb/tbb.h>
 #include "ExCuSe.h"
+#include "RowParallel.h"
 
 using namespace std;
 using namespace cv;
@@ -169,25 +172,25 @@ static cv::Mat canny_impl(cv::Mat *pic)
 
     cv::Mat res = cv::Mat::zeros(pic->rows, pic->cols, CV_32FC1);
 
-    float *p_res, *p_x, *p_y;
-
-    for (int i = 0; i < res.rows; i++)
-    {
-        p_res = res.ptr<float>(i);
-        p_x = res_x.ptr<float>(i);
-        p_y = res_y.ptr<float>(i);
-
-        for (int j = 0; j < res.cols; j++)
+    parallel_rows(0, res.rows, [&](int begin, int end)
+                  {
+        for (int i = begin; i < end; i++)
         {
-            // res.at<float>(j, i)= sqrt( (res_x.at<float>(j, i)*res_x.at<float>(j, i)) + (res_y.at<float>(j, i)*res_y.at<float>(j, i)) );
-            // res.at<float>(j, i)=robust_pytagoras_after_MOLAR_MORRIS(res_x.at<float>(j, i), res_y.at<float>(j, i));
-            // res.at<float>(j, i)=hypot(res_x.at<float>(j, i), res_y.at<float>(j, i));
+            float *p_res = res.ptr<float>(i);
+            const float *p_x = res_x.ptr<float>(i);
+            const float *p_y = res_y.ptr<float>(i);
 
-            // p_res[j]=__ieee754_hypot(p_x[j], p_y[j]);
+            for (int j = 0; j < res.cols; j++)
+            {
+                // res.at<float>(j, i)= sqrt( (res_x.at<float>(j, i)*res_x.at<float>(j, i)) + (res_y.at<float>(j, i)*res_y.at<float>(j, i)) );
+                // res.at<float>(j, i)=robust_pytagoras_after_MOLAR_MORRIS(res_x.at<float>(j, i), res_y.at<float>(j, i));
+                // res.at<float>(j, i)=hypot(res_x.at<float>(j, i), res_y.at<float>(j, i));
 
-            p_res[j] = hypot(p_x[j], p_y[j]);
-        }
-    }
+                // p_res[j]=__ieee754_hypot(p_x[j], p_y[j]);
+
+                p_res[j] = hypot(p_x[j], p_y[j]);
+            }
+        } });
 
     // th selection
     int PercentOfPixelsNotEdges = 0.7 * res.cols * res.rows;
@@ -196,25 +199,30 @@ static cv::Mat canny_impl(cv::Mat *pic)
     float high_th = 0;
     float low_th = 0;
 
-    int h_sz = 64;
-    int hist[64];
-    for (int i = 0; i < h_sz; i++)
-        hist[i] = 0;
+    const int h_sz = 64;
 
     cv::normalize(res, res, 0, 1, cv::NORM_MINMAX, CV_32FC1);
     cv::Mat res_idx = cv::Mat::zeros(pic->rows, pic->cols, CV_8U);
     cv::normalize(res, res_idx, 0, 63, cv::NORM_MINMAX, CV_32S);
 
-    int *p_res_idx = 0;
-
-    for (int i = 0; i < res.rows; i++)
-    {
-        p_res_idx = res_idx.ptr<int>(i);
-        for (int j = 0; j < res.cols; j++)
+    std::array<int, h_sz> hist = tbb::parallel_reduce(
+        tbb::blocked_range<int>(0, res.rows, ROW_GRAIN), std::array<int, h_sz>{},
+        [&](const tbb::blocked_range<int> &range, std::array<int, h_sz> partial)
         {
-            hist[p_res_idx[j]]++;
-        }
-    }
+            for (int i = range.begin(); i < range.end(); i++)
+            {
+                const int *p_res_idx = res_idx.ptr<int>(i);
+                for (int j = 0; j < res.cols; j++)
+                    partial[p_res_idx[j]]++;
+            }
+            return partial;
+        },
+        [](std::array<int, h_sz> a, const std::array<int, h_sz> &b)
+        {
+            for (int k = 0; k < h_sz; k++)
+                a[k] += b[k];
+            return a;
+        });
 
     int sum = 0;
 
@@ -234,87 +242,87 @@ static cv::Mat canny_impl(cv::Mat *pic)
     cv::Mat non_ms = cv::Mat::zeros(pic->rows, pic->cols, CV_8U);
     cv::Mat non_ms_hth = cv::Mat::zeros(pic->rows, pic->cols, CV_8U);
 
-    float ix, iy, grad1, grad2, d;
-    char *p_non_ms, *p_non_ms_hth;
-    float *p_res_t, *p_res_b;
-
-    for (int i = 1; i < res.rows - 1; i++)
-    {
-        p_non_ms = non_ms.ptr<char>(i);
-        p_non_ms_hth = non_ms_hth.ptr<char>(i);
-
-        p_res = res.ptr<float>(i);
-        p_res_t = res.ptr<float>(i - 1);
-        p_res_b = res.ptr<float>(i + 1);
-
-        p_x = res_x.ptr<float>(i);
-        p_y = res_y.ptr<float>(i);
-
-        for (int j = 1; j < res.cols - 1; j++)
+    // Rows are independent, each band only writes its own rows of non_ms and non_ms_hth
+    parallel_rows(1, res.rows - 1, [&](int begin, int end)
+                  {
+        for (int i = begin; i < end; i++)
         {
+            char *p_non_ms = non_ms.ptr<char>(i);
+            char *p_non_ms_hth = non_ms_hth.ptr<char>(i);
 
-            iy = p_y[j];
-            ix = p_x[j];
+            const float *p_res = res.ptr<float>(i);
+            const float *p_res_t = res.ptr<float>(i - 1);
+            const float *p_res_b = res.ptr<float>(i + 1);
 
-            if ((iy <= 0 && ix > -iy) || (iy >= 0 && ix < -iy))
+            const float *p_x = res_x.ptr<float>(i);
+            const float *p_y = res_y.ptr<float>(i);
+
+            for (int j = 1; j < res.cols - 1; j++)
             {
+                float ix, iy, grad1, grad2, d;
 
-                d = abs(iy / ix);
-                grad1 = (p_res[j + 1] * (1 - d)) + (p_res_t[j + 1] * d);
-                grad2 = (p_res[j - 1] * (1 - d)) + (p_res_b[j - 1] * d);
+                iy = p_y[j];
+                ix = p_x[j];
 
-                if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                if ((iy <= 0 && ix > -iy) || (iy >= 0 && ix < -iy))
                 {
-                    p_non_ms[j] = (char)255;
 
-                    if (p_res[j] > high_th)
-                        p_non_ms_hth[j] = (char)255;
-                }
-            }
+                    d = abs(iy / ix);
+                    grad1 = (p_res[j + 1] * (1 - d)) + (p_res_t[j + 1] * d);
+                    grad2 = (p_res[j - 1] * (1 - d)) + (p_res_b[j - 1] * d);
 
-            if ((ix > 0 && -iy >= ix) || (ix < 0 && -iy <= ix))
-            {
-                d = abs(ix / iy);
-                grad1 = (p_res_t[j] * (1 - d)) + (p_res_t[j + 1] * d);
-                grad2 = (p_res_b[j] * (1 - d)) + (p_res_b[j - 1] * d);
+                    if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                    {
+                        p_non_ms[j] = (char)255;
 
-                if (p_res[j] >= grad1 && p_res[j] >= grad2)
-                {
-                    p_non_ms[j] = (char)255;
-                    if (p_res[j] > high_th)
-                        p_non_ms_hth[j] = (char)255;
+                        if (p_res[j] > high_th)
+                            p_non_ms_hth[j] = (char)255;
+                    }
                 }
-            }
 
-            if ((ix <= 0 && ix > iy) || (ix >= 0 && ix < iy))
-            {
-                d = abs(ix / iy);
-                grad1 = (p_res_t[j] * (1 - d)) + (p_res_t[j - 1] * d);
-                grad2 = (p_res_b[j] * (1 - d)) + (p_res_b[j + 1] * d);
-
-                if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                if ((ix > 0 && -iy >= ix) || (ix < 0 && -iy <= ix))
                 {
-                    p_non_ms[j] = (char)255;
-                    if (p_res[j] > high_th)
-                        p_non_ms_hth[j] = (char)255;
+                    d = abs(ix / iy);
+                    grad1 = (p_res_t[j] * (1 - d)) + (p_res_t[j + 1] * d);
+                    grad2 = (p_res_b[j] * (1 - d)) + (p_res_b[j - 1] * d);
+
+                    if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                    {
+                        p_non_ms[j] = (char)255;
+                        if (p_res[j] > high_th)
+                            p_non_ms_hth[j] = (char)255;
+                    }
                 }
-            }
 
-            if ((iy < 0 && ix <= iy) || (iy > 0 && ix >= iy))
-            {
-                d = abs(iy / ix);
-                grad1 = (p_res[j - 1] * (1 - d)) + (p_res_t[j - 1] * d);
-                grad2 = (p_res[j + 1] * (1 - d)) + (p_res_b[j + 1] * d);
+                if ((ix <= 0 && ix > iy) || (ix >= 0 && ix < iy))
+                {
+                    d = abs(ix / iy);
+                    grad1 = (p_res_t[j] * (1 - d)) + (p_res_t[j - 1] * d);
+                    grad2 = (p_res_b[j] * (1 - d)) + (p_res_b[j + 1] * d);
+
+                    if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                    {
+                        p_non_ms[j] = (char)255;
+                        if (p_res[j] > high_th)
+                            p_non_ms_hth[j] = (char)255;
+                    }
+                }
 
-                if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                if ((iy < 0 && ix <= iy) || (iy > 0 && ix >= iy))
                 {
-                    p_non_ms[j] = (char)255;
-                    if (p_res[j] > high_th)
-                        p_non_ms_hth[j] = (char)255;
+                    d = abs(iy / ix);
+                    grad1 = (p_res[j - 1] * (1 - d)) + (p_res_t[j - 1] * d);
+                    grad2 = (p_res[j + 1] * (1 - d)) + (p_res_b[j + 1] * d);
+
+                    if (p_res[j] >= grad1 && p_res[j] >= grad2)
+                    {
+                        p_non_ms[j] = (char)255;
+                        if (p_res[j] > high_th)
+                            p_non_ms_hth[j] = (char)255;
+                    }
                 }
             }
-        }
-    }
+        } });
 
     ////bw select
     // cv::Mat res_lin=cv::Mat::zeros(pic->rows, pic->cols, CV_8U);
@@ -417,6 +425,7 @@ static void remove_points_with_low_angle(cv::Mat *edge, int start_xx, int end_xx
     if (end_y > edge->rows - 5)
         end_y = edge->rows - 5;
 
+    // The passes thin the edges in place and stay sequential, see RowParallel.h
     for (int j = start_y; j < end_y; j++)
         for (int i = start_x; i < end_x; i++)
         {
@@ -933,53 +942,66 @@ static cv::Point th_angular_histo(cv::Mat *pic, cv::Mat *pic_th, int start_x, in
     int min_l, min_lb, min_b, min_br;
     int pos_l, pos_lb, pos_b, pos_br;
 
-    int hist_l[DEF_SIZE];
-    int hist_lb[DEF_SIZE];
-    int hist_b[DEF_SIZE];
-    int hist_br[DEF_SIZE];
-
-    for (int i = 0; i < DEF_SIZE; i++)
-    {
-        hist_l[i] = 0;
-        hist_lb[i] = 0;
-        hist_b[i] = 0;
-        hist_br[i] = 0;
-    }
-
-    int idx_lb = 0;
-    int idx_br = 0;
-
-    for (int i = start_x; i < end_x; i++)
+    // Histograms of the dark pixels along the left, bottom and both diagonal directions
+    typedef std::array<std::array<int, DEF_SIZE>, 4> AngularHistograms;
+    enum
     {
-        for (int j = start_y; j < end_y; j++)
+        L = 0,
+        LB = 1,
+        B = 2,
+        BR = 3
+    };
+
+    AngularHistograms hist = tbb::parallel_reduce(
+        tbb::blocked_range<int>(start_y, std::max(start_y, end_y), ROW_GRAIN), AngularHistograms{},
+        [&](const tbb::blocked_range<int> &range, AngularHistograms partial)
         {
-
-            if (pic->data[(pic->cols * j) + i] < th)
+            for (int j = range.begin(); j < range.end(); j++)
             {
-
-                pic_th->data[(pic->cols * j) + i] = 255;
-
-                idx_lb = (pic->cols / 2) + (i - (pic->cols / 2)) + (j);
-                idx_br = (pic->cols / 2) + (i - (pic->cols / 2)) + (pic->rows - j);
-
-                if (j >= 0 && j < DEF_SIZE && i >= 0 && i < DEF_SIZE && idx_lb >= 0 && idx_lb < DEF_SIZE &&
-                    idx_br >= 0 && idx_br < DEF_SIZE)
+                for (int i = start_x; i < end_x; i++)
                 {
 
-                    if (++hist_l[j] > max_l)
-                        max_l = hist_l[j];
+                    if (pic->data[(pic->cols * j) + i] < th)
+                    {
 
-                    if (++hist_b[i] > max_b)
-                        max_b = hist_b[i];
+                        pic_th->data[(pic->cols * j) + i] = 255;
 
-                    if (++hist_lb[idx_lb] > max_lb)
-                        max_lb = hist_lb[idx_lb];
+                        int idx_lb = (pic->cols / 2) + (i - (pic->cols / 2)) + (j);
+                        int idx_br = (pic->cols / 2) + (i - (pic->cols / 2)) + (pic->rows - j);
 
-                    if (++hist_br[idx_br] > max_br)
-                        max_br = hist_br[idx_br];
+                        if (j >= 0 && j < DEF_SIZE && i >= 0 && i < DEF_SIZE && idx_lb >= 0 && idx_lb < DEF_SIZE &&
+                            idx_br >= 0 && idx_br < DEF_SIZE)
+                        {
+                            partial[L][j]++;
+                            partial[B][i]++;
+                            partial[LB][idx_lb]++;
+                            partial[BR][idx_br]++;
+                        }
+                    }
                 }
             }
-        }
+            return partial;
+        },
+        [](AngularHistograms a, const AngularHistograms &b)
+        {
+            for (int h = 0; h < 4; h++)
+                for (int k = 0; k < DEF_SIZE; k++)
+                    a[h][k] += b[h][k];
+            return a;
+        });
+
+    int *hist_l = hist[L].data();
+    int *hist_lb = hist[LB].data();
+    int *hist_b = hist[B].data();
+    int *hist_br = hist[BR].data();
+
+    // Counts only grow, the maxima of the final histograms equal the running maxima of the sequential scan
+    for (int k = 0; k < DEF_SIZE; k++)
+    {
+        max_l = std::max(max_l, hist_l[k]);
+        max_lb = std::max(max_lb, hist_lb[k]);
+        max_b = std::max(max_b, hist_b[k]);
+        max_br = std::max(max_br, hist_br[k]);
     }
 
     min_l = max_l - floor(max_l * th_histo);
@@ -1324,23 +1346,27 @@ static void zero_around_region_th_border(cv::Mat *pic, cv::Mat *edges, cv::Mat *
     th = th + th + 1;
 
     // std::cout<<"sx:"<<start_x<<" sy:"<<start_y<<" ex:"<<end_x<<" ey:"<<end_y<<" dist:"<<edge_to_th<<std::endl;
-    for (int i = start_x; i < end_x; i++)
-        for (int j = start_y; j < end_y; j++)
-        {
-
-            if (pic->data[(pic->cols * j) + (i)] < th)
+    // Bands own the rows of th_edges they write, and visit every dark pixel whose neighbourhood reaches these rows
+    parallel_rows(std::max(1, start_y - edge_to_th), std::min(edges->rows, end_y + edge_to_th - 1), [&](int begin, int end)
+                  {
+        for (int j = std::max(start_y, begin - edge_to_th + 1); j < std::min(end_y, end + edge_to_th); j++)
+            for (int i = start_x; i < end_x; i++)
             {
 
-                for (int k1 = -edge_to_th; k1 < edge_to_th; k1++)
-                    for (int k2 = -edge_to_th; k2 < edge_to_th; k2++)
-                    {
+                if (pic->data[(pic->cols * j) + (i)] < th)
+                {
 
-                        if (i + k1 >= 0 && i + k1 < pic->cols && j + k2 > 0 && j + k2 < edges->rows)
-                            if ((int)edges->data[(edges->cols * (j + k2)) + (i + k1)])
-                                th_edges->data[(edges->cols * (j + k2)) + (i + k1)] = 255;
-                    }
+                    for (int k1 = -edge_to_th; k1 < edge_to_th; k1++)
+                        for (int k2 = std::max(-edge_to_th, begin - j); k2 < std::min(edge_to_th, end - j); k2++)
+                        {
+
+                            if (i + k1 >= 0 && i + k1 < pic->cols && j + k2 > 0 && j + k2 < edges->rows)
+                                if ((int)edges->data[(edges->cols * (j + k2)) + (i + k1)])
+                                    th_edges->data[(edges->cols * (j + k2)) + (i + k1)] = 255;
+                        }
+                }
             }
-        }
+        });
 
     // remove_points_with_low_angle(th_edges, start_x, end_x, start_y, end_y);
     std::vector<std::vector<cv::Point>> all_curves = get_curves(pic, th_edges, start_x, end_x, start_y, end_y, mean_dist, 0);
@@ -1357,11 +1383,7 @@ static void zero_around_region_th_border(cv::Mat *pic, cv::Mat *edges, cv::Mat *
         }
         */
 
-        for (int i = 0; i < th_edges->cols; i++)
-            for (int j = 0; j < th_edges->rows; j++)
-            {
-                th_edges->data[(th_edges->cols * (j)) + (i)] = 0;
-            }
+        th_edges->setTo(0);
 
         // draw remaining edges
         for (int i = 0; i < all_curves.size(); i++)
@@ -1424,13 +1446,14 @@ static void optimize_pos(cv::Mat *pic, double area, cv::Point *pos)
     int start_y = pos->y - (area * pic->rows);
     int end_y = pos->y + (area * pic->rows);
 
-    int val;
-    int min_akt;
-    int min_val = 1000000;
-
-    int pos_x = 0;
-    int pos_y = 0;
-    int pos_count = 0;
+    // Minimum and the sum and count of all positions reaching it, independent of the scan order
+    struct Optimum
+    {
+        int min_val = 1000000;
+        int pos_x = 0;
+        int pos_y = 0;
+        int pos_count = 0;
+    };
 
     int reg_size = sqrt(sqrt(pow(double(area * pic->cols * 2), 2) + pow(double(area * pic->rows * 2), 2)));
 
@@ -1443,48 +1466,67 @@ static void optimize_pos(cv::Mat *pic, double area, cv::Point *pos)
     if (end_y > pic->rows)
         end_y = pic->rows - (reg_size + 1);
 
-    for (int i = start_x; i < end_x; i++)
-        for (int j = start_y; j < end_y; j++)
+    Optimum optimum = tbb::parallel_reduce(
+        tbb::blocked_range<int>(start_y, std::max(start_y, end_y), ROW_GRAIN), Optimum(),
+        [&](const tbb::blocked_range<int> &range, Optimum partial)
         {
+            for (int j = range.begin(); j < range.end(); j++)
+                for (int i = start_x; i < end_x; i++)
+                {
 
-            min_akt = 0;
+                    int min_akt = 0;
 
-            for (int k1 = -reg_size; k1 < reg_size; k1++)
-                for (int k2 = -reg_size; k2 < reg_size; k2++)
-                {
+                    for (int k1 = -reg_size; k1 < reg_size; k1++)
+                        for (int k2 = -reg_size; k2 < reg_size; k2++)
+                        {
+
+                            if (i + k1 > 0 && i + k1 < pic->cols && j + k2 > 0 && j + k2 < pic->rows)
+                            {
+                                int val = (pic->data[(pic->cols * j) + (i)] - pic->data[(pic->cols * (j + k2)) + (i + k1)]);
+                                if (val > 0)
+                                    min_akt += val;
+                            }
+                        }
 
-                    if (i + k1 > 0 && i + k1 < pic->cols && j + k2 > 0 && j + k2 < pic->rows)
+                    if (min_akt == partial.min_val)
                     {
-                        val = (pic->data[(pic->cols * j) + (i)] - pic->data[(pic->cols * (j + k2)) + (i + k1)]);
-                        if (val > 0)
-                            min_akt += val;
+                        partial.pos_x += i;
+                        partial.pos_y += j;
+                        partial.pos_count++;
                     }
-                }
-
-            if (min_akt == min_val)
-            {
-                pos_x += i;
-                pos_y += j;
-                pos_count++;
-            }
 
-            if (min_akt < min_val)
+                    if (min_akt < partial.min_val)
+                    {
+                        partial.min_val = min_akt;
+                        partial.pos_x = i;
+                        partial.pos_y = j;
+                        partial.pos_count = 1;
+                    }
+                }
+            return partial;
+        },
+        [](Optimum a, const Optimum &b)
+        {
+            if (b.min_val < a.min_val)
+                return b;
+            if (b.min_val == a.min_val)
             {
-                min_val = min_akt;
-                pos_x = i;
-                pos_y = j;
-                pos_count = 1;
+                a.pos_x += b.pos_x;
+                a.pos_y += b.pos_y;
+                a.pos_count += b.pos_count;
             }
-        }
+            return a;
+        });
 
-    if (pos_count > 0)
+    if (optimum.pos_count > 0)
     {
-        pos->x = pos_x / pos_count;
-        pos->y = pos_y / pos_count;
+        pos->x = optimum.pos_x / optimum.pos_count;
+        pos->y = optimum.pos_y / optimum.pos_count;
     }
 }
 
-static cv::RotatedRect runexcuse(cv::Mat *pic, cv::Mat *pic_th, cv::Mat *th_edges, int good_ellipse_threshold, int max_ellipse_radi)
+// Pupil candidate of the image, which is validated with is_good_ellipse afterwards
+static cv::RotatedRect runexcuse(cv::Mat *pic, cv::Mat *pic_th, cv::Mat *th_edges)
 {
     // mean under mean
     // mean_under_mean(pic, 5);
@@ -1525,13 +1567,10 @@ static cv::RotatedRect runexcuse(cv::Mat *pic, cv::Mat *pic_th, cv::Mat *th_edge
     threshold_up = ceil(stddev / 2);
     threshold_up--;
 
-    cv::Mat picpic = cv::Mat::zeros(end_y - start_y, end_x - start_x, CV_8U);
+    cv::Rect region(start_x, start_y, end_x - start_x, end_y - start_y);
 
-    for (int i = 0; i < picpic.cols; i++)
-        for (int j = 0; j < picpic.rows; j++)
-        {
-            picpic.data[(picpic.cols * j) + i] = pic->data[(pic->cols * (start_y + j)) + (start_x + i)];
-        }
+    cv::Mat picpic;
+    (*pic)(region).copyTo(picpic);
 
     // cv::Mat detected_edges2;
     // cv::GaussianBlur(picpic,detected_edges2, cv::Size(15,15),sqrt(2.0));
@@ -1539,11 +1578,7 @@ static cv::RotatedRect runexcuse(cv::Mat *pic, cv::Mat *pic_th, cv::Mat *th_edge
     cv::Mat detected_edges2 = canny_impl(&picpic);
 
     cv::Mat detected_edges = cv::Mat::zeros(pic->rows, pic->cols, CV_8U);
-    for (int i = 0; i < detected_edges2.cols; i++)
-        for (int j = 0; j < detected_edges2.rows; j++)
-        {
-            detected_edges.data[(detected_edges.cols * (start_y + j)) + (start_x + i)] = detected_edges2.data[(detected_edges2.cols * j) + i];
-        }
+    detected_edges2.copyTo(detected_edges(region));
 
     remove_points_with_low_angle(&detected_edges, start_x, end_x, start_y, end_y);
 
@@ -1593,23 +1628,6 @@ static cv::RotatedRect runexcuse(cv::Mat *pic, cv::Mat *pic_th, cv::Mat *th_edge
         zero_around_region_th_border(pic, &detected_edges, th_edges, threshold_up, edge_to_th, mean_dist, area_edges, &ellipse);
     }
 
-    // if(ellipse.size.height>0 && ellipse.size.width>0.0){
-
-    if (is_good_ellipse(&ellipse, pic, good_ellipse_threshold, max_ellipse_radi))
-        return ellipse;
-    else
-    {
-        ellipse.center.x = 0;
-        ellipse.center.y = 0;
-        ellipse.angle = 0.0;
-        ellipse.size.height = 0.0;
-        ellipse.size.width = 0.0;
-
-        return ellipse;
-    }
-
-    //}
-
     return ellipse;
     /*
     if(is_possible_pupil(pic, ellipse))
@@ -1628,28 +1646,62 @@ static cv::RotatedRect runexcuse(cv::Mat *pic, cv::Mat *pic_th, cv::Mat *th_edge
 Pupil ExCuSe::run(const Mat &frame)
 {
 
+    // The latency target mode can only lower the working size, the edge buffers hold at most IMG_SIZE pixels
+    int maxSize = (int)(IMG_SIZE * std::min(resolution.scale(), 1.0f));
+
+    // The pupil candidate only depends on the frame and the working size, the thresholds only validate it.
+    // Other instances on the same frame store it in or take it from the shared stages
+    FrameStages *stages = stagesOf(frame);
+    std::string stageKey = stages ? format("ExCuSe:%d", maxSize) : std::string();
+    const FrameStages::Stage *shared = stages ? stages->find(stageKey) : nullptr;
+
     Mat downscaled = frame;
     float scalingRatio = 1.0;
-    if (frame.rows > IMG_SIZE || frame.cols > IMG_SIZE)
+    if (frame.rows > maxSize || frame.cols > maxSize)
     {
         // return ellipse;
         // Downscaling
-        float rw = IMG_SIZE / (float)frame.cols;
-        float rh = IMG_SIZE / (float)frame.rows;
+        float rw = maxSize / (float)frame.cols;
+        float rh = maxSize / (float)frame.rows;
         scalingRatio = min<float>(min<float>(rw, rh), 1.0);
-        cv::resize(frame, downscaled, Size(), scalingRatio, scalingRatio, INTER_LINEAR);
+        if (!shared)
+            cv::resize(frame, downscaled, Size(), scalingRatio, scalingRatio, INTER_LINEAR);
     }
 
+    // is_good_ellipse only reads the image
     Mat target;
-    normalize(downscaled, target, 0, 255, NORM_MINMAX, CV_8U);
+    cv::RotatedRect ellipse;
+    if (shared)
+    {
+        target = shared->images[0];
+        const std::vector<double> &v = shared->values;
+        ellipse = cv::RotatedRect(cv::Point2f(v[0], v[1]), cv::Size2f(v[2], v[3]), v[4]);
+    }
+    else
+    {
+        normalize(downscaled, target, 0, 255, NORM_MINMAX, CV_8U);
+
+        Mat pic_th = Mat::zeros(target.rows, target.cols, CV_8U);
+        Mat th_edges = Mat::zeros(target.rows, target.cols, CV_8U);
 
-    Mat pic_th = Mat::zeros(target.rows, target.cols, CV_8U);
-    Mat th_edges = Mat::zeros(target.rows, target.cols, CV_8U);
+        arena.limit(threads).execute([&]
+                              { ellipse = runexcuse(&target, &pic_th, &th_edges); });
+
+        if (stages)
+        {
+            FrameStages::Stage &stage = stages->store(stageKey);
+            stage.images = {target};
+            stage.values = {ellipse.center.x, ellipse.center.y, ellipse.size.width, ellipse.size.height, ellipse.angle};
+        }
+    }
 
-    cv::RotatedRect ellipse = runexcuse(&target, &pic_th, &th_edges, good_ellipse_threshold, max_ellipse_radi);
+    if (!is_good_ellipse(&ellipse, &target, good_ellipse_threshold, max_ellipse_radi))
+        ellipse = cv::RotatedRect(cv::Point2f(0, 0), cv::Size2f(0, 0), 0);
     cv::RotatedRect scaledEllipse(cv::Point2f(ellipse.center.x / scalingRatio, ellipse.center.y / scalingRatio), cv::Size2f(ellipse.size.width / scalingRatio, ellipse.size.height / scalingRatio), ellipse.angle);
 
-    return Pupil(scaledEllipse);
+    Pupil pupil(scaledEllipse);
+    pupil.workingScale = scalingRatio;
+    return pupil;
 }
 
 void ExCuSe::run(const cv::Mat &frame, const Rect &roi, Pupil &pupil, const float &minPupilDiameterPx, const float &maxPupilDiameterPx)
@@ -12,6 +12,7 @@
 */
 
 #include "PupilDetectionMethod.h"
+#include "RowParallel.h"
 
 class ExCuSe : public PupilDetectionMethod
 {
@@ -46,6 +47,17 @@ public:
     {
         return false;
     }
+
+    bool hasAdaptiveResolution() override
+    {
+        return true;
+    }
+
+    // Number of threads working on the per-pixel stages of a single frame, 0 uses all available cores
+    int threads = 1;
+
+protected:
+    ThreadArena arena;
 };
 
 #endif // EXCUSE_H
@@ -0,0 +1,63 @@
+#ifndef PUPILALGOSIMPLE_FRAMESTAGES_H
+#define PUPILALGOSIMPLE_FRAMESTAGES_H
+
+#include <opencv2/core/mat.hpp>
+#include <map>
+#include <string>
+#include <vector>
+#include "HaarFeatureCache.h"
+
+// Intermediate results of one frame which several detectors with different parameters compute alike, e.g. the
+// downscaled, normalized image and its edges, so a parameter sweep computes them only once per frame.
+// A detector stores its stages under a key which names the detector, the stage and the parameters the stage
+// depends on, detectors whose key matches use the stored stages instead of computing them. Stored images are
+// shared and must not be modified, users copy them before working on them.
+// The stages are kept until the next reset(). A FrameStages must only be used by one thread at a time.
+class FrameStages
+{
+
+public:
+    struct Stage
+    {
+        std::vector<cv::Mat> images;
+        std::vector<double> values;
+    };
+
+    // Haar features of the frame, shared by the Swirski2D instances, which reuse them if their radii match
+    HaarFeatureCache haarFeatures;
+
+    // Binds the stages to a new frame, the frame must stay valid until the next reset()
+    void reset(const cv::Mat &frame)
+    {
+        source = frame;
+        stages.clear();
+        haarFeatures.reset(frame);
+    }
+
+    // Whether frame is the frame the stages were computed from, which is only the case for the same image data
+    bool matches(const cv::Mat &frame) const
+    {
+        return !source.empty() && frame.data == source.data && frame.size == source.size && frame.step == source.step && frame.type() == source.type();
+    }
+
+    // Stage stored under key, nullptr if there is none
+    const Stage *find(const std::string &key) const
+    {
+        auto stage = stages.find(key);
+        return stage == stages.end() ? nullptr : &stage->second;
+    }
+
+    // New stage under key, replacing a previous one
+    Stage &store(const std::string &key)
+    {
+        Stage &stage = stages[key];
+        stage = Stage();
+        return stage;
+    }
+
+private:
+    cv::Mat source;
+    std::map<std::string, Stage> stages;
+};
+
+#endif //PUPILALGOSIMPLE_FRAMESTAGES_H
@@ -0,0 +1,128 @@
+#include "HaarFeatureCache.h"
+#include "Swirski2D.h"
+
+#include <opencv2/imgproc.hpp>
+#include <tbb/tbb.h>
+#include <limits>
+
+void HaarFeatureCache::reset(const cv::Mat &frame)
+{
+    source = frame;
+    padding = -1;
+    hasSurround = false;
+}
+
+const cv::Mat &HaarFeatureCache::paddedIntegral(int pad)
+{
+    if (padding != pad)
+    {
+        // Need to pad by an additional 1 to get bottom & right edges.
+        cv::copyMakeBorder(source, paddedFrame, pad, pad, pad, pad, cv::BORDER_REPLICATE);
+        cv::integral(paddedFrame, paddedItg, CV_32S);
+        padding = pad;
+        hasSurround = false;
+    }
+    return paddedItg;
+}
+
+const std::vector<HaarFeatureCache::Response> &HaarFeatureCache::surroundResponses(int pad, const std::vector<int> &radii, int xstep, int ystep)
+{
+    std::vector<int> key = {pad, xstep, ystep};
+    key.insert(key.end(), radii.begin(), radii.end());
+
+    const cv::Mat_<int32_t> mEyeIntegral = paddedIntegral(pad);
+    if (hasSurround && key == surroundKey)
+        return surround;
+
+    const int rows = source.rows;
+    const int cols = source.cols;
+    surround.resize(radii.size());
+
+    //             _____________________
+    //            |         Haar kernel |
+    //            |                     |
+    //  __________|______________       |
+    // | Image    |      |       |      |
+    // |    ______|______|___.-r-|--2r--|
+    // |   |      |      |___|___|      |
+    // |   |      |          |   |      |
+    // |   |      |          |   |      |
+    // |   |      |__________|___|______|
+    // |   |    Search       |   |
+    // |   |    region       |   |
+    // |   |                 |   |
+    // |   |_________________|   |
+    // |                         |
+    // |_________________________|
+    //
+
+    tbb::parallel_for(size_t(0), radii.size(), [&](size_t k)
+                      {
+        int r = radii[k];
+        // Get Haar feature
+        int r_inner = r;
+        int r_outer = 3 * r;
+        HaarSurroundFeature f(r_inner, r_outer);
+
+        const Response none = {std::numeric_limits<double>::infinity(), cv::Point(-1, -1)};
+        int rowCount = cv::max((rows - r - r - 1) / ystep + 1, 0);
+
+        // Use TBB for rows, ties keep the first position in row-major order
+        surround[k] = tbb::parallel_reduce(
+            tbb::blocked_range<int>(0, rowCount, cv::max(rowCount / 8, 1)),
+            none,
+            [&](const tbb::blocked_range<int> &range, const Response &minValIn) -> Response
+            {
+                Response minValOut = minValIn;
+                for (int i = range.begin(), y = r + range.begin() * ystep; i < range.end(); i++, y += ystep)
+                {
+                    const int *row1_inner = mEyeIntegral[y + pad - r_inner];
+                    const int *row2_inner = mEyeIntegral[y + pad + r_inner + 1];
+                    const int *row1_outer = mEyeIntegral[y + pad - r_outer];
+                    const int *row2_outer = mEyeIntegral[y + pad + r_outer + 1];
+
+                    const int *p00_inner = row1_inner + r + pad - r_inner;
+                    const int *p01_inner = row1_inner + r + pad + r_inner + 1;
+                    const int *p10_inner = row2_inner + r + pad - r_inner;
+                    const int *p11_inner = row2_inner + r + pad + r_inner + 1;
+
+                    const int *p00_outer = row1_outer + r + pad - r_outer;
+                    const int *p01_outer = row1_outer + r + pad + r_outer + 1;
+                    const int *p10_outer = row2_outer + r + pad - r_outer;
+                    const int *p11_outer = row2_outer + r + pad + r_outer + 1;
+
+                    for (int x = r; x < cols - r; x += xstep)
+                    {
+                        int sumInner = *p00_inner + *p11_inner - *p01_inner - *p10_inner;
+                        int sumOuter = *p00_outer + *p11_outer - *p01_outer - *p10_outer - sumInner;
+
+                        double response = f.val_inner * sumInner + f.val_outer * sumOuter;
+
+                        if (response < minValOut.value)
+                        {
+                            minValOut.value = response;
+                            minValOut.position = cv::Point(x, y);
+                        }
+
+                        p00_inner += xstep;
+                        p01_inner += xstep;
+                        p10_inner += xstep;
+                        p11_inner += xstep;
+
+                        p00_outer += xstep;
+                        p01_outer += xstep;
+                        p10_outer += xstep;
+                        p11_outer += xstep;
+                    }
+                }
+                return minValOut;
+            },
+            [](const Response &x, const Response &y) -> Response
+            {
+                return y.value < x.value ? y : x;
+            }); });
+
+    surroundKey = key;
+    hasSurround = true;
+    return surround;
+}
@@ -0,0 +1,49 @@
+#ifndef PUPILALGOSIMPLE_HAARFEATURECACHE_H
+#define PUPILALGOSIMPLE_HAARFEATURECACHE_H
+
+#include <opencv2/core/mat.hpp>
+#include <vector>
+
+// Haar-like surround features of one frame (Swirski et al.) as used by Swirski2D: the integral image of the padded
+// frame and the minimum response of each radius. They are computed on first use and kept until the next reset(),
+// so the Swirski2D instances of a parameter sweep, which share one cache per frame through FrameStages, compute
+// them only once per frame and padding. The buffers are reused between frames of the same size.
+// The responses of all radii are computed in parallel, Swirski2D combines them in radius order so the result
+// does not depend on the number of threads. A cache must only be used by one thread at a time.
+class HaarFeatureCache
+{
+
+public:
+    struct Response
+    {
+        double value;
+        cv::Point position;
+    };
+
+    // Binds the cache to a new frame, the frame must stay valid until the next reset()
+    void reset(const cv::Mat &frame);
+
+    const cv::Mat &frame() const
+    {
+        return source;
+    }
+
+    // CV_32S integral image of the frame padded by replicating its border
+    const cv::Mat &paddedIntegral(int padding);
+
+    // Minimum Swirski2D surround response of the padded frame and its position for each radius
+    const std::vector<Response> &surroundResponses(int padding, const std::vector<int> &radii, int xstep, int ystep);
+
+private:
+    cv::Mat source;
+
+    int padding = -1;
+    cv::Mat paddedFrame;
+    cv::Mat paddedItg;
+
+    bool hasSurround = false;
+    std::vector<int> surroundKey;
+    std::vector<Response> surround;
+};
+
+#endif //PUPILALGOSIMPLE_HAARFEATURECACHE_H
@@ -47,8 +47,10 @@
 using namespace std;
 using namespace cv;
 
-PuRe::PuRe() : baseSize(320, 240), expectedFrameSize(-1, -1), outlineBias(5)
+PuRe::PuRe() : baseSize(320, 240), expectedFrameSize(-1, -1), outlineBias(5), vectorAllocations(0)
 {
+	for (Mat *buffer : {&downscaled, &blurred, &dx, &dy, &magnitude, &scaledMagnitude, &histogramIndices, &edgeType, &edge, &input})
+		buffer->allocator = &workspaceAllocator;
 
 	mDesc = "PuRe (Santini et. al 2018a)";
 	mTitle = "PuRe";
@@ -97,16 +99,56 @@ void PuRe::estimateParameters(int rows, int cols)
 
 void PuRe::init(const Mat &frame)
 {
-	if (expectedFrameSize == Size(frame.cols, frame.rows))
+	// The latency target mode scales the base size, the ratio follows changes of the frame size and of the scale
+	float scale = resolution.scale();
+	if (expectedFrameSize == Size(frame.cols, frame.rows) && scale == baseScale)
 		return;
 
 	expectedFrameSize = Size(frame.cols, frame.rows);
+	baseScale = scale;
 
-	float rw = baseSize.width / (float)frame.cols;
-	float rh = baseSize.height / (float)frame.rows;
+	float rw = scale * baseSize.width / (float)frame.cols;
+	float rh = scale * baseSize.height / (float)frame.rows;
 	scalingRatio = min<float>(min<float>(rw, rh), 1.0);
 }
 
+void PuRe::prepareWorkspace(const Size &size)
+{
+	// create() is a no-op if size and type did not change
+	dx.create(size, CV_32F);
+	dy.create(size, CV_32F);
+	magnitude.create(size, CV_32F);
+	edgeType.create(size, CV_8U);
+	edge.create(size, CV_8U);
+}
+
+void PuRe::downscale(const Mat &frame, FrameStages *stages)
+{
+	// The input and its filtered edges only depend on the frame and the scaling ratio, other instances on the
+	// same frame store them in or take them from the shared stages
+	stageStore = nullptr;
+	sharedStage = nullptr;
+	if (stages)
+	{
+		stageKey = format("PuRe:%a", scalingRatio);
+		sharedStage = stages->find(stageKey);
+		if (sharedStage)
+		{
+			sharedStage->images[0].copyTo(input);
+			return;
+		}
+		stageStore = stages;
+	}
+
+	if (scalingRatio < 1)
+	{
+		resize(frame, downscaled, Size(), scalingRatio, scalingRatio, INTER_LINEAR);
+		normalize(downscaled, input, 0, 255, NORM_MINMAX, CV_8U);
+	}
+	else
+		normalize(frame, input, 0, 255, NORM_MINMAX, CV_8U);
+}
+
 Mat PuRe::canny(const Mat &in, bool blurImage, bool useL2, int bins, float nonEdgePixelsRatio, float lowHighThresholdRatio)
 {
 	(void)useL2;
@@ -114,17 +156,15 @@ Mat PuRe::canny(const Mat &in, bool blurImage, bool useL2, int bins, float nonEd
 	 * Smoothing and directional derivatives
 	 * TODO: adapt sizes to image size
 	 */
-	Mat blurred;
 	if (blurImage)
 	{
 		Size blurSize(5, 5);
 		GaussianBlur(in, blurred, blurSize, 1.5, 1.5, BORDER_REPLICATE);
 	}
-	else
-		blurred = in;
+	const Mat &smoothed = blurImage ? blurred : in;
 
-	Sobel(blurred, dx, dx.type(), 1, 0, 7, 1, BORDER_REPLICATE);
-	Sobel(blurred, dy, dy.type(), 0, 1, 7, 1, BORDER_REPLICATE);
+	Sobel(smoothed, dx, dx.type(), 1, 0, 7, 1, BORDER_REPLICATE);
+	Sobel(smoothed, dy, dy.type(), 0, 1, 7, 1, BORDER_REPLICATE);
 
 	/*
 	 *  Magnitude
@@ -144,17 +184,18 @@ Mat PuRe::canny(const Mat &in, bool blurImage, bool useL2, int bins, float nonEd
 	float high_th = 0;
 
 	// Normalization
-	magnitude = magnitude / maxMag;
+	magnitude.convertTo(magnitude, CV_32F, 1.0 / maxMag);
 
 	// Histogram
-	int *histogram = new int[bins]();
-	Mat res_idx = (bins - 1) * magnitude;
-	res_idx.convertTo(res_idx, CV_16U);
+	reserveWorkspace(histogram, bins);
+	histogram.assign(bins, 0);
+	magnitude.convertTo(scaledMagnitude, CV_32F, bins - 1);
+	scaledMagnitude.convertTo(histogramIndices, CV_16U);
 	short *p_res_idx = 0;
-	for (int i = 0; i < res_idx.rows; i++)
+	for (int i = 0; i < histogramIndices.rows; i++)
 	{
-		p_res_idx = res_idx.ptr<short>(i);
-		for (int j = 0; j < res_idx.cols; j++)
+		p_res_idx = histogramIndices.ptr<short>(i);
+		for (int j = 0; j < histogramIndices.cols; j++)
 			histogram[p_res_idx[j]]++;
 	}
 
@@ -172,8 +213,6 @@ Mat PuRe::canny(const Mat &in, bool blurImage, bool useL2, int bins, float nonEd
 	}
 	low_th = lowHighThresholdRatio * high_th;
 
-	delete[] histogram;
-
 	/*
 	 *  Non maximum supression
 	 */
@@ -247,7 +286,8 @@ Mat PuRe::canny(const Mat &in, bool blurImage, bool useL2, int bins, float nonEd
 	int lines_idx = 0;
 	int idx = 0;
 
-	vector<int> lines;
+	vector<int> &lines = hysteresisQueue;
+	reserveWorkspace(lines, area);
 	edge.setTo(0);
 	for (int i = 1; i < pic_y - 1; i++)
 	{
@@ -530,18 +570,17 @@ void PuRe::findPupilEdgeCandidates(const Mat &intensityImage, Mat &edge, vector<
 	 * Small note here: using anchor points tends to result in better ellipse fitting later!
 	 * It's also faster than doing connected components and collecting the labels
 	 */
-	vector<Vec4i> hierarchy;
-	vector<vector<Point>> curves;
 	findContours(edge, curves, hierarchy, RETR_LIST, CHAIN_APPROX_TC89_KCOS);
 
-	removeDuplicates(curves, edge.cols);
+	removeDuplicates(curves, edge.size());
 
 	// Create valid candidates
+	reserveWorkspace(candidates, curves.size());
 	for (size_t i = curves.size(); i-- > 0;)
 	{
 		PupilCandidate candidate(curves[i]);
 		if (candidate.isValid(intensityImage, minPupilDiameterPx, maxPupilDiameterPx, outlineBias))
-			candidates.push_back(candidate);
+			candidates.push_back(std::move(candidate));
 	}
 }
 
@@ -550,7 +589,8 @@ void PuRe::combineEdgeCandidates(const cv::Mat &intensityImage, cv::Mat &edge, s
 	(void)edge;
 	if (candidates.size() <= 1)
 		return;
-	vector<PupilCandidate> mergedCandidates;
+	mergedCandidates.clear();
+	size_t capacity = mergedCandidates.capacity();
 	for (auto pc = candidates.begin(); pc != candidates.end(); pc++)
 	{
 		for (auto pc2 = pc + 1; pc2 != candidates.end(); pc2++)
@@ -577,44 +617,52 @@ void PuRe::combineEdgeCandidates(const cv::Mat &intensityImage, cv::Mat &edge, s
 			if (intersection.area() >= min<int>(pc->combinationRegion.area(), pc2->combinationRegion.area()))
 				continue;
 
-			vector<Point> mergedPoints = pc->points;
+			vector<Point> mergedPoints;
+			mergedPoints.reserve(pc->points.size() + pc2->points.size());
+			mergedPoints.insert(mergedPoints.end(), pc->points.begin(), pc->points.end());
 			mergedPoints.insert(mergedPoints.end(), pc2->points.begin(), pc2->points.end());
-			PupilCandidate candidate(mergedPoints);
+			PupilCandidate candidate(std::move(mergedPoints));
 			if (!candidate.isValid(intensityImage, minPupilDiameterPx, maxPupilDiameterPx, outlineBias))
 				continue;
 			if (candidate.outlineContrast < pc->outlineContrast || candidate.outlineContrast < pc2->outlineContrast)
 				continue;
-			mergedCandidates.push_back(candidate);
+			mergedCandidates.push_back(std::move(candidate));
 		}
 	}
-	candidates.insert(candidates.end(), mergedCandidates.begin(), mergedCandidates.end());
+	if (mergedCandidates.capacity() != capacity)
+		vectorAllocations++;
+
+	reserveWorkspace(candidates, candidates.size() + mergedCandidates.size());
+	candidates.insert(candidates.end(), make_move_iterator(mergedCandidates.begin()), make_move_iterator(mergedCandidates.end()));
 }
 
-void PuRe::searchInnerCandidates(vector<PupilCandidate> &candidates, PupilCandidate &candidate)
+PupilCandidate *PuRe::searchInnerCandidates(vector<PupilCandidate> &candidates, PupilCandidate *candidate)
 {
 	if (candidates.size() <= 1)
-		return;
+		return candidate;
 
-	float searchRadius = 0.5 * candidate.majorAxis;
-	vector<PupilCandidate> insiders;
+	float searchRadius = 0.5 * candidate->majorAxis;
+	insiders.clear();
+	reserveWorkspace(insiders, candidates.size());
 	for (auto pc = candidates.begin(); pc != candidates.end(); pc++)
 	{
 		if (searchRadius < pc->majorAxis)
 			continue;
-		if (norm(candidate.outline.center - pc->outline.center) > searchRadius)
+		if (norm(candidate->outline.center - pc->outline.center) > searchRadius)
 			continue;
 		if (pc->outlineContrast < 0.75)
 			continue;
-		insiders.push_back(*pc);
+		insiders.push_back(&*pc);
 	}
 	if (insiders.size() <= 0)
 	{
 		// ellipse(dbg, candidate.outline, Scalar(0,255,0));
-		return;
+		return candidate;
 	}
 
-	sort(insiders.begin(), insiders.end());
-	candidate = insiders.back();
+	sort(insiders.begin(), insiders.end(), [](const PupilCandidate *a, const PupilCandidate *b)
+		 { return *a < *b; });
+	return insiders.back();
 
 	// circle(dbg, searchCenter, searchRadius, Scalar(0,0,255),3);
 	// candidate.draw(dbg);
@@ -624,18 +672,40 @@ void PuRe::searchInnerCandidates(vector<PupilCandidate> &candidates, PupilCandid
 void PuRe::detect(Pupil &pupil, std::vector<cv::Point2f> &inlierPts)
 {
 
+	int64 tick = profiler.start();
+
 	// 3.2 Edge Detection and Morphological Transformation
-	Mat detectedEdges = canny(input, true, true, 64, 0.7f, 0.4f);
+	Mat detectedEdges;
+	if (sharedStage)
+	{
+		sharedStage->images[1].copyTo(edge);
+		detectedEdges = edge;
+		tick = profiler.lap("sharedStages", tick);
+	}
+	else
+	{
+		detectedEdges = canny(input, true, true, 64, 0.7f, 0.4f);
+		tick = profiler.lap("canny", tick);
 
-	// imshow("edges", detectedEdges);
+		// imshow("edges", detectedEdges);
 #ifdef SAVE_ILLUSTRATION
-	imwrite("edges.png", detectedEdges);
+		imwrite("edges.png", detectedEdges);
 #endif
-	filterEdges(detectedEdges);
+		filterEdges(detectedEdges);
+		tick = profiler.lap("filterEdges", tick);
+
+		if (stageStore)
+		{
+			FrameStages::Stage &stage = stageStore->store(stageKey);
+			stage.images = {input.clone(), detectedEdges.clone()};
+		}
+	}
 
 	// 3.3 Segment Selection
-	vector<PupilCandidate> candidates;
+	candidates.clear();
 	findPupilEdgeCandidates(input, detectedEdges, candidates);
+	tick = profiler.lap("findPupilEdgeCandidates", tick);
+	profiler.count("edgeCandidates", candidates.size());
 	if (candidates.size() <= 0)
 		return;
 
@@ -662,6 +732,8 @@ void PuRe::detect(Pupil &pupil, std::vector<cv::Point2f> &inlierPts)
 
 	// Combination
 	combineEdgeCandidates(input, detectedEdges, candidates);
+	tick = profiler.lap("combineEdgeCandidates", tick);
+	profiler.count("candidates", candidates.size());
 	for (auto c = candidates.begin(); c != candidates.end(); c++)
 	{
 		if (c->outlineContrast < 0.5)
@@ -686,17 +758,19 @@ void PuRe::detect(Pupil &pupil, std::vector<cv::Point2f> &inlierPts)
 
 	// Scoring
 	sort(candidates.begin(), candidates.end());
-	PupilCandidate selected = candidates.back();
+	PupilCandidate *selected = &candidates.back();
 
 	// for ( auto c = candidates.begin(); c != candidates.end(); c++)
 	//     c->draw(dbg);
 
 	// Post processing
-	searchInnerCandidates(candidates, selected);
+	tick = profiler.lap("scoring", tick);
+	selected = searchInnerCandidates(candidates, selected);
+	profiler.lap("searchInnerCandidates", tick);
 
-	pupil = selected.outline;
-	pupil.confidence = selected.outlineContrast;
-	inlierPts = std::vector<cv::Point2f>(selected.points.begin(), selected.points.end());
+	pupil = selected->outline;
+	pupil.confidence = selected->outlineContrast;
+	inlierPts.assign(selected->points.begin(), selected->points.end());
 
 #ifdef SAVE_ILLUSTRATION
 	Mat out;
@@ -715,9 +789,7 @@ void PuRe::run(const Mat &frame, Pupil &pupil)
 	init(frame);
 
 	// Downscaling
-	Mat downscaled = frame;
-	resize(frame, downscaled, Size(), scalingRatio, scalingRatio, INTER_LINEAR);
-	normalize(downscaled, input, 0, 255, NORM_MINMAX, CV_8U);
+	downscale(frame, stagesOf(frame));
 
 	workingSize.width = floor(scalingRatio * frame.cols);
 	workingSize.height = floor(scalingRatio * frame.rows);
@@ -726,11 +798,7 @@ void PuRe::run(const Mat &frame, Pupil &pupil)
 	estimateParameters(workingSize.height, workingSize.width);
 
 	// Preallocate stuff for edge detection
-	dx = Mat::zeros(workingSize, CV_32F);
-	dy = Mat::zeros(workingSize, CV_32F);
-	magnitude = Mat::zeros(workingSize, CV_32F);
-	edgeType = Mat::zeros(workingSize, CV_8U);
-	edge = Mat::zeros(workingSize, CV_8U);
+	prepareWorkspace(workingSize);
 
 	// cvtColor(input, dbg, CV_GRAY2BGR);
 	// circle(dbg, Point(0.5*dbg.cols,0.5*dbg.rows), 0.5*minPupilDiameterPx, Scalar(0,0,0), 2);
@@ -741,6 +809,7 @@ void PuRe::run(const Mat &frame, Pupil &pupil)
 	detect(pupil, inlierPts);
 
 	pupil.resize(1.0 / scalingRatio, 1.0 / scalingRatio);
+	pupil.workingScale = scalingRatio;
 
 	// imshow("dbg", dbg);
 }
@@ -753,9 +822,7 @@ void PuRe::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f> &inl
 	init(frame);
 
 	// Downscaling
-	Mat downscaled = frame;
-	resize(frame, downscaled, Size(), scalingRatio, scalingRatio, INTER_LINEAR);
-	normalize(downscaled, input, 0, 255, NORM_MINMAX, CV_8U);
+	downscale(frame, stagesOf(frame));
 
 	workingSize.width = floor(scalingRatio * frame.cols);
 	workingSize.height = floor(scalingRatio * frame.rows);
@@ -764,11 +831,7 @@ void PuRe::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f> &inl
 	estimateParameters(workingSize.height, workingSize.width);
 
 	// Preallocate stuff for edge detection
-	dx = Mat::zeros(workingSize, CV_32F);
-	dy = Mat::zeros(workingSize, CV_32F);
-	magnitude = Mat::zeros(workingSize, CV_32F);
-	edgeType = Mat::zeros(workingSize, CV_8U);
-	edge = Mat::zeros(workingSize, CV_8U);
+	prepareWorkspace(workingSize);
 
 	// cvtColor(input, dbg, CV_GRAY2BGR);
 	// circle(dbg, Point(0.5*dbg.cols,0.5*dbg.rows), 0.5*minPupilDiameterPx, Scalar(0,0,0), 2);
@@ -778,6 +841,7 @@ void PuRe::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f> &inl
 	detect(pupil, inlierPts);
 
 	pupil.resize(1.0 / scalingRatio, 1.0 / scalingRatio);
+	pupil.workingScale = scalingRatio;
 
 	// imshow("dbg", dbg);
 }
@@ -802,9 +866,7 @@ void PuRe::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const fl
 		maxPupilDiameterPx = scalingRatio * userMaxPupilDiameterPx;
 
 	// Downscaling
-	Mat downscaled;
-	resize(frame(roi), downscaled, Size(), scalingRatio, scalingRatio, INTER_LINEAR);
-	normalize(downscaled, input, 0, 255, NORM_MINMAX, CV_8U);
+	downscale(frame(roi));
 
 	// cvtColor(input, dbg, CV_GRAY2BGR);
 
@@ -812,11 +874,7 @@ void PuRe::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const fl
 	workingSize.height = input.rows;
 
 	// Preallocate stuff for edge detection
-	dx = Mat::zeros(workingSize, CV_32F);
-	dy = Mat::zeros(workingSize, CV_32F);
-	magnitude = Mat::zeros(workingSize, CV_32F);
-	edgeType = Mat::zeros(workingSize, CV_8U);
-	edge = Mat::zeros(workingSize, CV_8U);
+	prepareWorkspace(workingSize);
 
 	// cvtColor(input, dbg, CV_GRAY2BGR);
 	// circle(dbg, Point(0.5*dbg.cols,0.5*dbg.rows), 0.5*minPupilDiameterPx, Scalar(0,0,0), 2);
@@ -827,6 +885,7 @@ void PuRe::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const fl
 	detect(pupil, inlierPts);
 
 	pupil.resize(1.0 / scalingRatio, 1.0 / scalingRatio);
+	pupil.workingScale = scalingRatio;
 
 	pupil.center += Point2f(roi.tl());
 	// imshow("dbg", dbg);
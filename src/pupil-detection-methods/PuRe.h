@@ -41,10 +41,87 @@
 
 #include <opencv2/core/mat.hpp>
 #include <opencv2/imgproc.hpp>
-#include <map>
+#include <algorithm>
 #include <bitset>
+#include <map>
 #include "PupilDetectionMethod.h"
 
+// Matrix allocator of the detector workspace. Released buffers are kept and reused for later buffers
+// of up to the same size, so buffers that change their size between frames, like the ones of the
+// tracking window, are not reallocated. Counts the allocations of new buffers.
+class WorkspaceAllocator : public cv::MatAllocator
+{
+
+public:
+    mutable size_t count = 0;
+
+    WorkspaceAllocator() = default;
+    WorkspaceAllocator(const WorkspaceAllocator &) = delete;
+    WorkspaceAllocator &operator=(const WorkspaceAllocator &) = delete;
+
+    ~WorkspaceAllocator() override
+    {
+        for (const auto &block : freeBlocks)
+            cv::fastFree(block.second);
+    }
+
+    cv::UMatData *allocate(int dims, const int *sizes, int type, void *data, size_t *step, cv::AccessFlag flags, cv::UMatUsageFlags usageFlags) const override
+    {
+        // Headers of user data are left to the default allocator
+        if (data != nullptr)
+            return cv::Mat::getStdAllocator()->allocate(dims, sizes, type, data, step, flags, usageFlags);
+
+        size_t total = CV_ELEM_SIZE(type);
+        for (int i = dims - 1; i >= 0; i--)
+        {
+            if (step)
+                step[i] = total;
+            total *= sizes[i];
+        }
+
+        // Smallest released buffer that is large enough
+        uchar *buffer;
+        auto block = freeBlocks.lower_bound(total);
+        if (block != freeBlocks.end())
+        {
+            buffer = block->second;
+            freeBlocks.erase(block);
+        }
+        else
+        {
+            buffer = (uchar *)cv::fastMalloc(total);
+            capacities[buffer] = total;
+            count++;
+        }
+
+        cv::UMatData *u = new cv::UMatData(this);
+        u->data = u->origdata = buffer;
+        u->size = total;
+        return u;
+    }
+
+    bool allocate(cv::UMatData *data, cv::AccessFlag accessFlags, cv::UMatUsageFlags usageFlags) const override
+    {
+        (void)accessFlags;
+        (void)usageFlags;
+        return data != nullptr;
+    }
+
+    void deallocate(cv::UMatData *data) const override
+    {
+        if (data == nullptr)
+            return;
+
+        freeBlocks.emplace(capacities[data->origdata], data->origdata);
+        data->origdata = nullptr;
+        delete data;
+    }
+
+private:
+    mutable std::multimap<size_t, uchar *> freeBlocks;
+    mutable std::map<uchar *, size_t> capacities;
+};
+
 class PupilCandidate
 {
 
@@ -90,7 +167,7 @@ public:
                                                     score(0.0f),
                                                     color(0, 255, 0)
     {
-        this->points = points;
+        this->points = std::move(points);
     }
 
     bool isValid(const cv::Mat &intensityImage, const int &minPupilDiameterPx, const int &maxPupilDiameterPx, const int bias = 5);
@@ -217,17 +294,55 @@ public:
         return true;
     }
 
+    bool hasAdaptiveResolution() override
+    {
+        return true;
+    }
+
+    // Number of workspace buffer (re)allocations, constant once the frame size is stable
+    size_t allocationCount() const
+    {
+        return workspaceAllocator.count + vectorAllocations;
+    }
+
 protected:
     cv::Size expectedFrameSize;
+    float baseScale = 1.0f;
     int outlineBias;
 
+    /*
+     * Workspace, reused between frames as long as the working size does not change.
+     * Must be written through OpenCV output arguments only, an assignment would replace the allocator.
+     */
+    WorkspaceAllocator workspaceAllocator;
+    size_t vectorAllocations;
+
+    cv::Mat downscaled;
+
     // Canny
+    cv::Mat blurred;
     cv::Mat dx, dy, magnitude;
+    cv::Mat scaledMagnitude, histogramIndices;
     cv::Mat edgeType, edge;
+    std::vector<int> histogram;
+    std::vector<int> hysteresisQueue;
 
     cv::Mat input;
     cv::Mat dbg;
 
+    // Input and filtered edges of the frame shared with other instances, see downscale()
+    FrameStages *stageStore = nullptr;
+    const FrameStages::Stage *sharedStage = nullptr;
+    std::string stageKey;
+
+    // Candidates
+    std::vector<cv::Vec4i> hierarchy;
+    std::vector<std::vector<cv::Point>> curves;
+    std::vector<uchar> visited;
+    std::vector<PupilCandidate> candidates;
+    std::vector<PupilCandidate> mergedCandidates;
+    std::vector<PupilCandidate *> insiders;
+
     int maxCanthiDistancePx;
     int minCanthiDistancePx;
     int maxPupilDiameterPx;
@@ -238,6 +353,17 @@ protected:
      */
     void init(const cv::Mat &frame);
     void estimateParameters(int rows, int cols);
+    void prepareWorkspace(const cv::Size &size);
+    void downscale(const cv::Mat &frame, FrameStages *stages = nullptr);
+
+    template <typename T>
+    void reserveWorkspace(std::vector<T> &buffer, size_t size)
+    {
+        if (buffer.capacity() >= size)
+            return;
+        buffer.reserve(size);
+        vectorAllocations++;
+    }
 
     /*
      *  Detection
@@ -255,24 +381,41 @@ protected:
         return p.y * cols + p.x;
     }
 
-    void removeDuplicates(std::vector<std::vector<cv::Point>> &curves, const int &cols)
+    // Curves starting on a point of a later curve are removed, visited is a flat bitmap over the image
+    // which is all zero between calls
+    void removeDuplicates(std::vector<std::vector<cv::Point>> &curves, const cv::Size &size)
     {
-        std::map<int, uchar> contourMap;
+        size_t area = (size_t)size.width * size.height;
+        if (visited.size() != area)
+        {
+            reserveWorkspace(visited, area);
+            visited.assign(area, 0);
+        }
+
+        // Curves are never empty, removed curves are marked by clearing them
         for (size_t i = curves.size(); i-- > 0;)
         {
-            if (contourMap.count(pointHash(curves[i][0], cols)) > 0)
-                curves.erase(curves.begin() + i);
+            if (visited[pointHash(curves[i][0], size.width)])
+                curves[i].clear();
             else
             {
-                for (int j = 0; j < curves[i].size(); j++)
-                    contourMap[pointHash(curves[i][j], cols)] = 1;
+                for (size_t j = 0; j < curves[i].size(); j++)
+                    visited[pointHash(curves[i][j], size.width)] = 1;
             }
         }
+
+        curves.erase(std::remove_if(curves.begin(), curves.end(), [](const std::vector<cv::Point> &curve)
+                                    { return curve.empty(); }),
+                     curves.end());
+
+        for (const auto &curve : curves)
+            for (const auto &p : curve)
+                visited[pointHash(p, size.width)] = 0;
     }
 
     void findPupilEdgeCandidates(const cv::Mat &intensityImage, cv::Mat &edge, std::vector<PupilCandidate> &candidates);
     void combineEdgeCandidates(const cv::Mat &intensityImage, cv::Mat &edge, std::vector<PupilCandidate> &candidates);
-    void searchInnerCandidates(std::vector<PupilCandidate> &candidates, PupilCandidate &candidate);
+    PupilCandidate *searchInnerCandidates(std::vector<PupilCandidate> &candidates, PupilCandidate *candidate);
 };
 
 #endif // PURE_H
@@ -38,8 +38,19 @@
 
 #include "PuReST.h"
 
+// Milliseconds since tick, tick is advanced to now
+static double lap(int64 &tick)
+{
+    int64 now = cv::getTickCount();
+    double ms = 1000.0 * (now - tick) / cv::getTickFrequency();
+    tick = now;
+    return ms;
+}
+
 PuReST::PuReST()
 {
+    for (cv::Mat *buffer : {&trackingHistogram, &bright, &dark, &thresholdMask, &outlineTrackerEdges})
+        buffer->allocator = &workspaceAllocator;
 
     openKernel = cv::getStructuringElement(cv::MORPH_ELLIPSE, {7, 7});
     dilateKernel = cv::getStructuringElement(cv::MORPH_ELLIPSE, {15, 15});
@@ -57,6 +68,18 @@ PuReST::~PuReST()
 void PuReST::reset()
 {
     previousPupil.clear();
+    branch = Branch::NoPupil;
+}
+
+void PuReST::seedPupil(const Pupil &pupil)
+{
+    if (!pupil.valid())
+        return;
+
+    previousPupil = pupil;
+    // Pupils of methods without a confidence are tracked based on their outline confidence
+    if (previousPupil.confidence == NO_CONFIDENCE)
+        previousPupil.confidence = previousPupil.outline_confidence;
 }
 
 void PuReST::run(const cv::Mat &frame, Pupil &pupil)
@@ -67,7 +90,11 @@ void PuReST::run(const cv::Mat &frame, Pupil &pupil)
 
     if (previousPupil.confidence == NO_CONFIDENCE)
     {
+        int64 tick = cv::getTickCount();
+        timings = Timings();
         PuRe::run(frame, pupil);
+        branch = Branch::Detection;
+        timings.fallback = timings.total = lap(tick);
     }
     else
     {
@@ -84,23 +111,34 @@ void PuReST::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const
 
     if (previousPupil.confidence == NO_CONFIDENCE)
     {
+        int64 tick = cv::getTickCount();
+        timings = Timings();
         PuRe::run(frame, roi, pupil, -1, -1);
+        branch = Branch::Detection;
+        timings.fallback = timings.total = lap(tick);
     }
     else
     {
-        runTracking(frame, pupil, userMaxPupilDiameterPx, userMaxPupilDiameterPx);
+        runTracking(frame, pupil, userMinPupilDiameterPx, userMaxPupilDiameterPx);
     }
     previousPupil = pupil;
 }
 
 void PuReST::runTracking(const cv::Mat &frame, Pupil &pupil, const float &userMinPupilDiameterPx, const float &userMaxPupilDiameterPx)
 {
+    int64 start = cv::getTickCount();
+    timings = Timings();
+    track(frame, pupil, userMinPupilDiameterPx, userMaxPupilDiameterPx);
+    timings.total = lap(start);
+}
 
-    baseSize = {frame.cols, frame.rows};
-    // baseSize = { 320, 240 };
+void PuReST::track(const cv::Mat &frame, Pupil &pupil, const float &userMinPupilDiameterPx, const float &userMaxPupilDiameterPx)
+{
+    int64 tick = cv::getTickCount();
 
     pupil.clear();
     init(frame);
+    branch = Branch::NoPupil;
 
     // First we get the search region in the frame coordinate system
     cv::Rect frameRect = {0, 0, frame.cols, frame.rows};
@@ -123,7 +161,7 @@ void PuReST::runTracking(const cv::Mat &frame, Pupil &pupil, const float &userMi
 
     // If the resulting rect is too large (e.g., due to a large pupil),
     // we employ a different scale to guarantee runtime
-    cv::Size2f maxSize = {100.f, 100.f};
+    cv::Size2f maxSize = {100.f * resolution.scale(), 100.f * resolution.scale()};
     if (scaledSize.width > maxSize.width || scaledSize.height > maxSize.height)
     {
         float r = std::min<float>(maxSize.width / trackingRect.width, maxSize.height / trackingRect.height);
@@ -143,11 +181,7 @@ void PuReST::runTracking(const cv::Mat &frame, Pupil &pupil, const float &userMi
 
     // Setup for Canny
     workingSize = {input.cols, input.rows};
-    dx = cv::Mat::zeros(workingSize.height, workingSize.width, CV_32F);
-    dy = cv::Mat::zeros(workingSize.height, workingSize.width, CV_32F);
-    magnitude = cv::Mat::zeros(workingSize.height, workingSize.width, CV_32F);
-    edgeType = cv::Mat::zeros(workingSize.height, workingSize.width, CV_8U);
-    edge = cv::Mat::zeros(workingSize.height, workingSize.width, CV_8U);
+    prepareWorkspace(workingSize);
 
     // Pupil in our coordinate system
     Pupil basePupil = previousPupil;
@@ -164,38 +198,56 @@ void PuReST::runTracking(const cv::Mat &frame, Pupil &pupil, const float &userMi
 #endif
 
     // Find glints
-    cv::Mat histogram;
-    calculateHistogram(input, histogram, 256);
+    calculateHistogram(input, trackingHistogram, 256);
 
     int lowTh, highTh;
-    cv::Mat bright, dark;
-    getThresholds(input, histogram, basePupil, lowTh, highTh, bright, dark);
+    getThresholds(input, trackingHistogram, basePupil, lowTh, highTh, bright, dark);
 
     cv::Mat detectedEdges = canny(input, true, true, 64, 0.7f, 0.4f);
     filterEdges(detectedEdges);
+    timings.preprocessing = lap(tick);
+    profiler.duration("trackingPreprocessing", timings.preprocessing);
 
-    cv::Mat outlineTrackerEdges = detectedEdges.clone();
+    // Edges inside the dark and outside the bright region, edges and masks are either 0 or 255
+    cv::bitwise_and(detectedEdges, dark, outlineTrackerEdges);
     outlineTrackerEdges.setTo(0, bright);
-    outlineTrackerEdges.setTo(0, 255 - dark);
-    if (trackOutline(outlineTrackerEdges, basePupil, pupil, localScalingRatio))
+    bool tracked = trackOutline(outlineTrackerEdges, basePupil, pupil, localScalingRatio);
+    timings.outlineTracking = lap(tick);
+    profiler.duration("outlineTracking", timings.outlineTracking);
+    if (tracked)
     {
         pupil.resize(1.0 / localScalingRatio);
         pupil.shift(cv::Point2f(trackingRect.tl()));
+        pupil.workingScale = localScalingRatio;
+        branch = Branch::OutlineTracking;
 
         return;
     }
 
-    cv::Mat greedyDetectorEdges = detectedEdges.clone();
-    if (greedySearch(greedyDetectorEdges, basePupil, dark, bright, pupil, localScalingRatio * minPupilDiameterPx))
+    // findContours does not modify its input since OpenCV 3.2, the edges need no copy
+    tracked = greedySearch(detectedEdges, basePupil, dark, bright, pupil, localScalingRatio * minPupilDiameterPx);
+    timings.greedySearch = lap(tick);
+    profiler.duration("greedySearch", timings.greedySearch);
+    if (tracked)
     {
         pupil.resize(1.0 / localScalingRatio);
         pupil.shift(cv::Point2f(trackingRect.tl()));
+        pupil.workingScale = localScalingRatio;
+        branch = Branch::GreedySearch;
 
         return;
     }
 
     // none of the tracker did succeed?
-    PuRe::run(frame, pupil);
+    if (fullFrameFallback)
+    {
+        PuRe::run(frame, pupil);
+        branch = Branch::Fallback;
+        timings.fallback = lap(tick);
+        profiler.duration("fallback", timings.fallback);
+    }
+    else
+        pupil.clear();
 }
 
 void PuReST::calculateHistogram(const cv::Mat &in, cv::Mat &histogram, const int &bins, const cv::Mat &mask)
@@ -250,12 +302,12 @@ void PuReST::getThresholds(const cv::Mat &input, const cv::Mat &histogram, const
     int bias = 5;
     highTh -= bias;
 
-    inRange(input, highTh, 256, bright);
-    dilate(bright, bright, openKernel);
+    inRange(input, highTh, 256, thresholdMask);
+    dilate(thresholdMask, bright, openKernel);
 
     inRange(input, 0, lowTh, dark);
-    dilate(dark, dark, dilateKernel);
-    erode(dark, dark, openKernel);
+    dilate(dark, thresholdMask, dilateKernel);
+    erode(thresholdMask, dark, openKernel);
 
     // Mat glintCandidates;
     // bitwise_and(bright, dark, glintCandidates);
@@ -373,8 +425,6 @@ bool PuReST::greedySearch(const cv::Mat &greedyDetectorEdges, const Pupil &baseP
     cvtColor(input, dbgGreedy, CV_GRAY2BGR);
 #endif
 
-    std::vector<cv::Vec4i> hierarchy;
-    std::vector<std::vector<cv::Point>> curves;
     findContours(greedyDetectorEdges, curves, hierarchy, cv::RETR_LIST, cv::CHAIN_APPROX_NONE);
     for (auto c = curves.begin(); c != curves.end();)
     {
@@ -385,14 +435,11 @@ bool PuReST::greedySearch(const cv::Mat &greedyDetectorEdges, const Pupil &baseP
     }
 
     // Removes shapes that are too simple
-    std::vector<std::vector<cv::Point>> approxCurves;
     for (auto c = curves.begin(); c != curves.end();)
     {
-        std::vector<cv::Point> ac;
-        approxPolyDP(*c, ac, 1.5, false);
-        if (ac.size() > 3)
+        approxPolyDP(*c, approxCurve, 1.5, false);
+        if (approxCurve.size() > 3)
         {
-            approxCurves.push_back(ac);
             c++;
         }
         else
@@ -401,7 +448,7 @@ bool PuReST::greedySearch(const cv::Mat &greedyDetectorEdges, const Pupil &baseP
         }
     }
 
-    removeDuplicates(curves, greedyDetectorEdges.cols);
+    removeDuplicates(curves, greedyDetectorEdges.size());
 
     std::vector<GreedyCandidate> candidates;
     for (int i = 0; i < curves.size(); i++)
@@ -78,6 +78,29 @@ class PuReST : public PuRe
 {
 
 public:
+    // Path that produced the pupil of the last frame
+    enum class Branch
+    {
+        NoPupil,         // no pupil, the tracking window left the frame or both trackers failed without fallback
+        Detection,       // full detection, there was no previous pupil
+        OutlineTracking, // outline of the previous pupil was found again
+        GreedySearch,    // edge combination around the previous pupil
+        Fallback,        // full detection after both trackers failed
+    };
+
+    // Durations of the last frame in ms, branches which did not run are 0
+    struct Timings
+    {
+        double preprocessing = 0;   // downscaling, thresholds and edge detection of the tracking window
+        double outlineTracking = 0;
+        double greedySearch = 0;
+        double fallback = 0;        // full detection, also if there was no previous pupil
+        double total = 0;
+    };
+
+    // Run the full detection if both trackers fail, otherwise an invalid pupil is returned
+    bool fullFrameFallback = true;
+
     PuReST();
     ~PuReST() override;
 
@@ -90,6 +113,19 @@ public:
 
     void reset();
 
+    // Tracks the next frame from pupil, see PupilDetectionMethod::seedPupil. Invalid pupils are ignored
+    void seedPupil(const Pupil &pupil) override;
+
+    Branch lastBranch() const
+    {
+        return branch;
+    }
+
+    const Timings &lastTimings() const
+    {
+        return timings;
+    }
+
     void run(const cv::Mat &frame, Pupil &pupil) override;
     void run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &userMinPupilDiameterPx = -1, const float &userMaxPupilDiameterPx = -1) override;
     void runTracking(const cv::Mat &frame, Pupil &pupil, const float &userMinPupilDiameterPx, const float &userMaxPupilDiameterPx);
@@ -115,11 +151,21 @@ public:
     }
 
 private:
+    Branch branch = Branch::NoPupil;
+    Timings timings;
+
+    // Tracking workspace, reused between frames like the PuRe workspace
+    cv::Mat trackingHistogram;
+    cv::Mat bright, dark, thresholdMask;
+    cv::Mat outlineTrackerEdges;
+    std::vector<cv::Point> approxCurve;
+
     cv::Mat dilateKernel;
     cv::Mat openKernel;
     Pupil outlineSeedPupil;
     Pupil previousPupil;
 
+    void track(const cv::Mat &frame, Pupil &pupil, const float &userMinPupilDiameterPx, const float &userMaxPupilDiameterPx);
     void calculateHistogram(const cv::Mat &in, cv::Mat &histogram, const int &bins, const cv::Mat &mask = cv::Mat());
     void getThresholds(const cv::Mat &input, const cv::Mat &histogram, const Pupil &pupil, int &lowTh, int &highTh, cv::Mat &bright, cv::Mat &dark);
 
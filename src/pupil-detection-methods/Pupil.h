@@ -37,19 +37,19 @@ class Pupil : public cv::RotatedRect
 {
 
 public:
-    Pupil(const RotatedRect &outline, const float &confidence) : RotatedRect(outline), confidence(confidence), outline_confidence(NO_CONFIDENCE), eyelid(0), physicalDiameter(-1.0), undistortedDiameter(-1.0), algorithmName("")
+    Pupil(const RotatedRect &outline, const float &confidence) : RotatedRect(outline), confidence(confidence), outline_confidence(NO_CONFIDENCE), eyelid(0), physicalDiameter(-1.0), undistortedDiameter(-1.0), workingScale(-1.0), algorithmName("")
     {
     }
 
-    Pupil(const RotatedRect &outline, const float &confidence, const float &outline_confidence, const float &eyelid, const float &physicalDiameter, const float &undistortedDiameter) : RotatedRect(outline), confidence(confidence), outline_confidence(outline_confidence), eyelid(eyelid), physicalDiameter(physicalDiameter), undistortedDiameter(undistortedDiameter), algorithmName("")
+    Pupil(const RotatedRect &outline, const float &confidence, const float &outline_confidence, const float &eyelid, const float &physicalDiameter, const float &undistortedDiameter) : RotatedRect(outline), confidence(confidence), outline_confidence(outline_confidence), eyelid(eyelid), physicalDiameter(physicalDiameter), undistortedDiameter(undistortedDiameter), workingScale(-1.0), algorithmName("")
     {
     }
 
-    Pupil(const Pupil &other) : RotatedRect(other), confidence(other.confidence), outline_confidence(other.outline_confidence), eyelid(other.eyelid), physicalDiameter(other.physicalDiameter), undistortedDiameter(other.undistortedDiameter), algorithmName(other.algorithmName)
+    Pupil(const Pupil &other) : RotatedRect(other), confidence(other.confidence), outline_confidence(other.outline_confidence), eyelid(other.eyelid), physicalDiameter(other.physicalDiameter), undistortedDiameter(other.undistortedDiameter), workingScale(other.workingScale), algorithmName(other.algorithmName)
     {
     }
 
-    Pupil(const RotatedRect &outline) : RotatedRect(outline), confidence(NO_CONFIDENCE), outline_confidence(NO_CONFIDENCE), eyelid(0), physicalDiameter(-1.0), undistortedDiameter(-1.0), algorithmName("")
+    Pupil(const RotatedRect &outline) : RotatedRect(outline), confidence(NO_CONFIDENCE), outline_confidence(NO_CONFIDENCE), eyelid(0), physicalDiameter(-1.0), undistortedDiameter(-1.0), workingScale(-1.0), algorithmName("")
     {
     }
 
@@ -68,6 +68,8 @@ public:
 
     float physicalDiameter;
     float undistortedDiameter;
+    // Ratio of the working resolution of the detection to the frame, -1 if not reported by the method
+    float workingScale;
 
     std::string algorithmName;
 
@@ -81,6 +83,7 @@ public:
         eyelid = 0;
         physicalDiameter = -1.0;
         undistortedDiameter = -1.0;
+        workingScale = -1.0;
         algorithmName = "";
     }
 
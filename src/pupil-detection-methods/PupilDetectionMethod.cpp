@@ -21,6 +21,7 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 #include <opencv2/imgproc.hpp>
 #include <deque>
 #include <bitset>
+#include <tbb/tbb.h>
 #include "PupilDetectionMethod.h"
 
 cv::Rect PupilDetectionMethod::coarsePupilDetection(const cv::Mat &frame, const float &minCoverage, const int &workingWidth, const int &workingHeight)
@@ -53,19 +54,21 @@ cv::Rect PupilDetectionMethod::coarsePupilDetection(const cv::Mat &frame, const
      *
      * However, we collect a per-pixel maxima instead of the global one
      */
+    std::vector<int> radii;
+    for (int r = min_r; r <= max_r; r += r_step)
+        radii.push_back(r);
+
     cv::Mat itg;
     integral(downscaled, itg, CV_32S);
-    cv::Mat res = cv::Mat::zeros(downscaled.rows, downscaled.cols, CV_32F);
-    float best_response = std::numeric_limits<float>::min();
-
-    std::deque<std::pair<cv::Rect, float>> candidates;
 
-    for (int r = min_r; r <= max_r; r += r_step)
-    {
+    // The responses of all radii are computed in parallel, the candidates depend on the radius order
+    std::vector<cv::Mat> responses(radii.size());
+    tbb::parallel_for(size_t(0), radii.size(), [&](size_t k)
+                      {
+        int r = radii[k];
         int step = 3 * r;
-
-        cv::Point ia, ib, ic, id;
-        cv::Point oa, ob, oc, od;
+        cv::Mat &response = responses[k];
+        response = cv::Mat::zeros(downscaled.rows, downscaled.cols, CV_32F);
 
         int inner_count = (2 * r) * (2 * r);
         int outer_count = (2 * step) * (2 * step) - inner_count;
@@ -75,35 +78,38 @@ cv::Rect PupilDetectionMethod::coarsePupilDetection(const cv::Mat &frame, const
 
         for (int y = step; y < downscaled.rows - step; y += ystep)
         {
-            oa.y = y - step;
-            ob.y = y - step;
-            oc.y = y + step;
-            od.y = y + step;
-            ia.y = y - r;
-            ib.y = y - r;
-            ic.y = y + r;
-            id.y = y + r;
+            const int *oa = itg.ptr<int>(y - step);
+            const int *oc = itg.ptr<int>(y + step);
+            const int *ia = itg.ptr<int>(y - r);
+            const int *ic = itg.ptr<int>(y + r);
+            float *out = response.ptr<float>(y);
             for (int x = step; x < downscaled.cols - step; x += xstep)
             {
-                oa.x = x - step;
-                ob.x = x + step;
-                oc.x = x + step;
-                od.x = x - step;
-                ia.x = x - r;
-                ib.x = x + r;
-                ic.x = x + r;
-                id.x = x - r;
-                int inner = itg.ptr<int>(ic.y)[ic.x] + itg.ptr<int>(ia.y)[ia.x] -
-                            itg.ptr<int>(ib.y)[ib.x] - itg.ptr<int>(id.y)[id.x];
-                int outer = itg.ptr<int>(oc.y)[oc.x] + itg.ptr<int>(oa.y)[oa.x] -
-                            itg.ptr<int>(ob.y)[ob.x] - itg.ptr<int>(od.y)[od.x] - inner;
+                int inner = ic[x + r] + ia[x - r] - ia[x + r] - ic[x - r];
+                int outer = oc[x + step] + oa[x - step] - oa[x + step] - oc[x - step] - inner;
 
                 float inner_mean = inner_norm * inner;
                 float outer_mean = outer_norm * outer;
-                float response = (outer_mean - inner_mean);
+                out[x] = (outer_mean - inner_mean);
+            }
+        } });
 
-                if (response < 0.5 * best_response)
-                    continue;
+    cv::Mat res = cv::Mat::zeros(downscaled.rows, downscaled.cols, CV_32F);
+    float best_response = std::numeric_limits<float>::min();
+
+    std::deque<std::pair<cv::Rect, float>> candidates;
+
+    for (size_t k = 0; k < radii.size(); k++)
+    {
+        int r = radii[k];
+        int step = 3 * r;
+
+        for (int y = step; y < downscaled.rows - step; y += ystep)
+        {
+            const float *row = responses[k].ptr<float>(y);
+            for (int x = step; x < downscaled.cols - step; x += xstep)
+            {
+                float response = row[x];
 
                 if (response < 0.5 * best_response)
                     continue;
@@ -115,6 +121,8 @@ cv::Rect PupilDetectionMethod::coarsePupilDetection(const cv::Mat &frame, const
                 {
                     res.ptr<float>(y)[x] = response;
                     // The pupil is too small, the padding too large; we combine them.
+                    cv::Point ia(x - r, y - r), oa(x - step, y - step);
+                    cv::Point ic(x + r, y + r), oc(x + step, y + step);
                     candidates.push_back(std::make_pair(cv::Rect(0.5 * (ia + oa), 0.5 * (ic + oc)), response));
                 }
             }
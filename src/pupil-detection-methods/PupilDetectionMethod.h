@@ -29,12 +29,25 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 
 #include <opencv2/core/types.hpp>
 #include "Pupil.h"
+#include "StageProfiler.h"
+#include "ResolutionController.h"
+#include "FrameStages.h"
 #include <iostream>
 
+// Detection methods keep per-frame state in their members: an instance must only
+// be used by one thread at a time, while separate instances may run concurrently.
 class PupilDetectionMethod
 {
 
 public:
+    // Statistics of the detection stages, disabled by default
+    StageProfiler profiler;
+    // Latency target mode, adapted by runWithConfidence and disabled by default
+    ResolutionController resolution;
+    // Stages of the current frame shared with other detectors in parameter sweeps, not owned. Used only while
+    // they match the frame being detected, nullptr by default
+    FrameStages *sharedStages = nullptr;
+
     PupilDetectionMethod() = default;
 
     virtual ~PupilDetectionMethod() = default;
@@ -44,6 +57,12 @@ public:
     virtual bool hasCoarseLocation() = 0;
     virtual bool hasInliers() = 0;
 
+    // Whether the working resolution follows resolution.scale()
+    virtual bool hasAdaptiveResolution()
+    {
+        return false;
+    }
+
     std::string title()
     {
         return mTitle;
@@ -78,23 +97,41 @@ public:
     Pupil runWithConfidence(const cv::Mat &frame)
     {
         Pupil pupil;
-        run(frame, pupil);
-        pupil.outline_confidence = outlineContrastConfidence(frame, pupil);
+        runWithConfidence(frame, pupil);
 
         return pupil;
     }
 
     void runWithConfidence(const cv::Mat &frame, Pupil &pupil)
     {
+        int64 tick = resolution.enabled ? cv::getTickCount() : 0;
         run(frame, pupil);
         pupil.outline_confidence = outlineContrastConfidence(frame, pupil);
+        adaptResolution(pupil, tick);
     }
 
     // Pupil detection interface used in the tracking
     void runWithConfidence(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx = -1, const float &maxPupilDiameterPx = -1)
     {
+        int64 tick = resolution.enabled ? cv::getTickCount() : 0;
         run(frame, roi, pupil, minPupilDiameterPx, maxPupilDiameterPx);
         pupil.outline_confidence = outlineContrastConfidence(frame, pupil);
+        adaptResolution(pupil, tick);
+    }
+
+    // Batch interface, runs the detection with outline confidence on every frame
+    void runWithConfidence(const std::vector<cv::Mat> &frames, std::vector<Pupil> &pupils)
+    {
+        pupils.resize(frames.size());
+        for (size_t i = 0; i < frames.size(); i++)
+            runWithConfidence(frames[i], pupils[i]);
+    }
+
+    // Continues a tracking method from a pupil which another method found in the last frame, e.g. a later stage of
+    // a DetectorCascade, as if it had found it itself. Methods without state between frames ignore it
+    virtual void seedPupil(const Pupil &pupil)
+    {
+        (void)pupil;
     }
 
     virtual Pupil getNextCandidate()
@@ -116,6 +153,19 @@ public:
 protected:
     std::string mTitle;
     std::string mDesc;
+
+    // The shared stages if they were computed from frame, nullptr otherwise
+    FrameStages *stagesOf(const cv::Mat &frame)
+    {
+        return sharedStages != nullptr && sharedStages->matches(frame) ? sharedStages : nullptr;
+    }
+
+    // The outline confidence is the confidence of all methods, which is why only runWithConfidence adapts the scale
+    void adaptResolution(const Pupil &pupil, int64 tick)
+    {
+        if (resolution.enabled && hasAdaptiveResolution())
+            resolution.update(1000.0 * (cv::getTickCount() - tick) / cv::getTickFrequency(), pupil.outline_confidence);
+    }
 };
 
 #endif // PUPILALGOSIMPLE_PUPILDETECTIONMETHOD_H
@@ -0,0 +1,85 @@
+#include "PupilTracker.h"
+
+#include <cmath>
+#include <stdexcept>
+
+PupilTracker::PupilTracker(PupilDetectionMethod *detector) : detector(detector)
+{
+    if (detector == nullptr)
+        throw std::invalid_argument("PupilTracker requires a detector.");
+
+    mTitle = "Tracker (" + detector->title() + ")";
+    mDesc = "Region of interest tracking around " + detector->title();
+}
+
+void PupilTracker::reset()
+{
+    tracking = false;
+    lastPupil.clear();
+    consecutiveMisses = 0;
+}
+
+bool PupilTracker::isConfident(const Pupil &pupil) const
+{
+    return pupil.valid(-2) && pupil.outline_confidence >= minConfidence;
+}
+
+cv::Rect PupilTracker::searchWindow(const cv::Size &frameSize) const
+{
+    cv::Rect frameRect(cv::Point(0, 0), frameSize);
+    if (!tracking)
+        return frameRect;
+
+    float side = std::max(roiScale * lastPupil.majorAxis(), (float)minRoiSize);
+    side *= std::pow(roiGrowth, (float)consecutiveMisses);
+
+    int half = cvRound(0.5f * side);
+    cv::Point center(cvRound(lastPupil.center.x), cvRound(lastPupil.center.y));
+    return cv::Rect(center.x - half, center.y - half, 2 * half, 2 * half) & frameRect;
+}
+
+void PupilTracker::run(const cv::Mat &frame, Pupil &pupil)
+{
+    pupil.clear();
+
+    if (tracking)
+    {
+        // Bounds are relative to the last confident pupil, regardless of the misses since then
+        float diameter = lastPupil.majorAxis();
+        float minDiameter = (1.0f - diameterTolerance) * lastPupil.minorAxis();
+        float maxDiameter = (1.0f + diameterTolerance) * diameter;
+
+        detector->runWithConfidence(frame, searchWindow(frame.size()), pupil, minDiameter, maxDiameter);
+    }
+    else
+    {
+        // Seed from the coarse location, falling back to the full frame if nothing is found there
+        cv::Rect seed = coarsePupilDetection(frame);
+        if (seed.area() > 0 && seed.area() < frame.size().area())
+            detector->runWithConfidence(frame, seed, pupil);
+        if (!isConfident(pupil))
+            detector->runWithConfidence(frame, pupil);
+    }
+
+    if (isConfident(pupil))
+    {
+        hits++;
+        tracking = true;
+        lastPupil = pupil;
+        consecutiveMisses = 0;
+        return;
+    }
+
+    misses++;
+    if (tracking && ++consecutiveMisses >= maxMisses)
+    {
+        resets++;
+        reset();
+    }
+}
+
+void PupilTracker::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx, const float &maxPupilDiameterPx)
+{
+    // An explicit search window bypasses the tracking state
+    detector->run(frame, roi, pupil, minPupilDiameterPx, maxPupilDiameterPx);
+}
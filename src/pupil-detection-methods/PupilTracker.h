@@ -0,0 +1,97 @@
+#ifndef PUPILALGOSIMPLE_PUPILTRACKER_H
+#define PUPILALGOSIMPLE_PUPILTRACKER_H
+
+#include <opencv2/core/mat.hpp>
+#include "Pupil.h"
+#include "PupilDetectionMethod.h"
+
+// Tracks the pupil over consecutive frames of one eye using any detection method.
+// The first search window is seeded by the coarse pupil detection, later windows and the
+// pupil diameter bounds are derived from the last confident pupil. Each miss grows the window,
+// after maxMisses consecutive misses the tracker starts over with a new seed.
+// The detector is not owned and must outlive the tracker.
+class PupilTracker : public PupilDetectionMethod
+{
+
+public:
+    // Pupils with an outline confidence below this threshold count as a miss
+    float minConfidence = 0.66f;
+    // Side length of the search window relative to the major axis of the last pupil
+    float roiScale = 3.0f;
+    // Lower bound of the search window side length in pixels
+    int minRoiSize = 64;
+    // Factor the search window grows by with each consecutive miss
+    float roiGrowth = 1.5f;
+    // Relative change of the pupil diameter allowed between confident pupils
+    float diameterTolerance = 0.5f;
+    // Consecutive misses before the tracker is reset
+    int maxMisses = 5;
+
+    explicit PupilTracker(PupilDetectionMethod *detector);
+
+    Pupil run(const cv::Mat &frame) override
+    {
+        Pupil pupil;
+        run(frame, pupil);
+        return pupil;
+    }
+
+    void run(const cv::Mat &frame, Pupil &pupil) override;
+    void run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx = -1, const float &maxPupilDiameterPx = -1) override;
+
+    // Forget the last pupil, the next frame is seeded by the coarse pupil detection
+    void reset();
+
+    bool isTracking() const
+    {
+        return tracking;
+    }
+
+    // Search window of the next frame, the full frame size is used before the first frame
+    cv::Rect searchWindow(const cv::Size &frameSize) const;
+
+    size_t hitCount() const
+    {
+        return hits;
+    }
+
+    size_t missCount() const
+    {
+        return misses;
+    }
+
+    size_t resetCount() const
+    {
+        return resets;
+    }
+
+    bool hasConfidence() override
+    {
+        return detector->hasConfidence();
+    }
+
+    bool hasCoarseLocation() override
+    {
+        return detector->hasCoarseLocation();
+    }
+
+    bool hasInliers() override
+    {
+        return detector->hasInliers();
+    }
+
+protected:
+    PupilDetectionMethod *detector;
+
+    bool tracking = false;
+    Pupil lastPupil;
+    int consecutiveMisses = 0;
+
+    size_t hits = 0;
+    size_t misses = 0;
+    size_t resets = 0;
+
+    bool isConfident(const Pupil &pupil) const;
+};
+
+#endif // PUPILALGOSIMPLE_PUPILTRACKER_H
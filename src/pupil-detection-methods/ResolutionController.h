@@ -0,0 +1,95 @@
+#ifndef PUPILALGOSIMPLE_RESOLUTIONCONTROLLER_H
+#define PUPILALGOSIMPLE_RESOLUTIONCONTROLLER_H
+
+#include <algorithm>
+#include <cmath>
+#include <cstddef>
+
+// Latency target mode of a detection method. The base working resolution of the method is multiplied by scale(),
+// which is adapted after each frame from its duration and the confidence of its pupil: the scale is lowered while
+// the average duration exceeds the target and raised again after a pupil with low confidence, or towards the base
+// resolution when there is headroom, as long as the expected duration stays within the target.
+// Durations are assumed to grow with the number of pixels, i.e. the square of the scale.
+class ResolutionController
+{
+
+public:
+    bool enabled = false;
+    // Per-frame latency target [ms]
+    double targetMs = 2.0;
+    // Range of the scale relative to the base resolution of the detection method
+    float minScale = 0.25f;
+    float maxScale = 2.0f;
+    // Pupils below this confidence ask for a higher resolution
+    float minConfidence = 0.66f;
+    // Weight of the newest frame in the average duration
+    double smoothing = 0.25;
+    // The scale moves in steps of this size, which keeps the buffers of the detection stable
+    float step = 0.05f;
+
+    // Scale of the next frame, 1 if disabled
+    float scale() const
+    {
+        return enabled ? std::max(minScale, std::min(maxScale, current)) : 1.0f;
+    }
+
+    // Average duration at the current scale [ms], 0 before the first frame
+    double averageMs() const
+    {
+        return unitAverage * current * current;
+    }
+
+    // Number of scale changes so far
+    size_t adjustments() const
+    {
+        return changes;
+    }
+
+    void reset()
+    {
+        current = 1.0f;
+        unitAverage = 0;
+        changes = 0;
+    }
+
+    // Records a frame detected at scale() and selects the scale of the next frame
+    void update(double durationMs, float confidence)
+    {
+        if (!enabled)
+            return;
+        current = scale();
+
+        // Durations are averaged at scale 1, so frames of different scales can be combined
+        double unit = durationMs / (current * current);
+        unitAverage = unitAverage > 0 ? (1 - smoothing) * unitAverage + smoothing * unit : unit;
+        double average = averageMs();
+
+        float next = current;
+        if (average > targetMs)
+        {
+            // Jump to the scale expected to meet the target, by at least one step
+            next = std::min(std::round(current * (float)std::sqrt(targetMs / average) / step) * step, current - step);
+        }
+        else if (confidence < minConfidence || (current < 1.0f && average < 0.5 * targetMs))
+        {
+            // Raise by at least one step, only if the expected duration keeps some headroom
+            float raised = std::max(std::round(current * 1.1f / step) * step, current + step);
+            if (raised * raised * unitAverage <= 0.9 * targetMs)
+                next = raised;
+        }
+        next = std::max(minScale, std::min(maxScale, next));
+
+        if (next != current)
+        {
+            current = next;
+            changes++;
+        }
+    }
+
+private:
+    float current = 1.0f;
+    double unitAverage = 0;
+    size_t changes = 0;
+};
+
+#endif //PUPILALGOSIMPLE_RESOLUTIONCONTROLLER_H
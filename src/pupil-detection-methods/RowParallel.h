@@ -0,0 +1,49 @@
+#ifndef PUPILALGOSIMPLE_ROWPARALLEL_H
+#define PUPILALGOSIMPLE_ROWPARALLEL_H
+
+#include <tbb/blocked_range.h>
+#include <tbb/parallel_for.h>
+#include <tbb/task_arena.h>
+
+// Helpers of the detection methods which split the per-pixel stages of a single frame over several threads, i.e.
+// ElSe and ExCuSe. Stages are split into bands of rows, each row is still processed in order, so the results do not
+// depend on the number of threads.
+// Passes which filter an image in place, like the edge thinning, see the already filtered pixels above and to the
+// left of every pixel. This raster order dependency is part of their result, so these passes stay sequential.
+
+// Rows per band
+const int ROW_GRAIN = 16;
+
+// Runs body(begin, end) on bands of the rows [begin, end) in parallel within the current task arena
+template <typename Body>
+void parallel_rows(int begin, int end, const Body &body)
+{
+    if (begin >= end)
+        return;
+    tbb::parallel_for(tbb::blocked_range<int>(begin, end, ROW_GRAIN), [&](const tbb::blocked_range<int> &range)
+                      { body(range.begin(), range.end()); });
+}
+
+// Task arena of a detection method, limited to its configured number of threads
+class ThreadArena
+{
+
+public:
+    // Arena with threads threads, 0 uses all available cores. It is initialized again when threads changes
+    tbb::task_arena &limit(int threads)
+    {
+        if (!arena.is_active() || arenaThreads != threads)
+        {
+            arena.terminate();
+            arena.initialize(threads > 0 ? threads : tbb::task_arena::automatic);
+            arenaThreads = threads;
+        }
+        return arena;
+    }
+
+private:
+    tbb::task_arena arena;
+    int arenaThreads = 0;
+};
+
+#endif //PUPILALGOSIMPLE_ROWPARALLEL_H
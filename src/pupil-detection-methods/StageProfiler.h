@@ -0,0 +1,96 @@
+#ifndef PUPILALGOSIMPLE_STAGEPROFILER_H
+#define PUPILALGOSIMPLE_STAGEPROFILER_H
+
+#include <opencv2/core/utility.hpp>
+#include <array>
+#include <cmath>
+#include <functional>
+#include <map>
+#include <string>
+
+// Optional statistics of the stages inside a detection method, like durations and candidate counts.
+// Disabled profilers only cost a branch per stage. Stages are recorded by the thread calling the detection.
+class StageProfiler
+{
+
+public:
+    // Bin 0 counts values below 1, bin i values in [2^(i-1), 2^i), the last bin all larger values.
+    // Durations are binned in microseconds.
+    static const int HISTOGRAM_BINS = 24;
+
+    struct Statistic
+    {
+        bool timing = false; // durations in ms, otherwise counts
+        size_t calls = 0;
+        double total = 0;
+        double min = 0;
+        double max = 0;
+        std::array<size_t, HISTOGRAM_BINS> histogram{};
+    };
+
+    bool enabled = false;
+
+    // Tick at the start of the first stage, 0 if disabled
+    int64 start() const
+    {
+        return enabled ? cv::getTickCount() : 0;
+    }
+
+    // Records the duration of a stage which started at tick and returns the start tick of the next stage
+    int64 lap(const char *name, int64 tick)
+    {
+        if (!enabled)
+            return 0;
+
+        int64 now = cv::getTickCount();
+        add(name, 1000.0 * (now - tick) / cv::getTickFrequency(), true);
+        return now;
+    }
+
+    // Records a duration in ms measured by the caller
+    void duration(const char *name, double ms)
+    {
+        if (enabled)
+            add(name, ms, true);
+    }
+
+    // Records a value of a stage, i.e. the number of candidates
+    void count(const char *name, double value)
+    {
+        if (enabled)
+            add(name, value, false);
+    }
+
+    void reset()
+    {
+        statistics.clear();
+    }
+
+    const std::map<std::string, Statistic, std::less<>> &stats() const
+    {
+        return statistics;
+    }
+
+private:
+    std::map<std::string, Statistic, std::less<>> statistics;
+
+    void add(const char *name, double value, bool timing)
+    {
+        auto it = statistics.find(name);
+        if (it == statistics.end())
+            it = statistics.emplace(name, Statistic()).first;
+
+        Statistic &statistic = it->second;
+        statistic.timing = timing;
+        statistic.min = statistic.calls == 0 ? value : std::min(statistic.min, value);
+        statistic.max = statistic.calls == 0 ? value : std::max(statistic.max, value);
+        statistic.total += value;
+        statistic.calls++;
+
+        double binned = timing ? 1000.0 * value : value;
+        int bin = binned < 1 ? 0 : std::min((int)std::floor(std::log2(binned)) + 1, HISTOGRAM_BINS - 1);
+        statistic.histogram[bin]++;
+    }
+};
+
+#endif // PUPILALGOSIMPLE_STAGEPROFILER_H
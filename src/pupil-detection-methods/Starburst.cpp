@@ -54,32 +54,46 @@ void locate_corneal_reflection(cv::Mat *image, int sx, int sy, int window_size,
 
     cv::Mat roiImage = (*image)(cv::Rect(startx, starty, endx - startx + 1, endy - starty + 1));
     cv::Mat roiThresholdImage;
-    roiImage.copyTo(roiThresholdImage);
 
+    // Thresholds above the brightest pixel of the window give empty images, the search starts at that pixel
     double min_value, max_value;
-    cv::Point min_loc, max_loc; // location
-    cv::minMaxLoc(*image, &min_value, &max_value, &min_loc, &max_loc);
+    cv::minMaxLoc(roiImage, &min_value, &max_value);
+
+    // A threshold only changes the binary image if a pixel has the value just above it
+    int histogram[256] = {0};
+    for (int y = 0; y < roiImage.rows; y++)
+    {
+        const UINT8 *row = roiImage.ptr<UINT8>(y);
+        for (int x = 0; x < roiImage.cols; x++)
+            histogram[row[x]]++;
+    }
 
     int threshold;
     std::vector<std::vector<cv::Point>> contours;
-    auto *scores = (double *)malloc(sizeof(double) * ((int)max_value + 1));
-    memset(scores, 0, sizeof(double) * ((int)max_value + 1));
+    std::vector<double> scores((int)max_value + 1, 0.0);
     int area, max_area, sum_area;
     for (threshold = (int)max_value; threshold >= 1; threshold--)
     {
+        if (threshold < (int)max_value && histogram[threshold + 1] == 0)
+        {
+            // Same binary image as the previous threshold, hence the same score
+            scores[threshold - 1] = scores[threshold];
+            continue;
+        }
+
         cv::threshold(roiImage, roiThresholdImage, threshold, 1, cv::THRESH_BINARY);
         cv::findContours(roiThresholdImage, contours, cv::RETR_LIST, cv::CHAIN_APPROX_NONE);
         max_area = 0;
         sum_area = 0;
-        std::vector<cv::Point> max_contour;
-        for (auto &contour : contours)
+        int max_contour = -1;
+        for (size_t i = 0; i < contours.size(); i++)
         {
-            area = contour.size() + (int)(fabs(cv::contourArea(contour)));
+            area = contours[i].size() + (int)(fabs(cv::contourArea(contours[i])));
             sum_area += area;
             if (area > max_area)
             {
                 max_area = area;
-                max_contour = contour;
+                max_contour = (int)i;
             }
         }
         if (sum_area - max_area > 0)
@@ -95,17 +109,16 @@ void locate_corneal_reflection(cv::Mat *image, int sx, int sy, int window_size,
             crar = (int)sqrt(max_area / CV_PI);
             int sum_x = 0;
             int sum_y = 0;
-            for (auto &it : max_contour)
+            for (auto &it : contours[max_contour])
             {
                 sum_x += it.x;
                 sum_y += it.y;
             }
-            crx = sum_x / max_contour.size();
-            cry = sum_y / max_contour.size();
+            crx = sum_x / contours[max_contour].size();
+            cry = sum_y / contours[max_contour].size();
             break;
         }
     }
-    free(scores);
 
     if (crar > biggest_crar)
     {
@@ -122,12 +135,12 @@ void locate_corneal_reflection(cv::Mat *image, int sx, int sy, int window_size,
     }
 }
 
-int fit_circle_radius_to_corneal_reflection(cv::Mat *image, int crx, int cry, int crar, int biggest_crar, double *sin_array, double *cos_array, int array_len)
+int fit_circle_radius_to_corneal_reflection(cv::Mat *image, int crx, int cry, int crar, int biggest_crar, const double *sin_array, const double *cos_array, int array_len)
 {
     if (crx == -1 || cry == -1 || crar == -1)
         return -1;
 
-    double *ratio = (double *)malloc((biggest_crar - crar + 1) * sizeof(double));
+    std::vector<double> ratio(biggest_crar - crar + 1);
     int i, r, r_delta = 1;
     int x, y, x2, y2;
     double sum, sum2;
@@ -153,18 +166,16 @@ int fit_circle_radius_to_corneal_reflection(cv::Mat *image, int crx, int cry, in
         {
             if (ratio[r - crar - 2] < ratio[r - crar - 1] && ratio[r - crar] < ratio[r - crar - 1])
             {
-                free(ratio);
                 return r - 1;
             }
         }
     }
 
-    free(ratio);
     // printf("ATTN! fit_circle_radius_to_corneal_reflection() do not change the radius\n");
     return crar;
 }
 
-void interpolate_corneal_reflection(cv::Mat *image, int crx, int cry, int crr, double *sin_array, double *cos_array,
+void interpolate_corneal_reflection(cv::Mat *image, int crx, int cry, int crr, const double *sin_array, const double *cos_array,
                                     int array_len)
 {
     if (crx == -1 || cry == -1 || crr == -1)
@@ -177,7 +188,7 @@ void interpolate_corneal_reflection(cv::Mat *image, int crx, int cry, int crr, d
     }
 
     int i, r, r2, x, y;
-    UINT8 *perimeter_pixel = (UINT8 *)malloc(array_len * sizeof(int));
+    std::vector<UINT8> perimeter_pixel(array_len);
     int sum = 0;
     double avg;
     for (i = 0; i < array_len; i++)
@@ -199,38 +210,50 @@ void interpolate_corneal_reflection(cv::Mat *image, int crx, int cry, int crr, d
             *(image->data + y * image->size().width + x) = (UINT8)((r2 * 1.0 / crr) * avg + (r * 1.0 / crr) * perimeter_pixel[i]);
         }
     }
-    free(perimeter_pixel);
+}
+
+namespace {
+
+// Directions in steps of one degree used to fit and fill the corneal reflection
+struct CornealReflectionAngles
+{
+    std::vector<double> sin_array;
+    std::vector<double> cos_array;
+
+    CornealReflectionAngles()
+    {
+        float angle_delta = 1 * CV_PI / 180;
+        int angle_num = (int)(2 * CV_PI / angle_delta);
+
+        sin_array.resize(angle_num);
+        cos_array.resize(angle_num);
+        for (int i = 0; i < angle_num; i++)
+        {
+            double angle = i * angle_delta;
+            sin_array[i] = sin(angle);
+            cos_array[i] = cos(angle);
+        }
+    }
+};
+
 }
 
 void remove_corneal_reflection(cv::Mat *image, int sx, int sy, int window_size, int biggest_crr, int &crx, int &cry, int &crr)
 {
+    static const CornealReflectionAngles angles;
+
     int crar = -1; // corneal reflection approximate radius
     crx = cry = crar = -1;
 
-    float angle_delta = 1 * CV_PI / 180;
-    int angle_num = (int)(2 * CV_PI / angle_delta);
-
-    double *angle_array = (double *)malloc(angle_num * sizeof(double));
-    double *sin_array = (double *)malloc(angle_num * sizeof(double));
-    double *cos_array = (double *)malloc(angle_num * sizeof(double));
-    for (int i = 0; i < angle_num; i++)
-    {
-        angle_array[i] = i * angle_delta;
-        sin_array[i] = sin(angle_array[i]);
-        cos_array[i] = cos(angle_array[i]);
-    }
+    const int angle_num = (int)angles.sin_array.size();
 
     locate_corneal_reflection(image, sx, sy, window_size, (int)(biggest_crr / 2.5), crx, cry, crar);
-    crr = fit_circle_radius_to_corneal_reflection(image, crx, cry, crar, (int)(biggest_crr / 2.5), sin_array, cos_array, angle_num);
+    crr = fit_circle_radius_to_corneal_reflection(image, crx, cry, crar, (int)(biggest_crr / 2.5), angles.sin_array.data(), angles.cos_array.data(), angle_num);
     crr = (int)(2.5 * crr);
-    interpolate_corneal_reflection(image, crx, cry, crr, sin_array, cos_array, angle_num);
-
-    free(angle_array);
-    free(sin_array);
-    free(cos_array);
+    interpolate_corneal_reflection(image, crx, cry, crr, angles.sin_array.data(), angles.cos_array.data(), angle_num);
 }
 
-int RansacEllipse::starburst_pupil_contour_detection(UINT8 *pupil_image, const cv::Point2d &startPoint, int width, int height, int edge_thresh, int N, int minimum_cadidate_features)
+int RansacEllipse::starburst_pupil_contour_detection(const UINT8 *pupil_image, const cv::Point2d &startPoint, int width, int height, int edge_thresh, int N, int minimum_cadidate_features)
 {
     // ML: added int return to signal that detection success
 
@@ -239,21 +262,23 @@ int RansacEllipse::starburst_pupil_contour_detection(UINT8 *pupil_image, const c
     int loop_count = 0;
     double angle_step = 2 * CV_PI / N;
     double new_angle_step;
-    cv::Point2d *edge, edge_mean;
+    cv::Point2d edge, edge_mean;
     double angle_normal;
     double cx = startPoint.x;
     double cy = startPoint.y;
     int first_ep_num;
 
+    this->update_ray_table(N);
+
     while (edge_thresh > 5 && loop_count <= 10)
     {
         this->edge_intensity_diff.clear();
-        this->destroy_edge_point();
+        this->edge_point.clear();
         while (this->edge_point.size() < minimum_cadidate_features && edge_thresh > 5)
         {
             this->edge_intensity_diff.clear();
-            this->destroy_edge_point();
-            this->locate_edge_points(pupil_image, width, height, cx, cy, dis, angle_step, 0, 2 * CV_PI, edge_thresh);
+            this->edge_point.clear();
+            this->cast_rays(pupil_image, width, height, cx, cy, dis, edge_thresh);
             if (this->edge_point.size() < minimum_cadidate_features)
             {
                 edge_thresh -= 1;
@@ -267,10 +292,11 @@ int RansacEllipse::starburst_pupil_contour_detection(UINT8 *pupil_image, const c
         first_ep_num = this->edge_point.size();
         for (int i = 0; i < first_ep_num; i++)
         {
-            edge = this->edge_point.at(i);
-            angle_normal = atan2(cy - edge->y, cx - edge->x);
-            new_angle_step = angle_step * (edge_thresh * 1.0 / edge_intensity_diff.at(i));
-            this->locate_edge_points(pupil_image, width, height, edge->x, edge->y, dis, new_angle_step, angle_normal, angle_spread, edge_thresh);
+            // Copy, edge_point grows inside locate_edge_points
+            edge = this->edge_point[i];
+            angle_normal = atan2(cy - edge.y, cx - edge.x);
+            new_angle_step = angle_step * (edge_thresh * 1.0 / edge_intensity_diff[i]);
+            this->locate_edge_points(pupil_image, width, height, edge.x, edge.y, dis, new_angle_step, angle_normal, angle_spread, edge_thresh);
         }
 
         loop_count += 1;
@@ -284,14 +310,14 @@ int RansacEllipse::starburst_pupil_contour_detection(UINT8 *pupil_image, const c
 
     if (loop_count > 10)
     {
-        this->destroy_edge_point();
+        this->edge_point.clear();
         // printf("Error! edge points did not converge in %d iterations!\n", loop_count);
         return 1;
     }
 
     if (edge_thresh <= 5)
     {
-        this->destroy_edge_point();
+        this->edge_point.clear();
         // printf("Error! Adaptive threshold is too low!\n");
         return 1;
     }
@@ -299,60 +325,84 @@ int RansacEllipse::starburst_pupil_contour_detection(UINT8 *pupil_image, const c
     return 0;
 }
 
+void RansacEllipse::update_ray_table(int N)
+{
+    if (N == ray_count)
+        return;
+
+    // Same angles as locate_edge_points for a full circle around the start point
+    double angle_step = 2 * CV_PI / N;
+    double angle_normal = 0;
+    double angle_spread = 2 * CV_PI;
+
+    ray_cos.clear();
+    ray_sin.clear();
+    for (double angle = angle_normal - angle_spread / 2 + 0.0001; angle < angle_normal + angle_spread / 2; angle += angle_step)
+    {
+        ray_cos.push_back(cos(angle));
+        ray_sin.push_back(sin(angle));
+    }
+    ray_count = N;
+}
+
+void RansacEllipse::cast_rays(const UINT8 *image, int width, int height, double cx, double cy, int dis, int edge_thresh)
+{
+    for (size_t i = 0; i < ray_cos.size(); i++)
+        walk_ray(image, width, height, cx, cy, dis * ray_cos[i], dis * ray_sin[i], edge_thresh);
+}
+
 void RansacEllipse::locate_edge_points(const UINT8 *image, int width, int height, double cx, double cy, int dis, double angle_step, double angle_normal, double angle_spread, int edge_thresh)
 {
     double angle;
-    cv::Point2d p, *edge;
-    double dis_cos, dis_sin;
-    int pixel_value1, pixel_value2;
 
     for (angle = angle_normal - angle_spread / 2 + 0.0001; angle < angle_normal + angle_spread / 2; angle += angle_step)
     {
-        dis_cos = dis * cos(angle);
-        dis_sin = dis * sin(angle);
-        p.x = cx + dis_cos;
-        p.y = cy + dis_sin;
+        walk_ray(image, width, height, cx, cy, dis * cos(angle), dis * sin(angle), edge_thresh);
+    }
+}
+
+void RansacEllipse::walk_ray(const UINT8 *image, int width, int height, double cx, double cy, double dis_cos, double dis_sin, int edge_thresh)
+{
+    cv::Point2d p;
+    int pixel_value1, pixel_value2;
+
+    p.x = cx + dis_cos;
+    p.y = cy + dis_sin;
+
+    if (p.x < 0 || p.x >= width || p.y < 0 || p.y >= height)
+        return;
 
+    pixel_value1 = image[(int)(p.y) * width + (int)(p.x)];
+    while (1)
+    {
+        p.x += dis_cos;
+        p.y += dis_sin;
         if (p.x < 0 || p.x >= width || p.y < 0 || p.y >= height)
-            continue;
+            break;
 
-        pixel_value1 = image[(int)(p.y) * width + (int)(p.x)];
-        while (1)
+        pixel_value2 = image[(int)(p.y) * width + (int)(p.x)];
+        // printf("edge diff: %d\n", pixel_value2 - pixel_value1);
+        if ((pixel_value2 - pixel_value1) > edge_thresh)
         {
-            p.x += dis_cos;
-            p.y += dis_sin;
-            if (p.x < 0 || p.x >= width || p.y < 0 || p.y >= height)
-                break;
-
-            pixel_value2 = image[(int)(p.y) * width + (int)(p.x)];
-            // printf("edge diff: %d\n", pixel_value2 - pixel_value1);
-            if ((pixel_value2 - pixel_value1) > edge_thresh)
-            {
-                edge = new cv::Point2d();
-                edge->x = p.x - dis_cos / 2;
-                edge->y = p.y - dis_sin / 2;
-                this->edge_point.push_back(edge);
-                this->edge_intensity_diff.push_back(pixel_value2 - pixel_value1);
-                break;
-            }
-            pixel_value1 = pixel_value2;
+            this->edge_point.emplace_back(p.x - dis_cos / 2, p.y - dis_sin / 2);
+            this->edge_intensity_diff.push_back(pixel_value2 - pixel_value1);
+            break;
         }
+        pixel_value1 = pixel_value2;
     }
 }
 
 cv::Point2d RansacEllipse::get_edge_mean()
 {
 
-    cv::Point2d *edge;
     int i;
     double sumx = 0, sumy = 0;
     cv::Point2d edge_mean;
 
     for (i = 0; i < this->edge_point.size(); i++)
     {
-        edge = this->edge_point.at(i);
-        sumx += edge->x;
-        sumy += edge->y;
+        sumx += this->edge_point[i].x;
+        sumy += this->edge_point[i].y;
     }
     if (this->edge_point.size() != 0)
     {
@@ -367,20 +417,6 @@ cv::Point2d RansacEllipse::get_edge_mean()
     return edge_mean;
 }
 
-void RansacEllipse::destroy_edge_point()
-{
-    std::vector<cv::Point2d *>::iterator iter;
-
-    if (this->edge_point.size() != 0)
-    {
-        for (iter = this->edge_point.begin(); iter != this->edge_point.end(); iter++)
-        {
-            free(*iter);
-        }
-        this->edge_point.clear();
-    }
-}
-
 void RansacEllipse::get_random_num(int n, int max_num, int *rand_num)
 {
     int rand_index = 0;
@@ -397,10 +433,11 @@ void RansacEllipse::get_random_num(int n, int max_num, int *rand_num)
         return;
     }
 
+    std::uniform_int_distribution<int> distribution(0, max_num);
     while (rand_index < n)
     {
         is_new = 1;
-        r = (int)((rand() * 1.0 / RAND_MAX) * max_num);
+        r = distribution(this->rng);
         for (i = 0; i < rand_index; i++)
         {
             if (r == rand_num[i])
@@ -457,33 +494,105 @@ bool RansacEllipse::solve_ellipse(double *conic_param, double *ellipse_param)
     return 1;
 }
 
-cv::Point2d *RansacEllipse::normalize_edge_point(double &dis_scale, cv::Point2d &nor_center, int ep_num)
+bool RansacEllipse::solve_conic(double A[5][6], double *conic_param)
+{
+    // The conic through five points is the null vector of the 5x6 system a*x^2 + b*x*y + c*y^2 + d*x + e*y + f = 0.
+    // Gaussian elimination with complete pivoting leaves one free column which is set to 1.
+    int col[6] = {0, 1, 2, 3, 4, 5};
+    int i, j, k;
+
+    for (k = 0; k < 5; k++)
+    {
+        int pivot_row = k, pivot_col = k;
+        double pivot = 0;
+        for (i = k; i < 5; i++)
+        {
+            for (j = k; j < 6; j++)
+            {
+                if (fabs(A[i][col[j]]) > pivot)
+                {
+                    pivot = fabs(A[i][col[j]]);
+                    pivot_row = i;
+                    pivot_col = j;
+                }
+            }
+        }
+        if (pivot < 1e-12)
+            return false; // degenerate sample, i.e. collinear or repeated points
+
+        if (pivot_row != k)
+        {
+            for (j = 0; j < 6; j++)
+                std::swap(A[k][j], A[pivot_row][j]);
+        }
+        std::swap(col[k], col[pivot_col]);
+
+        for (i = k + 1; i < 5; i++)
+        {
+            double factor = A[i][col[k]] / A[k][col[k]];
+            for (j = k; j < 6; j++)
+                A[i][col[j]] -= factor * A[k][col[j]];
+        }
+    }
+
+    double solution[6];
+    solution[col[5]] = 1;
+    for (k = 4; k >= 0; k--)
+    {
+        double sum = A[k][col[5]];
+        for (j = k + 1; j < 5; j++)
+            sum += A[k][col[j]] * solution[col[j]];
+        solution[col[k]] = -sum / A[k][col[k]];
+    }
+
+    // Unit length as the singular vector of the former SVD solve, the inlier threshold depends on it,
+    // and a positive trace so that the orientation of the ellipse does not depend on the sign
+    double norm = 0;
+    for (i = 0; i < 6; i++)
+        norm += solution[i] * solution[i];
+    norm = sqrt(norm);
+    if (solution[0] + solution[2] < 0)
+        norm = -norm;
+    for (i = 0; i < 6; i++)
+        conic_param[i] = solution[i] / norm;
+
+    return true;
+}
+
+void RansacEllipse::normalize_edge_point(double &dis_scale, cv::Point2d &nor_center, int ep_num)
 {
     double sumx = 0, sumy = 0;
     double sumdis = 0;
-    cv::Point2d *edge;
     int i;
 
     for (i = 0; i < ep_num; i++)
     {
-        edge = this->edge_point.at(i);
-        sumx += edge->x;
-        sumy += edge->y;
-        sumdis += sqrt((double)(edge->x * edge->x + edge->y * edge->y));
+        const cv::Point2d &edge = this->edge_point[i];
+        sumx += edge.x;
+        sumy += edge.y;
+        sumdis += sqrt((double)(edge.x * edge.x + edge.y * edge.y));
     }
 
     dis_scale = sqrt((double)2) * ep_num / sumdis;
     nor_center.x = sumx * 1.0 / ep_num;
     nor_center.y = sumy * 1.0 / ep_num;
-    cv::Point2d *edge_point_nor = (cv::Point2d *)malloc(sizeof(cv::Point2d) * ep_num);
 
+    // Monomials of the conic equation are computed once per fit instead of once per sample
+    nor_x.resize(ep_num);
+    nor_y.resize(ep_num);
+    nor_xx.resize(ep_num);
+    nor_xy.resize(ep_num);
+    nor_yy.resize(ep_num);
     for (i = 0; i < ep_num; i++)
     {
-        edge = this->edge_point.at(i);
-        edge_point_nor[i].x = (edge->x - nor_center.x) * dis_scale;
-        edge_point_nor[i].y = (edge->y - nor_center.y) * dis_scale;
+        double x = (this->edge_point[i].x - nor_center.x) * dis_scale;
+        double y = (this->edge_point[i].y - nor_center.y) * dis_scale;
+        nor_x[i] = x;
+        nor_y[i] = y;
+        nor_xx[i] = x * x;
+        nor_xy[i] = x * y;
+        nor_yy[i] = y * y;
     }
-    return edge_point_nor;
 }
 
 void RansacEllipse::denormalize_ellipse_param(double *par, double *normailized_par, double dis_scale, cv::Point2d nor_center)
@@ -494,366 +603,69 @@ void RansacEllipse::denormalize_ellipse_param(double *par, double *normailized_p
     par[3] = normailized_par[3] / dis_scale + nor_center.y;
 }
 
-void RansacEllipse::svd(int m, int n, double **a, double **p, double *d, double **q)
-{
-    int flag, i, its, j, jj, k, l, nm, nm1 = n - 1, mm1 = m - 1;
-    double c, f, h, s, x, y, z;
-    double anorm = 0, g = 0, scale = 0;
-    // double         *r = tvector_alloc(0, n, double);
-    double *r = (double *)malloc(sizeof(double) * n);
-
-    for (i = 0; i < m; i++)
-        for (j = 0; j < n; j++)
-            p[i][j] = a[i][j];
-    // for (i = m; i < n; i++)
-    //                 p[i][j] = 0;
-
-    /* Householder reduction to bidigonal form */
-    for (i = 0; i < n; i++)
-    {
-        l = i + 1;
-        r[i] = scale * g;
-        g = s = scale = 0.0;
-        if (i < m)
-        {
-            for (k = i; k < m; k++)
-                scale += fabs(p[k][i]);
-            if (scale)
-            {
-                for (k = i; k < m; k++)
-                {
-                    p[k][i] /= scale;
-                    s += p[k][i] * p[k][i];
-                }
-                f = p[i][i];
-                g = -SIGN(sqrt(s), f);
-                h = f * g - s;
-                p[i][i] = f - g;
-                if (i != nm1)
-                {
-                    for (j = l; j < n; j++)
-                    {
-                        for (s = 0.0, k = i; k < m; k++)
-                            s += p[k][i] * p[k][j];
-                        f = s / h;
-                        for (k = i; k < m; k++)
-                            p[k][j] += f * p[k][i];
-                    }
-                }
-                for (k = i; k < m; k++)
-                    p[k][i] *= scale;
-            }
-        }
-        d[i] = scale * g;
-        g = s = scale = 0.0;
-        if (i < m && i != nm1)
-        {
-            for (k = l; k < n; k++)
-                scale += fabs(p[i][k]);
-            if (scale)
-            {
-                for (k = l; k < n; k++)
-                {
-                    p[i][k] /= scale;
-                    s += p[i][k] * p[i][k];
-                }
-                f = p[i][l];
-                g = -SIGN(sqrt(s), f);
-                h = f * g - s;
-                p[i][l] = f - g;
-                for (k = l; k < n; k++)
-                    r[k] = p[i][k] / h;
-                if (i != mm1)
-                {
-                    for (j = l; j < m; j++)
-                    {
-                        for (s = 0.0, k = l; k < n; k++)
-                            s += p[j][k] * p[i][k];
-                        for (k = l; k < n; k++)
-                            p[j][k] += s * r[k];
-                    }
-                }
-                for (k = l; k < n; k++)
-                    p[i][k] *= scale;
-            }
-        }
-        anorm = MAX(anorm, fabs(d[i]) + fabs(r[i]));
-    }
-
-    /* Accumulation of right-hand transformations */
-    for (i = n - 1; i >= 0; i--)
-    {
-        if (i < nm1)
-        {
-            if (g)
-            {
-                for (j = l; j < n; j++)
-                    q[j][i] = (p[i][j] / p[i][l]) / g;
-                for (j = l; j < n; j++)
-                {
-                    for (s = 0.0, k = l; k < n; k++)
-                        s += p[i][k] * q[k][j];
-                    for (k = l; k < n; k++)
-                        q[k][j] += s * q[k][i];
-                }
-            }
-            for (j = l; j < n; j++)
-                q[i][j] = q[j][i] = 0.0;
-        }
-        q[i][i] = 1.0;
-        g = r[i];
-        l = i;
-    }
-    /* Accumulation of left-hand transformations */
-    for (i = n - 1; i >= 0; i--)
-    {
-        l = i + 1;
-        g = d[i];
-        if (i < nm1)
-            for (j = l; j < n; j++)
-                p[i][j] = 0.0;
-        if (g)
-        {
-            g = 1.0 / g;
-            if (i != nm1)
-            {
-                for (j = l; j < n; j++)
-                {
-                    for (s = 0.0, k = l; k < m; k++)
-                        s += p[k][i] * p[k][j];
-                    f = (s / p[i][i]) * g;
-                    for (k = i; k < m; k++)
-                        p[k][j] += f * p[k][i];
-                }
-            }
-            for (j = i; j < m; j++)
-                p[j][i] *= g;
-        }
-        else
-            for (j = i; j < m; j++)
-                p[j][i] = 0.0;
-        ++p[i][i];
-    }
-    /* diagonalization of the bidigonal form */
-    for (k = n - 1; k >= 0; k--)
-    { /* loop over singlar values */
-        for (its = 0; its < 30; its++)
-        { /* loop over allowed iterations */
-            flag = 1;
-            for (l = k; l >= 0; l--)
-            {               /* test for splitting */
-                nm = l - 1; /* note that r[l] is always
-                             * zero */
-                if (fabs(r[l]) + anorm == anorm)
-                {
-                    flag = 0;
-                    break;
-                }
-                if (fabs(d[nm]) + anorm == anorm)
-                    break;
-            }
-            if (flag)
-            {
-                c = 0.0; /* cancellation of r[l], if
-                          * l>1 */
-                s = 1.0;
-                for (i = l; i <= k; i++)
-                {
-                    f = s * r[i];
-                    if (fabs(f) + anorm != anorm)
-                    {
-                        g = d[i];
-                        h = radius(f, g);
-                        d[i] = h;
-                        h = 1.0 / h;
-                        c = g * h;
-                        s = (-f * h);
-                        for (j = 0; j < m; j++)
-                        {
-                            y = p[j][nm];
-                            z = p[j][i];
-                            p[j][nm] = y * c + z * s;
-                            p[j][i] = z * c - y * s;
-                        }
-                    }
-                }
-            }
-            z = d[k];
-            if (l == k)
-            { /* convergence */
-                if (z < 0.0)
-                {
-                    d[k] = -z;
-                    for (j = 0; j < n; j++)
-                        q[j][k] = (-q[j][k]);
-                }
-                break;
-            }
-            if (its == 30)
-            {
-                // error("svd: No convergence in 30 svd iterations", non_fatal);
-                return;
-            }
-            x = d[l]; /* shift from bottom 2-by-2 minor */
-            nm = k - 1;
-            y = d[nm];
-            g = r[nm];
-            h = r[k];
-            f = ((y - z) * (y + z) + (g - h) * (g + h)) / (2.0 * h * y);
-            g = radius(f, 1.0);
-            /* next QR transformation */
-            f = ((x - z) * (x + z) + h * ((y / (f + SIGN(g, f))) - h)) / x;
-            c = s = 1.0;
-            for (j = l; j <= nm; j++)
-            {
-                i = j + 1;
-                g = r[i];
-                y = d[i];
-                h = s * g;
-                g = c * g;
-                z = radius(f, h);
-                r[j] = z;
-                c = f / z;
-                s = h / z;
-                f = x * c + g * s;
-                g = g * c - x * s;
-                h = y * s;
-                y = y * c;
-                for (jj = 0; jj < n; jj++)
-                {
-                    x = q[jj][j];
-                    z = q[jj][i];
-                    q[jj][j] = x * c + z * s;
-                    q[jj][i] = z * c - x * s;
-                }
-                z = radius(f, h);
-                d[j] = z; /* rotation can be arbitrary
-                           * id z=0 */
-                if (z)
-                {
-                    z = 1.0 / z;
-                    c = f * z;
-                    s = h * z;
-                }
-                f = (c * g) + (s * y);
-                x = (c * y) - (s * g);
-                for (jj = 0; jj < m; jj++)
-                {
-                    y = p[jj][j];
-                    z = p[jj][i];
-                    p[jj][j] = y * c + z * s;
-                    p[jj][i] = z * c - y * s;
-                }
-            }
-            r[l] = 0.0;
-            r[k] = f;
-            d[k] = x;
-        }
-    }
-    free(r);
-
-    // dhli add: the original code does not sort the eigen value
-    // should do that and change the eigen vector accordingly
-}
-
-int *RansacEllipse::pupil_fitting_inliers(UINT8 *pupil_image, int width, int height, int &return_max_inliers_num)
+int RansacEllipse::pupil_fitting_inliers(int width, int height)
 {
     int i;
     int ep_num = this->edge_point.size(); // ep stands for edge point
     cv::Point2d nor_center;
     double dis_scale;
 
+    this->inliers.clear();
+
     const int ellipse_point_num = 5; // number of point that needed to fit an ellipse
     if (ep_num < ellipse_point_num)
     {
         // printf("Error! %d points are not enough to fit ellipse\n", ep_num);
         memset(this->pupil_param, 0, sizeof(this->pupil_param));
-        return_max_inliers_num = 0;
-        return NULL;
+        this->ransac_count = 0;
+        return 0;
     }
 
     // Normalization
-    cv::Point2d *edge_point_nor = this->normalize_edge_point(dis_scale, nor_center, ep_num);
+    this->normalize_edge_point(dis_scale, nor_center, ep_num);
+    const double *px = nor_x.data(), *py = nor_y.data();
+    const double *pxx = nor_xx.data(), *pxy = nor_xy.data(), *pyy = nor_yy.data();
 
-    // Ransac
-    int *inliers_index = (int *)malloc(sizeof(int) * ep_num);
-    int *max_inliers_index = (int *)malloc(sizeof(int) * ep_num);
+    // Ransac, seeded so that the same edge points always give the same ellipse
+    this->rng.seed(this->seed);
     int ninliers = 0;
     int max_inliers = 0;
     int sample_num = 1000; // number of sample
     int ransac_count = 0;
     double dis_threshold = sqrt(3.84) * dis_scale / 10; // Works better with the /10
-    double dis_error;
+    const double log_outlier_sample = log(1.0 - this->confidence);
 
-    memset(inliers_index, int(0), sizeof(int) * ep_num);
-    memset(max_inliers_index, int(0), sizeof(int) * ep_num);
     int rand_index[ellipse_point_num];
-    double A[ellipse_point_num + 1][6];
-    int M = ellipse_point_num + 1, N = 6; // M is row; N is column
-    for (i = 0; i < M; i++)
-    {
-        A[i][5] = 1;
-    }
-    for (i = 0; i < N; i++)
-    {
-        A[ellipse_point_num][i] = 0;
-    }
-    double **ppa = (double **)malloc(sizeof(double *) * M);
-    double **ppu = (double **)malloc(sizeof(double *) * M);
-    double **ppv = (double **)malloc(sizeof(double *) * N);
-    for (i = 0; i < M; i++)
-    {
-        ppa[i] = A[i];
-        ppu[i] = (double *)malloc(sizeof(double) * N);
-    }
-    for (i = 0; i < N; i++)
-    {
-        ppv[i] = (double *)malloc(sizeof(double) * N);
-    }
-    double pd[6];
-    int min_d_index;
+    double A[ellipse_point_num][6];
     double conic_par[6] = {0};
     double ellipse_par[5] = {0};
     double best_ellipse_par[5] = {0};
     double ratio;
-    while (sample_num > ransac_count)
+    while (sample_num > ransac_count && ransac_count < this->max_iterations)
     {
+        ransac_count++;
         this->get_random_num(ellipse_point_num, (ep_num - 1), rand_index);
 
-        // svd decomposition to solve the ellipse parameter
         for (i = 0; i < ellipse_point_num; i++)
         {
-            A[i][0] = edge_point_nor[rand_index[i]].x * edge_point_nor[rand_index[i]].x;
-            A[i][1] = edge_point_nor[rand_index[i]].x * edge_point_nor[rand_index[i]].y;
-            A[i][2] = edge_point_nor[rand_index[i]].y * edge_point_nor[rand_index[i]].y;
-            A[i][3] = edge_point_nor[rand_index[i]].x;
-            A[i][4] = edge_point_nor[rand_index[i]].y;
+            A[i][0] = pxx[rand_index[i]];
+            A[i][1] = pxy[rand_index[i]];
+            A[i][2] = pyy[rand_index[i]];
+            A[i][3] = px[rand_index[i]];
+            A[i][4] = py[rand_index[i]];
+            A[i][5] = 1;
         }
 
-        svd(M, N, ppa, ppu, pd, ppv);
-        min_d_index = 0;
-        for (i = 1; i < N; i++)
-        {
-            if (pd[i] < pd[min_d_index])
-                min_d_index = i;
-        }
+        if (!solve_conic(A, conic_par))
+            continue;
 
-        for (i = 0; i < N; i++)
-            conic_par[i] = ppv[i][min_d_index]; // the column of v that corresponds to the smallest singular value,
-        // which is the solution of the equations
+        // Count only, the indices are collected when the sample improves on the best one
+        const double c0 = conic_par[0], c1 = conic_par[1], c2 = conic_par[2], c3 = conic_par[3], c4 = conic_par[4], c5 = conic_par[5];
         ninliers = 0;
-        memset(inliers_index, 0, sizeof(int) * ep_num);
         for (i = 0; i < ep_num; i++)
         {
-            dis_error = conic_par[0] * edge_point_nor[i].x * edge_point_nor[i].x +
-                        conic_par[1] * edge_point_nor[i].x * edge_point_nor[i].y +
-                        conic_par[2] * edge_point_nor[i].y * edge_point_nor[i].y +
-                        conic_par[3] * edge_point_nor[i].x + conic_par[4] * edge_point_nor[i].y + conic_par[5];
-            if (fabs(dis_error) < dis_threshold)
-            {
-                inliers_index[ninliers] = i;
-                ninliers++;
-            }
+            double dis_error = c0 * pxx[i] + c1 * pxy[i] + c2 * pyy[i] + c3 * px[i] + c4 * py[i] + c5;
+            ninliers += fabs(dis_error) < dis_threshold;
         }
 
         if (ninliers > max_inliers)
@@ -865,22 +677,28 @@ int *RansacEllipse::pupil_fitting_inliers(UINT8 *pupil_image, int width, int hei
                 if (ellipse_par[2] > 0 && ellipse_par[2] <= width - 1 && ellipse_par[3] > 0 && ellipse_par[3] <= height - 1 &&
                     ratio > 0.5 && ratio < 2)
                 {
-                    memcpy(max_inliers_index, inliers_index, sizeof(int) * ep_num);
+                    this->inliers.clear();
+                    for (i = 0; i < ep_num; i++)
+                    {
+                        double dis_error = c0 * pxx[i] + c1 * pxy[i] + c2 * pyy[i] + c3 * px[i] + c4 * py[i] + c5;
+                        if (fabs(dis_error) < dis_threshold)
+                            this->inliers.push_back(i);
+                    }
                     for (i = 0; i < 5; i++)
                     {
                         best_ellipse_par[i] = ellipse_par[i];
                     }
                     max_inliers = ninliers;
-                    sample_num = (int)(log((double)(1 - 0.99)) / log(1.0 - pow(ninliers * 1.0 / ep_num, 5)));
+
+                    // Samples needed to draw an outlier free sample with the given confidence at this inlier ratio
+                    double outlier_sample = 1.0 - pow(ninliers * 1.0 / ep_num, ellipse_point_num);
+                    if (outlier_sample <= 0)
+                        sample_num = 0;
+                    else
+                        sample_num = (int)std::min<double>(log_outlier_sample / log(outlier_sample), this->max_iterations);
                 }
             }
         }
-        ransac_count++;
-        if (ransac_count > 1500)
-        {
-            // printf("Error! ransac_count exceed! ransac break! sample_num=%d, ransac_count=%d\n", sample_num, ransac_count);
-            break;
-        }
     }
     // INFO("ransc end\n");
     if (best_ellipse_par[0] > 0 && best_ellipse_par[1] > 0)
@@ -894,26 +712,11 @@ int *RansacEllipse::pupil_fitting_inliers(UINT8 *pupil_image, int width, int hei
     {
         memset(pupil_param, 0, sizeof(pupil_param));
         max_inliers = 0;
-        free(max_inliers_index);
-        max_inliers_index = NULL;
+        this->inliers.clear();
     }
 
-    for (i = 0; i < M; i++)
-    {
-        free(ppu[i]);
-    }
-    for (i = 0; i < N; i++)
-    {
-        free(ppv[i]);
-    }
-    free(ppu);
-    free(ppv);
-    free(ppa);
-
-    free(edge_point_nor);
-    free(inliers_index);
-    return_max_inliers_num = max_inliers;
-    return max_inliers_index;
+    this->ransac_count = ransac_count;
+    return max_inliers;
 }
 
 void Starburst::run(const cv::Mat &frame, Pupil &pupil)
@@ -931,7 +734,8 @@ void Starburst::run(const cv::Mat &frame, Pupil &pupil)
     //        cv::resize(frame, downscaled, cv::Size(), scalingRatio, scalingRatio, cv::INTER_LINEAR);
     //    }
 
-    cv::Mat eyeImg = frame.clone();
+    // The corneal reflection is removed in place, the copy reuses the buffer of the previous frame
+    frame.copyTo(eyeImg);
 
     if (imageSize != eyeImg.size())
     {
@@ -941,7 +745,6 @@ void Starburst::run(const cv::Mat &frame, Pupil &pupil)
         this->startPoint.y = eyeImg.size().height / 2;
     }
 
-    int *inliers_index;
     cv::Size ellipse_axis;
 
     // ML: we dont have noise in our video, applying these actually worsens result dramatically
@@ -951,17 +754,27 @@ void Starburst::run(const cv::Mat &frame, Pupil &pupil)
     // corneal reflection
     cv::Point corneal_reflection(0, 0); // coordinates of corneal reflection in tracker coordinate system
     int corneal_reflection_r = 0;       // the radius of corneal reflection
+    int64 tick = profiler.start();
     remove_corneal_reflection(&eyeImg, (int)this->startPoint.x, (int)this->startPoint.y, this->crWindowSize,
                               (int)eyeImg.size().height / corneal_reflection_ratio_to_image_size, corneal_reflection.x, corneal_reflection.y, corneal_reflection_r);
     // std::cout<<"corneal reflection: "<<corneal_reflection.x<<" "<<corneal_reflection.y<<std::endl;
 
+    tick = profiler.lap("cornealReflection", tick);
+
     // starburst pupil contour detection
-    int detection_success = this->ransacEllipse.starburst_pupil_contour_detection((UINT8 *)eyeImg.data, this->startPoint, eyeImg.cols, eyeImg.rows, edge_threshold, rays, min_feature_candidates);
+    this->ransacEllipse.seed = this->ransac_seed;
+    this->ransacEllipse.confidence = this->ransac_confidence;
+    this->ransacEllipse.max_iterations = this->ransac_max_iterations;
+    int detection_success = this->ransacEllipse.starburst_pupil_contour_detection(eyeImg.data, this->startPoint, eyeImg.cols, eyeImg.rows, edge_threshold, rays, min_feature_candidates);
+    tick = profiler.lap("rayCasting", tick);
+    profiler.count("edgePoints", this->ransacEllipse.edge_point.size());
 
     int inliers_num = 0;
     cv::Point pupilPoint(0, 0); // coordinates of pupil in tracker coordinate system
 
-    inliers_index = this->ransacEllipse.pupil_fitting_inliers((UINT8 *)eyeImg.data, eyeImg.size().width, eyeImg.size().height, inliers_num);
+    inliers_num = this->ransacEllipse.pupil_fitting_inliers(eyeImg.size().width, eyeImg.size().height);
+    profiler.lap("ransac", tick);
+    profiler.count("ransacIterations", this->ransacEllipse.ransac_count);
 
     ellipse_axis.width = (int)2 * this->ransacEllipse.pupil_param[0];
     ellipse_axis.height = (int)2 * this->ransacEllipse.pupil_param[1];
@@ -976,8 +789,6 @@ void Starburst::run(const cv::Mat &frame, Pupil &pupil)
     //        this->ransacEllipse.pupil_param[2], this->ransacEllipse.pupil_param[3],
     //        this->ransacEllipse.pupil_param[4], inliers_num);
 
-    free(inliers_index);
-
     if (ellipse_axis.width > 0 && ellipse_axis.height > 0)
     {
         this->startPoint.x = pupilPoint.x;
@@ -20,10 +20,10 @@
 #define PUPILALGOSIMPLE_STARBURST_H
 
 #include "PupilDetectionMethod.h"
+#include <random>
+#include <vector>
 
 #define UINT8 unsigned char
-//svd function
-#define SIGN(u, v)     ( (v)>=0.0 ? fabs(u) : -fabs(u) )
 #ifndef MAX
 #define MAX(x, y)     ( (x) >= (y) ? (x) : (y) )
 #endif
@@ -37,42 +37,44 @@ public:
     RansacEllipse() {
     }
 
-    int starburst_pupil_contour_detection(UINT8* pupil_image, const cv::Point2d &startPoint, int width, int height, int edge_thresh, int N, int minimum_cadidate_features);
-    int* pupil_fitting_inliers(UINT8* pupil_image, int, int, int &return_max_inliers);
+    int starburst_pupil_contour_detection(const UINT8* pupil_image, const cv::Point2d &startPoint, int width, int height, int edge_thresh, int N, int minimum_cadidate_features);
+    // Fits the pupil ellipse to the edge points and returns the number of inliers, their indices are kept in inliers
+    int pupil_fitting_inliers(int width, int height);
 
-    std::vector<cv::Point2d*> edge_point;
+    std::vector<cv::Point2d> edge_point;
+    std::vector<int> inliers; // indices of the edge points supporting the last fit
     double pupil_param[5];
+    int ransac_count = 0; // number of RANSAC samples of the last fit
 
-private:
+    unsigned int seed = 0;     // RANSAC is reseeded with this value for every fit
+    double confidence = 0.99;  // probability of drawing an outlier free sample, determines the number of samples
+    int max_iterations = 1500; // upper bound of RANSAC samples per fit
 
-    static double radius(double u, double v) {
-        double w;
-        u = fabs(u);
-        v = fabs(v);
-
-        if (u > v) {
-            w = v / u;
-            return (u * sqrt(1. + w * w));
-        } else {
-            if (v) {
-                w = u / v;
-                return (v * sqrt(1. + w * w));
-            } else
-                return 0.0;
-        }
-    }
+private:
 
-    void svd(int m, int n, double **a, double **p, double *d, double **q);
-    void destroy_edge_point();
+    void update_ray_table(int N);
+    void cast_rays(const UINT8* image, int width, int height, double cx, double cy, int dis, int edge_thresh);
     void locate_edge_points(const UINT8* image, int width, int height, double cx, double cy, int dis, double angle_step, double angle_normal, double angle_spread, int edge_thresh);
+    void walk_ray(const UINT8* image, int width, int height, double cx, double cy, double dis_cos, double dis_sin, int edge_thresh);
     cv::Point2d get_edge_mean();
-    cv::Point2d* normalize_edge_point(double &dis_scale, cv::Point2d &nor_center, int ep_num);
+    void normalize_edge_point(double &dis_scale, cv::Point2d &nor_center, int ep_num);
     bool solve_ellipse(double* conic_param, double* ellipse_param);
+    static bool solve_conic(double A[5][6], double* conic_param);
     void denormalize_ellipse_param(double* par, double* normailized_par, double dis_scale, cv::Point2d nor_center);
     void get_random_num(int n, int max_num, int* rand_num);
 
     std::vector<int> edge_intensity_diff;
 
+    // Directions of the rays cast around the start point, rebuilt when the number of rays changes
+    int ray_count = 0;
+    std::vector<double> ray_cos;
+    std::vector<double> ray_sin;
+
+    // Normalized edge points and their monomials, kept between frames to avoid reallocations
+    std::vector<double> nor_x, nor_y, nor_xx, nor_xy, nor_yy;
+
+    std::mt19937 rng;
+
 };
 
 
@@ -85,6 +87,9 @@ public:
     int min_feature_candidates = 10;	//minimum number of pupil feature candidates
     int corneal_reflection_ratio_to_image_size = 2; // approx max size of the reflection relative to image height -> height/this
     int crWindowSize = 301;		//corneal reflection search window size
+    unsigned int ransac_seed = 0;	//seed of the RANSAC ellipse fit, the same frame always gives the same pupil
+    double ransac_confidence = 0.99;	//probability of drawing at least one outlier free RANSAC sample
+    int ransac_max_iterations = 1500;	//upper bound of RANSAC samples per frame
 
     //const double beta = 0.2;           //hysteresis factor for noise reduction
 
@@ -120,6 +125,7 @@ public:
 private:
 
     RansacEllipse ransacEllipse;
+    cv::Mat eyeImg; // working copy of the frame, the corneal reflection is removed in place
     cv::Point2d startPoint;
     double *avgIntensityHori;    //horizontal average intensity
     double *intensityFactorHori; //horizontal intensity factor for noise reduction
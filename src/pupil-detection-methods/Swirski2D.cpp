@@ -49,7 +49,7 @@ inline cv::Rect_<T> roiAround(const cv::Point_<T> &centre, T radius)
     return roiAround(centre.x, centre.y, radius);
 }
 
-static std::mt19937 static_gen;
+static thread_local std::mt19937 static_gen;
 
 int random(int min, int max)
 {
@@ -280,136 +280,44 @@ void Swirski2D::run(const cv::Mat &frame, Pupil &pupil)
 
 cv::Rect Swirski2D::findMaxHaarResponse(const cv::Mat &frame)
 {
-
     cv::Mat_<uchar> mEye = frame;
+    haarFeatures.reset(mEye);
+    int haarRadius;
+    return haarPupilRegion(haarFeatures, haarRadius);
+}
+
+cv::Rect Swirski2D::haarPupilRegion(HaarFeatureCache &features, int &haarRadius)
+{
 
     // -----------------------
     // Find best haar response
     // -----------------------
 
-    //             _____________________
-    //            |         Haar kernel |
-    //            |                     |
-    //  __________|______________       |
-    // | Image    |      |       |      |
-    // |    ______|______|___.-r-|--2r--|
-    // |   |      |      |___|___|      |
-    // |   |      |          |   |      |
-    // |   |      |          |   |      |
-    // |   |      |__________|___|______|
-    // |   |    Search       |   |
-    // |   |    region       |   |
-    // |   |                 |   |
-    // |   |_________________|   |
-    // |                         |
-    // |_________________________|
-    //
-
-    cv::Mat_<int32_t> mEyeIntegral;
     int padding = 2 * params.Radius_Max;
 
-    cv::Mat mEyePad;
-    // Need to pad by an additional 1 to get bottom & right edges.
-    cv::copyMakeBorder(mEye, mEyePad, padding, padding, padding, padding, cv::BORDER_REPLICATE);
-    cv::integral(mEyePad, mEyeIntegral);
-
-    cv::Point2f pHaarPupil;
-    int haarRadius = 0;
-
     const int rstep = 2;
     const int ystep = 4;
     const int xstep = 4;
 
-    double minResponse = std::numeric_limits<double>::infinity();
-
+    std::vector<int> radii;
     for (int r = params.Radius_Min; r < params.Radius_Max; r += rstep)
-    {
-        // Get Haar feature
-        int r_inner = r;
-        int r_outer = 3 * r;
-        HaarSurroundFeature f(r_inner, r_outer);
-
-        // Use TBB for rows
-        std::pair<double, cv::Point2f> minRadiusResponse = tbb::parallel_reduce(
-            tbb::blocked_range<int>(0, (mEye.rows - r - r - 1) / ystep + 1,
-                                    ((mEye.rows - r - r - 1) / ystep + 1) / 8),
-            std::make_pair(std::numeric_limits<double>::infinity(), UNKNOWN_POSITION),
-            [&](tbb::blocked_range<int> range,
-                const std::pair<double, cv::Point2f> &minValIn) -> std::pair<double, cv::Point2f>
-            {
-                std::pair<double, cv::Point2f> minValOut = minValIn;
-                for (int i = range.begin(), y = r + range.begin() * ystep; i < range.end(); i++, y += ystep)
-                {
-                    //            �         �
-                    // row1_outer.|         |  p00._____________________.p01
-                    //            |         |     |         Haar kernel |
-                    //            |         |     |                     |
-                    // row1_inner.|         |     |   p00._______.p01   |
-                    //            |-padding-|     |      |       |      |
-                    //            |         |     |      | (x,y) |      |
-                    // row2_inner.|         |     |      |_______|      |
-                    //            |         |     |   p10'       'p11   |
-                    //            |         |     |                     |
-                    // row2_outer.|         |     |_____________________|
-                    //            |         |  p10'                     'p11
-                    //            �         �
-
-                    int *row1_inner = mEyeIntegral[y + padding - r_inner];
-                    int *row2_inner = mEyeIntegral[y + padding + r_inner + 1];
-                    int *row1_outer = mEyeIntegral[y + padding - r_outer];
-                    int *row2_outer = mEyeIntegral[y + padding + r_outer + 1];
-
-                    int *p00_inner = row1_inner + r + padding - r_inner;
-                    int *p01_inner = row1_inner + r + padding + r_inner + 1;
-                    int *p10_inner = row2_inner + r + padding - r_inner;
-                    int *p11_inner = row2_inner + r + padding + r_inner + 1;
-
-                    int *p00_outer = row1_outer + r + padding - r_outer;
-                    int *p01_outer = row1_outer + r + padding + r_outer + 1;
-                    int *p10_outer = row2_outer + r + padding - r_outer;
-                    int *p11_outer = row2_outer + r + padding + r_outer + 1;
-
-                    for (int x = r; x < mEye.cols - r; x += xstep)
-                    {
-                        int sumInner = *p00_inner + *p11_inner - *p01_inner - *p10_inner;
-                        int sumOuter = *p00_outer + *p11_outer - *p01_outer - *p10_outer - sumInner;
-
-                        double response = f.val_inner * sumInner + f.val_outer * sumOuter;
-
-                        if (response < minValOut.first)
-                        {
-                            minValOut.first = response;
-                            minValOut.second = cv::Point(x, y);
-                        }
+        radii.push_back(r);
 
-                        p00_inner += xstep;
-                        p01_inner += xstep;
-                        p10_inner += xstep;
-                        p11_inner += xstep;
+    // The minima of all radii are searched in parallel, ties keep the smaller radius
+    const std::vector<HaarFeatureCache::Response> &responses = features.surroundResponses(padding, radii, xstep, ystep);
 
-                        p00_outer += xstep;
-                        p01_outer += xstep;
-                        p10_outer += xstep;
-                        p11_outer += xstep;
-                    }
-                }
-                return minValOut;
-            },
-            [](const std::pair<double, cv::Point2f> &x,
-               const std::pair<double, cv::Point2f> &y) -> std::pair<double, cv::Point2f>
-            {
-                if (x.first < y.first)
-                    return x;
-                else
-                    return y;
-            });
+    cv::Point2f pHaarPupil = UNKNOWN_POSITION;
+    haarRadius = 0;
+    double minResponse = std::numeric_limits<double>::infinity();
 
-        if (minRadiusResponse.first < minResponse)
+    for (size_t k = 0; k < radii.size(); k++)
+    {
+        if (responses[k].value < minResponse)
         {
-            minResponse = minRadiusResponse.first;
+            minResponse = responses[k].value;
             // Set return values
-            pHaarPupil = minRadiusResponse.second;
-            haarRadius = r;
+            pHaarPupil = responses[k].position;
+            haarRadius = radii[k];
         }
     }
 
@@ -419,170 +327,17 @@ cv::Rect Swirski2D::findMaxHaarResponse(const cv::Mat &frame)
     // ---------------------------
     // Pupil ROI around Haar point
     // ---------------------------
-    cv::Rect roiHaarPupil = roiAround(cv::Point(pHaarPupil.x, pHaarPupil.y), haarRadius);
-    // cv::Mat_<uchar> mHaarPupil;
-    // getROI(mEye, mHaarPupil, roiHaarPupil, cv::BORDER_REPLICATE);
-
-    return roiHaarPupil;
+    return roiAround(cv::Point(pHaarPupil.x, pHaarPupil.y), haarRadius);
 }
 
-void Swirski2D::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f> &inlierPts)
+bool Swirski2D::findPupilRegion(const cv::Mat_<uchar> &mEye, HaarFeatureCache &features, int padding, cv::Rect &roiPupil, cv::RotatedRect &elPupilThresh,
+                                bool &degenerate, cv::Mat_<uchar> &mPupil, cv::Mat_<uchar> &mPupilBlurred, cv::Mat_<float> &mPupilSobelX, cv::Mat_<float> &mPupilSobelY)
 {
-
-    cv::Mat_<uchar> mEye = frame;
-
-    // Pick one channel if necessary, and crop it to get rid of borders
-    //    if (frame.channels() == 1)
-    //    {
-    //        mEye = frame;
-    //    }
-    //    else if (frame.channels() == 3)
-    //    {
-    //        cv::cvtColor(frame, mEye, cv::COLOR_BGR2GRAY);
-    //    }
-    //    else if (frame.channels() == 4)
-    //    {
-    //        cv::cvtColor(frame, mEye, cv::COLOR_BGRA2GRAY);
-    //    }
-    //    else
-    //    {
-    //        throw std::runtime_error("Unsupported number of channels");
-    //    }
-
     // -----------------------
     // Find best haar response
     // -----------------------
-
-    //             _____________________
-    //            |         Haar kernel |
-    //            |                     |
-    //  __________|______________       |
-    // | Image    |      |       |      |
-    // |    ______|______|___.-r-|--2r--|
-    // |   |      |      |___|___|      |
-    // |   |      |          |   |      |
-    // |   |      |          |   |      |
-    // |   |      |__________|___|______|
-    // |   |    Search       |   |
-    // |   |    region       |   |
-    // |   |                 |   |
-    // |   |_________________|   |
-    // |                         |
-    // |_________________________|
-    //
-
-    cv::Mat_<int32_t> mEyeIntegral;
-    int padding = 2 * params.Radius_Max;
-
-    cv::Mat mEyePad;
-    // Need to pad by an additional 1 to get bottom & right edges.
-    cv::copyMakeBorder(mEye, mEyePad, padding, padding, padding, padding, cv::BORDER_REPLICATE);
-    cv::integral(mEyePad, mEyeIntegral);
-
-    cv::Point2f pHaarPupil;
-    int haarRadius = 0;
-
-    const int rstep = 2;
-    const int ystep = 4;
-    const int xstep = 4;
-
-    double minResponse = std::numeric_limits<double>::infinity();
-
-    for (int r = params.Radius_Min; r < params.Radius_Max; r += rstep)
-    {
-        // Get Haar feature
-        int r_inner = r;
-        int r_outer = 3 * r;
-        HaarSurroundFeature f(r_inner, r_outer);
-
-        // Use TBB for rows
-        std::pair<double, cv::Point2f> minRadiusResponse = tbb::parallel_reduce(
-            tbb::blocked_range<int>(0, (mEye.rows - r - r - 1) / ystep + 1, ((mEye.rows - r - r - 1) / ystep + 1) / 8),
-            std::make_pair(std::numeric_limits<double>::infinity(), UNKNOWN_POSITION),
-            [&](tbb::blocked_range<int> range, const std::pair<double, cv::Point2f> &minValIn) -> std::pair<double, cv::Point2f>
-            {
-                std::pair<double, cv::Point2f> minValOut = minValIn;
-                for (int i = range.begin(), y = r + range.begin() * ystep; i < range.end(); i++, y += ystep)
-                {
-                    //            �         �
-                    // row1_outer.|         |  p00._____________________.p01
-                    //            |         |     |         Haar kernel |
-                    //            |         |     |                     |
-                    // row1_inner.|         |     |   p00._______.p01   |
-                    //            |-padding-|     |      |       |      |
-                    //            |         |     |      | (x,y) |      |
-                    // row2_inner.|         |     |      |_______|      |
-                    //            |         |     |   p10'       'p11   |
-                    //            |         |     |                     |
-                    // row2_outer.|         |     |_____________________|
-                    //            |         |  p10'                     'p11
-                    //            �         �
-
-                    int *row1_inner = mEyeIntegral[y + padding - r_inner];
-                    int *row2_inner = mEyeIntegral[y + padding + r_inner + 1];
-                    int *row1_outer = mEyeIntegral[y + padding - r_outer];
-                    int *row2_outer = mEyeIntegral[y + padding + r_outer + 1];
-
-                    int *p00_inner = row1_inner + r + padding - r_inner;
-                    int *p01_inner = row1_inner + r + padding + r_inner + 1;
-                    int *p10_inner = row2_inner + r + padding - r_inner;
-                    int *p11_inner = row2_inner + r + padding + r_inner + 1;
-
-                    int *p00_outer = row1_outer + r + padding - r_outer;
-                    int *p01_outer = row1_outer + r + padding + r_outer + 1;
-                    int *p10_outer = row2_outer + r + padding - r_outer;
-                    int *p11_outer = row2_outer + r + padding + r_outer + 1;
-
-                    for (int x = r; x < mEye.cols - r; x += xstep)
-                    {
-                        int sumInner = *p00_inner + *p11_inner - *p01_inner - *p10_inner;
-                        int sumOuter = *p00_outer + *p11_outer - *p01_outer - *p10_outer - sumInner;
-
-                        double response = f.val_inner * sumInner + f.val_outer * sumOuter;
-
-                        if (response < minValOut.first)
-                        {
-                            minValOut.first = response;
-                            minValOut.second = cv::Point(x, y);
-                        }
-
-                        p00_inner += xstep;
-                        p01_inner += xstep;
-                        p10_inner += xstep;
-                        p11_inner += xstep;
-
-                        p00_outer += xstep;
-                        p01_outer += xstep;
-                        p10_outer += xstep;
-                        p11_outer += xstep;
-                    }
-                }
-                return minValOut;
-            },
-            [](const std::pair<double, cv::Point2f> &x, const std::pair<double, cv::Point2f> &y) -> std::pair<double, cv::Point2f>
-            {
-                if (x.first < y.first)
-                    return x;
-                else
-                    return y;
-            });
-
-        if (minRadiusResponse.first < minResponse)
-        {
-            minResponse = minRadiusResponse.first;
-            // Set return values
-            pHaarPupil = minRadiusResponse.second;
-            haarRadius = r;
-        }
-    }
-
-    // Paradoxically, a good Haar fit won't catch the entire pupil, so expand it a bit
-    haarRadius = (int)(haarRadius * SQRT_2);
-
-    // ---------------------------
-    // Pupil ROI around Haar point
-    // ---------------------------
-    cv::Rect roiHaarPupil = roiAround(cv::Point(pHaarPupil.x, pHaarPupil.y), haarRadius);
+    int haarRadius;
+    cv::Rect roiHaarPupil = haarPupilRegion(features, haarRadius);
     cv::Mat_<uchar> mHaarPupil;
     getROI(mEye, mHaarPupil, roiHaarPupil, cv::BORDER_REPLICATE);
 
@@ -625,19 +380,8 @@ void Swirski2D::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f>
         }
     }
 
-    if (!boost::math::isnormal(bestThreshold))
-    {
-        // If kmeans gives a degenerate solution, exit early
-        cv::RotatedRect ellipse;
-        ellipse.center.x = 0;
-        ellipse.center.y = 0;
-        ellipse.angle = 0.0;
-        ellipse.size.height = 0.0;
-        ellipse.size.width = 0.0;
-
-        pupil = ellipse;
-        // return ellipse;
-    }
+    // If kmeans gives a degenerate solution, the pupil is reset, the detection continues with the NaN threshold
+    degenerate = !boost::math::isnormal(bestThreshold);
 
     threshold = bestThreshold;
 
@@ -652,24 +396,13 @@ void Swirski2D::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f>
     // ---------------------------------------------
 
     cv::Rect bbPupilThresh;
-    cv::RotatedRect elPupilThresh;
 
     cv::Mat_<uchar> mPupilContours = mPupilThresh.clone();
     std::vector<std::vector<cv::Point>> contours;
     cv::findContours(mPupilContours, contours, cv::RETR_EXTERNAL, cv::CHAIN_APPROX_NONE);
 
     if (contours.size() == 0)
-    {
-        cv::RotatedRect ellipse;
-        ellipse.center.x = 0;
-        ellipse.center.y = 0;
-        ellipse.angle = 0.0;
-        ellipse.size.height = 0.0;
-        ellipse.size.width = 0.0;
-
-        pupil = ellipse;
-        return;
-    }
+        return false;
 
     std::vector<cv::Point> &maxContour = contours[0];
     double maxContourArea = cv::contourArea(maxContour);
@@ -701,12 +434,8 @@ void Swirski2D::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f>
     // Find edges in new pupil region
     // ------------------------------
 
-    cv::Mat_<uchar> mPupil, mPupilOpened, mPupilBlurred, mPupilEdges;
-    cv::Mat_<float> mPupilSobelX, mPupilSobelY;
-    cv::Rect bbPupil;
-    cv::Rect roiPupil = roiAround(cv::Point(elPupilThresh.center.x, elPupilThresh.center.y), haarRadius);
-
-    padding = 3;
+    cv::Mat_<uchar> mPupilOpened;
+    roiPupil = roiAround(cv::Point(elPupilThresh.center.x, elPupilThresh.center.y), haarRadius);
 
     cv::Rect roiPadded(roiPupil.x - padding, roiPupil.y - padding, roiPupil.width + 2 * padding, roiPupil.height + 2 * padding);
     // First get an ROI around the approximate pupil location
@@ -726,12 +455,99 @@ void Swirski2D::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f>
 
     cv::Sobel(mPupilBlurred, mPupilSobelX, CV_32F, 1, 0, 3);
     cv::Sobel(mPupilBlurred, mPupilSobelY, CV_32F, 0, 1, 3);
+    return true;
+}
+
+void Swirski2D::run(const cv::Mat &frame, Pupil &pupil, std::vector<cv::Point2f> &inlierPts)
+{
+
+    cv::Mat_<uchar> mEye = frame;
+
+    // Pick one channel if necessary, and crop it to get rid of borders
+    //    if (frame.channels() == 1)
+    //    {
+    //        mEye = frame;
+    //    }
+    //    else if (frame.channels() == 3)
+    //    {
+    //        cv::cvtColor(frame, mEye, cv::COLOR_BGR2GRAY);
+    //    }
+    //    else if (frame.channels() == 4)
+    //    {
+    //        cv::cvtColor(frame, mEye, cv::COLOR_BGRA2GRAY);
+    //    }
+    //    else
+    //    {
+    //        throw std::runtime_error("Unsupported number of channels");
+    //    }
+
+    // ------------------------------------------------------------
+    // Approximate pupil region, independent of the Canny thresholds
+    // ------------------------------------------------------------
+    int padding = 3;
+    cv::Rect roiPupil;
+    cv::RotatedRect elPupilThresh;
+    bool degenerate = false;
+    cv::Mat_<uchar> mPupil, mPupilBlurred, mPupilEdges;
+    cv::Mat_<float> mPupilSobelX, mPupilSobelY;
+    cv::Rect bbPupil;
+
+    // Other instances on the same frame with the same radii and blur store the region in or take it from the shared
+    // stages, which also share the Haar features. The images are only read
+    FrameStages *stages = stagesOf(frame);
+    std::string stageKey = stages ? cv::format("Swirski2D:%d:%d:%a", params.Radius_Min, params.Radius_Max, params.CannyBlur) : std::string();
+    const FrameStages::Stage *shared = stages ? stages->find(stageKey) : nullptr;
+    bool found;
+    if (shared)
+    {
+        found = !shared->values.empty();
+        if (found)
+        {
+            const std::vector<double> &v = shared->values;
+            roiPupil = cv::Rect((int)v[0], (int)v[1], (int)v[2], (int)v[3]);
+            elPupilThresh = cv::RotatedRect(cv::Point2f(v[4], v[5]), cv::Size2f(v[6], v[7]), v[8]);
+            degenerate = v[9] != 0;
+            mPupil = shared->images[0];
+            mPupilBlurred = shared->images[1];
+            mPupilSobelX = shared->images[2];
+            mPupilSobelY = shared->images[3];
+        }
+    }
+    else
+    {
+        if (!stages)
+            haarFeatures.reset(mEye);
+        found = findPupilRegion(mEye, stages ? stages->haarFeatures : haarFeatures, padding, roiPupil, elPupilThresh, degenerate, mPupil, mPupilBlurred, mPupilSobelX, mPupilSobelY);
+        if (stages)
+        {
+            FrameStages::Stage &stage = stages->store(stageKey);
+            if (found)
+            {
+                stage.images = {mPupil, mPupilBlurred, mPupilSobelX, mPupilSobelY};
+                stage.values = {(double)roiPupil.x, (double)roiPupil.y, (double)roiPupil.width, (double)roiPupil.height, elPupilThresh.center.x, elPupilThresh.center.y,
+                                elPupilThresh.size.width, elPupilThresh.size.height, elPupilThresh.angle, degenerate ? 1.0 : 0.0};
+            }
+        }
+    }
+
+    if (degenerate || !found)
+    {
+        cv::RotatedRect ellipse;
+        ellipse.center.x = 0;
+        ellipse.center.y = 0;
+        ellipse.angle = 0.0;
+        ellipse.size.height = 0.0;
+        ellipse.size.width = 0.0;
+
+        pupil = ellipse;
+        if (!found)
+            return;
+    }
 
     cv::Canny(mPupilBlurred, mPupilEdges, params.CannyThreshold1, params.CannyThreshold2);
 
     cv::Rect roiUnpadded(padding, padding, roiPupil.width, roiPupil.height);
     mPupil = cv::Mat(mPupil, roiUnpadded);
-    mPupilOpened = cv::Mat(mPupilOpened, roiUnpadded);
     mPupilBlurred = cv::Mat(mPupilBlurred, roiUnpadded);
     mPupilSobelX = cv::Mat(mPupilSobelX, roiUnpadded);
     mPupilSobelY = cv::Mat(mPupilSobelY, roiUnpadded);
@@ -1161,4 +977,6 @@ void Swirski2D::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, con
     (void)maxPupilDiameterPx;
 
     pupil = run(frame(roi));
+    if (pupil.center.x > 0 && pupil.center.y > 0)
+        pupil.shift(roi.tl());
 }
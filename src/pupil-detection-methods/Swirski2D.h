@@ -27,6 +27,7 @@ Modified by Moritz Lode 2020
 */
 
 #include "PupilDetectionMethod.h"
+#include "HaarFeatureCache.h"
 
 struct TrackerParams
 {
@@ -100,7 +101,19 @@ public:
         return true;
     }
 
+    // Region around the best Haar surround response
     cv::Rect findMaxHaarResponse(const cv::Mat &frame);
+
+private:
+    // Haar features of the last frame if it was not detected with shared FrameStages, the buffers are reused between frames
+    HaarFeatureCache haarFeatures;
+
+    cv::Rect haarPupilRegion(HaarFeatureCache &features, int &haarRadius);
+
+    // Pupil region around the thresholded Haar region and its opened and blurred image and gradients, all padded by
+    // padding pixels. degenerate is set if the histogram segmentation failed. Returns false if no region was found
+    bool findPupilRegion(const cv::Mat_<uchar> &mEye, HaarFeatureCache &features, int padding, cv::Rect &roiPupil, cv::RotatedRect &elPupilThresh,
+                         bool &degenerate, cv::Mat_<uchar> &mPupil, cv::Mat_<uchar> &mPupilBlurred, cv::Mat_<float> &mPupilSobelX, cv::Mat_<float> &mPupilSobelY);
 };
 
 class HaarSurroundFeature
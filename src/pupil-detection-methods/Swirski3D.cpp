@@ -21,6 +21,23 @@ Modified by Moritz Lode 2020
 #include "Swirski3D.h"
 #include "PupilDetectionMethod.h"
 
+#include <chrono>
+#include <stdexcept>
+
+Swirski3D::~Swirski3D()
+{
+    {
+        std::lock_guard<std::mutex> lock(observationMutex);
+        stopWorker = true;
+    }
+    observationAdded.notify_all();
+    if (worker.joinable())
+        worker.join();
+
+    if (ownsDetector)
+        delete pupilDetector;
+}
+
 Pupil Swirski3D::run(const cv::Mat &frame)
 {
 
@@ -40,144 +57,251 @@ Pupil Swirski3D::run(const cv::Mat &frame)
         inlier_pts = std::vector<cv::Point2f>(inlierInt.begin(), inlierInt.end());
     }
 
-    bool pupil_found = rr_pf.valid(-2.0); // -2.0 because we ignore confidence for this check
+    updateModel(frame, rr_pf, inlier_pts);
+
+    return rr_pf;
+}
+
+void Swirski3D::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx, const float &maxPupilDiameterPx)
+{
 
-    std::cout << "Pupil found: " << pupil_found << " " << inlier_pts.size() << std::endl;
+    if (roi.area() < 10)
+    {
+        // Bad ROI: falling back to regular detection
+        PupilDetectionMethod::run(frame, pupil);
+        return;
+    }
 
-    singleeyefitter::Ellipse2D<double> el = singleeyefitter::toEllipse<double>(toImgCoordInv(rr_pf, frame, 1.0));
+    // The eye model lives in full frame coordinates, only the detection is restricted to the ROI
+    pupilDetector->run(frame, roi, pupil, minPupilDiameterPx, maxPupilDiameterPx);
 
-    // found pupil is then feed to model, for generation
+    std::vector<cv::Point> inlierInt = PupilDetectionMethod::ellipse2Points(pupil, 4);
+    std::vector<cv::Point2f> inlier_pts(inlierInt.begin(), inlierInt.end());
 
-    // 3D eye pose estimation
-    bool is_reliable = false;
-    bool is_added = false;
-    const bool force_add = false;
+    updateModel(frame, pupil, inlier_pts);
+}
 
-    const double kReliabilityThreshold = 0.8; // 0.96;
-    double ellipse_reliability = 0.0;         /// Reliability of a detected 2D ellipse based on 3D eye model
+void Swirski3D::updateModel(const cv::Mat &frame, const Pupil &pupil, const std::vector<cv::Point2f> &inlier_pts)
+{
+
+    bool pupil_found = pupil.valid(-2.0); // -2.0 because we ignore confidence for this check
+
+    if (fitFailed.exchange(false))
+    {
+        // The worker dropped its observations, sample new ones from the whole image again
+        spaceBinSearcher.reset_indices();
+        std::lock_guard<std::mutex> lock(observationMutex);
+        sampledCount = observations.size();
+    }
+
+    // Pick up a newly published model, the snapshot is only used by the frame path
+    if (snapshotVersion != modelVersion)
+    {
+        std::lock_guard<std::mutex> lock(modelMutex);
+        modelSnapshot.eye = publishedEye;
+        snapshotVersion = modelVersion;
+    }
+
+    double ellipse_reliability = 0.0; /// Reliability of a detected 2D ellipse based on 3D eye model
 
     if (pupil_found)
     {
-        if (is_model_built())
+        singleeyefitter::Ellipse2D<double> el = singleeyefitter::toEllipse<double>(toImgCoordInv(pupil, frame, 1.0));
+
+        if (modelSnapshot.eye)
         {
-            ellipse_reliability = compute_reliability(frame, el, inlier_pts);
-            is_reliable = (ellipse_reliability > kReliabilityThreshold);
-            std::cout << "Reliability: " << is_reliable << " " << ellipse_reliability << std::endl;
+            ellipse_reliability = compute_reliability(el);
         }
         else
         {
-            std::cout << "Sampling observation for building." << std::endl;
+            const bool force_add = false;
             add_observation(frame, el, inlier_pts, force_add);
         }
     }
 
-    return rr_pf;
+    lastReliability = ellipse_reliability;
+    lastReliable = ellipse_reliability > reliability_threshold;
 }
 
-void Swirski3D::run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx, const float &maxPupilDiameterPx)
+bool Swirski3D::add_observation(const cv::Mat &image, sef::Ellipse2D<double> &pupil, const std::vector<cv::Point2f> &pupil_inliers, bool force)
 {
 
-    // TODO we could use minPupilDiameterPx for setting minRadius etc., but how reset?
+    if (!spaceBinSearcher.is_initialized())
+    {
+        spaceBinSearcher.initialize(image.cols, image.rows);
+    }
 
-    if (roi.area() < 10)
     {
-        std::cout << "Bad ROI: falling back to regular detection.";
-        PupilDetectionMethod::run(frame, pupil);
-        return;
+        std::lock_guard<std::mutex> lock(observationMutex);
+        if (!force && sampledCount >= fitter_max_count)
+            return false;
+    }
+
+    cv::Vec2i pt;
+    float dist;
+
+    if (force || spaceBinSearcher.search(
+                     (int)(pupil.centre.x() + image.cols / 2),
+                     (int)(pupil.centre.y() + image.rows / 2), pt, dist))
+    {
+        // The frame buffer is owned by the caller and may be reused, the observation keeps a copy
+        {
+            std::lock_guard<std::mutex> lock(observationMutex);
+            observations.emplace_back(image.clone(), pupil, pupil_inliers);
+            sampledCount++;
+        }
+        observationAdded.notify_one();
+        return true;
     }
 
-    (void)minPupilDiameterPx;
-    (void)maxPupilDiameterPx;
+    return false;
+}
 
-    pupil = run(frame(roi));
+void Swirski3D::startWorker()
+{
+    worker = std::thread(&Swirski3D::fitModel, this);
 }
 
-bool Swirski3D::add_observation(const cv::Mat &image, sef::Ellipse2D<double> &pupil, std::vector<cv::Point2f> &pupil_inliers, bool force)
+void Swirski3D::fitModel()
 {
+    size_t workerGeneration = generation;
 
-    if (!spaceBinSearcher.is_initialized())
+    while (true)
     {
-        spaceBinSearcher.initialize(image.cols, image.rows);
-    }
+        sef::EyeModelFitter::Observation observation;
+        {
+            std::unique_lock<std::mutex> lock(observationMutex);
+            observationAdded.wait(lock, [this, workerGeneration]
+                                  { return stopWorker || !observations.empty() || generation != workerGeneration; });
 
-    bool is_added = false;
+            if (stopWorker)
+                return;
 
-    if (force || (!is_model_built_ && fitter_count < fitter_max_count))
-    {
-        cv::Vec2i pt;
-        float dist;
+            if (generation != workerGeneration)
+            {
+                // reset_model() was called, drop everything gathered for the previous model
+                workerGeneration = generation;
+                modelFitter.reset();
+                fitterCount = 0;
+                if (observations.empty())
+                    continue;
+            }
 
-        // Check if we already added a 2D ellipse close to the current 2D ellipse given
-        if (force || spaceBinSearcher.search(
-                         (int)(pupil.centre.x() + image.cols / 2),
-                         (int)(pupil.centre.y() + image.rows / 2), pt, dist))
-        {
+            observation = std::move(observations.front());
+            observations.pop_front();
+        }
 
-            modelFitter.add_observation(image, pupil, pupil_inliers);
-            fitter_count++;
+        modelFitter.add_observation(std::move(observation.image), std::move(observation.ellipse), std::move(observation.inliers));
+        fitterCount++;
 
-            std::cout << "Observation added to model." << std::endl;
+        if (fitterCount < fitter_max_count)
+            continue;
 
-            if (fitter_count == fitter_max_count)
-            {
-                modelFitter.unproject_observations();
-                modelFitter.initialise_model();
-                is_model_built_ = true;
-                std::cout << "Model finished building." << std::endl;
-            }
-            is_added = true;
+        // Building the model is the expensive part, it runs without holding any lock the frame path takes
+        try
+        {
+            modelFitter.unproject_observations();
+            modelFitter.initialise_model();
+        }
+        catch (const std::exception &)
+        {
+            modelFitter.reset();
+            fitterCount = 0;
+            failedFits++;
+            fitFailed = true;
+            continue;
         }
+
+        {
+            std::lock_guard<std::mutex> lock(modelMutex);
+            // A model built from observations of before the last reset_model() is outdated
+            if (generation != workerGeneration)
+                continue;
+            publishedEye = modelFitter.eye;
+            modelVersion = ++publishCount;
+        }
+        modelPublished.notify_all();
     }
+}
 
-    return is_added;
+size_t Swirski3D::pending_observations()
+{
+    std::lock_guard<std::mutex> lock(observationMutex);
+    return observations.size();
 }
 
-double Swirski3D::compute_reliability(const cv::Mat &img, sef::Ellipse2D<double> &el, std::vector<cv::Point2f> &inlier_pts)
+sef::EyeModelFitter::Sphere Swirski3D::eye_model()
 {
-    double realiabiliy = 0.0;
+    std::lock_guard<std::mutex> lock(modelMutex);
+    return publishedEye;
+}
 
-    if (modelFitter.eye)
+bool Swirski3D::wait_for_model(int timeoutMs)
+{
+    std::unique_lock<std::mutex> lock(modelMutex);
+    if (timeoutMs < 0)
     {
+        modelPublished.wait(lock, [this]
+                            { return modelVersion > 0; });
+        return true;
+    }
+    return modelPublished.wait_for(lock, std::chrono::milliseconds(timeoutMs), [this]
+                                   { return modelVersion > 0; });
+}
 
-        // Unproject the current 2D ellipse observation to a 3D disk
-        sef::EyeModelFitter::Circle curr_circle = unproject(img, el, inlier_pts);
+void Swirski3D::reset_model()
+{
+    {
+        std::lock_guard<std::mutex> lock(observationMutex);
+        observations.clear();
+        sampledCount = 0;
+        generation++;
+    }
+    observationAdded.notify_one();
 
-        if (curr_circle && !isnan(curr_circle.normal(0, 0)))
-        {
-            const double displayscale = 1.0;
+    {
+        std::lock_guard<std::mutex> lock(modelMutex);
+        publishedEye = sef::EyeModelFitter::Sphere::Null;
+        modelVersion = 0;
+    }
 
-            sef::Ellipse2D<double> pupil_el(sef::project(curr_circle, focal_length));
-            realiabiliy = el.similarity(pupil_el);
+    spaceBinSearcher.reset_indices();
+    fitterCount = 0;
+    fitFailed = false;
+    lastReliability = 0.0;
+    lastReliable = false;
+}
+
+double Swirski3D::compute_reliability(sef::Ellipse2D<double> &el)
+{
+    double realiabiliy = 0.0;
 
-            //// 3D eyeball
-            // cv::RotatedRect rr_eye = eye_tracker::toImgCoord(sef::toRotatedRect(sef::project(simple_fitter_.eye, focal_length_)), img, displayscale);
+    if (modelSnapshot.eye)
+    {
 
-            //// 3D pupil
-            // singleeyefitter::Ellipse2D<double> pupil_el(sef::project(curr_circle, focal_length_));
-            // cv::RotatedRect rr_pupil = eye_tracker::toImgCoord(singleeyefitter::toRotatedRect(pupil_el), img, displayscale);
+        sef::EyeModelFitter::Circle curr_circle = unproject(el);
 
-            //// 3D gaze vector
-            // singleeyefitter::EyeModelFitter::Circle c_end = curr_circle;
-            // c_end.centre = curr_circle.centre + (10.0)*curr_circle.normal; // Unit: mm
-            // singleeyefitter::Ellipse2D<double> e_end(sef::project(c_end, focal_length_));
-            // cv::RotatedRect rr_end = eye_tracker::toImgCoord(singleeyefitter::toRotatedRect(e_end), img, displayscale);
+        if (curr_circle && !std::isnan(curr_circle.normal(0, 0)))
+        {
+            sef::Ellipse2D<double> pupil_el(sef::project(curr_circle, focal_length));
+            realiabiliy = el.similarity(pupil_el);
         }
     }
 
     return realiabiliy;
 }
 
-sef::EyeModelFitter::Circle Swirski3D::unproject(const cv::Mat &img, sef::Ellipse2D<double> &el, std::vector<cv::Point2f> &inlier_pts)
+sef::EyeModelFitter::Circle Swirski3D::unproject(sef::Ellipse2D<double> &el)
 {
 
-    if (modelFitter.eye)
+    if (modelSnapshot.eye)
     {
-        // Unproject the current 2D ellipse observations
-        sef::EyeModelFitter::Observation curr_obs(img, el, inlier_pts);
+        // Only the ellipse is needed to place the pupil on the eye model
+        sef::EyeModelFitter::Observation curr_obs(cv::Mat(), el, std::vector<cv::Point2f>());
         sef::EyeModelFitter::Pupil curr_pupil(curr_obs);
 
-        modelFitter.unproject_single_observation(curr_pupil, modelFitter.eye.radius);
-        singleeyefitter::EyeModelFitter::Circle curr_circle = modelFitter.initialise_single_observation(curr_pupil);
+        modelSnapshot.unproject_single_observation(curr_pupil, modelSnapshot.eye.radius);
+        singleeyefitter::EyeModelFitter::Circle curr_circle = modelSnapshot.initialise_single_observation(curr_pupil);
 
         return curr_circle;
     }
@@ -240,14 +364,12 @@ void SpaceBinSearcher::initialize(int w, int h)
 
     if (is_initialized_ == true)
     {
-        std::cout << "SpaceBinSearcher::initialize: search tree is already initialized" << std::endl;
         return;
     }
 
     if (w < 0 || h < 0)
     {
-        std::cout << "SpaceBinSearcher: Map size must be positive" << std::endl;
-        throw;
+        throw std::invalid_argument("SpaceBinSearcher: Map size must be positive");
     }
     const int w_num = w / kSearchGridSize_;
     const int h_num = h / kSearchGridSize_;
@@ -323,8 +445,7 @@ bool SpaceBinSearcher::search(int x, int y, cv::Vec2i &pt, float &dist)
 {
     if (!is_initialized_)
     {
-        std::cout << "SpaceBinSearcher::search: search tree is not initialized" << std::endl;
-        throw;
+        throw std::runtime_error("SpaceBinSearcher::search: search tree is not initialized");
     }
 
     ClusterMembers_.at<int>(0, 0) = x;
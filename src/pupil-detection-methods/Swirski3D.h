@@ -28,13 +28,18 @@ Modified by Moritz Lode 2020
 
 #include "PupilDetectionMethod.h"
 #include "Swirski2D.h"
-#include "../../singleeyefitter/singleeyefitter/singleeyefitter.h"
-#include "../../singleeyefitter/singleeyefitter/projection.h"
+#include <singleeyefitter/singleeyefitter.h>
+#include <singleeyefitter/projection.h>
 #include <opencv2/opencv.hpp>
+#include <atomic>
+#include <condition_variable>
+#include <deque>
+#include <mutex>
+#include <thread>
 
-// needs first training
-// take first N frames for training then classify
-// take N, then classify all again? -> open video again or save frames?
+// The eye model is built from the first fitter_max_count pupils that are spread over the image (see SpaceBinSearcher).
+// Observations are handed to a worker thread which owns the model fitter, the frame path only samples observations
+// and reads the latest published model to compute the reliability of a pupil.
 
 namespace sef = singleeyefitter;
 
@@ -73,35 +78,40 @@ class Swirski3D : public PupilDetectionMethod
 
 public:
     PupilDetectionMethod *pupilDetector;
+    // Owned by the worker thread, observations reach it through the observation queue only
     sef::EyeModelFitter modelFitter;
     SpaceBinSearcher spaceBinSearcher;
 
     static const size_t kFitterMaxCountDefault = 30; // 100;
-    size_t fitter_count = 0;
+    // Observations used to build the eye model, changes take effect after reset_model()
     size_t fitter_max_count = kFitterMaxCountDefault; // 100;
+    // Pupils with a reliability above this threshold are consistent with the eye model
+    double reliability_threshold = 0.8; // 0.96;
 
     Swirski3D(double focal_length, double region_band_width, double region_step_epsilon)
-        : focal_length(focal_length), modelFitter(focal_length, region_band_width, region_step_epsilon), fitter_max_count(kFitterMaxCountDefault)
+        : pupilDetector(new Swirski2D()), modelFitter(focal_length, region_band_width, region_step_epsilon), ownsDetector(true), focal_length(focal_length),
+          modelSnapshot(focal_length, region_band_width, region_step_epsilon)
     {
 
         mDesc = "Swirski3D (Swirski et al.)";
         mTitle = "Swirski3D";
 
-        pupilDetector = new Swirski2D();
+        startWorker();
     }
 
+    // The detector is not owned and must outlive the Swirski3D instance
     Swirski3D(PupilDetectionMethod *pupilMethod, double focal_length, double region_band_width, double region_step_epsilon)
-        : pupilDetector(pupilMethod), focal_length(focal_length), modelFitter(focal_length, region_band_width, region_step_epsilon), fitter_max_count(kFitterMaxCountDefault)
+        : pupilDetector(pupilMethod), modelFitter(focal_length, region_band_width, region_step_epsilon), ownsDetector(false), focal_length(focal_length),
+          modelSnapshot(focal_length, region_band_width, region_step_epsilon)
     {
 
         mDesc = "Swirski3D (Swirski et al.)";
         mTitle = "Swirski3D";
+
+        startWorker();
     }
 
-    ~Swirski3D() override
-    {
-        delete pupilDetector;
-    };
+    ~Swirski3D() override;
 
     Pupil run(const cv::Mat &frame) override;
     void run(const cv::Mat &frame, const cv::Rect &roi, Pupil &pupil, const float &minPupilDiameterPx, const float &maxPupilDiameterPx) override;
@@ -121,20 +131,91 @@ public:
         return false;
     }
 
-    bool is_model_built()
+    bool is_model_built() const
+    {
+        return modelVersion > 0;
+    }
+
+    // Observations handed to the model fitter so far
+    size_t observation_count() const
+    {
+        return fitterCount;
+    }
+
+    // Observations waiting in the queue of the worker thread
+    size_t pending_observations();
+
+    // Incremented whenever a new eye model is published, 0 while no model is built
+    int model_version() const
     {
-        return is_model_built_;
+        return modelVersion;
     }
 
+    // Reliability of the last pupil with respect to the eye model, 0 while no model is built
+    double last_reliability() const
+    {
+        return lastReliability;
+    }
+
+    bool is_last_reliable() const
+    {
+        return lastReliable;
+    }
+
+    // Eye model fits that failed, the model is then built again from new observations
+    size_t failed_fits() const
+    {
+        return failedFits;
+    }
+
+    // Copy of the published eye model, Sphere::Null while no model is built
+    sef::EyeModelFitter::Sphere eye_model();
+
+    // Blocks until the eye model is built, returns false if the timeout (in ms, negative waits forever) expires first
+    bool wait_for_model(int timeoutMs = -1);
+
+    // Drops the eye model and all observations, the model is built again from the following frames
+    void reset_model();
+
 private:
+    bool ownsDetector;
     double focal_length;
-    bool is_model_built_ = false;
 
-    double compute_reliability(const cv::Mat &img, sef::Ellipse2D<double> &el, std::vector<cv::Point2f> &inlier_pts);
+    // Frame path: the published model is copied into the snapshot whenever its version changes
+    sef::EyeModelFitter modelSnapshot;
+    int snapshotVersion = 0;
+    std::atomic<double> lastReliability{0.0};
+    std::atomic<bool> lastReliable{false};
+
+    // Shared between the frame path and the worker thread
+    std::mutex observationMutex;
+    std::condition_variable observationAdded;
+    std::deque<sef::EyeModelFitter::Observation> observations;
+    bool stopWorker = false;
+    size_t sampledCount = 0;
+
+    std::mutex modelMutex;
+    std::condition_variable modelPublished;
+    sef::EyeModelFitter::Sphere publishedEye = sef::EyeModelFitter::Sphere::Null;
+    std::atomic<int> modelVersion{0};
+    int publishCount = 0;
+    std::atomic<size_t> generation{0};
+    std::atomic<size_t> failedFits{0};
+    std::atomic<bool> fitFailed{false};
+    std::atomic<size_t> fitterCount{0};
+
+    std::thread worker;
+
+    void startWorker();
+    void fitModel();
+
+    void updateModel(const cv::Mat &frame, const Pupil &pupil, const std::vector<cv::Point2f> &inlier_pts);
+
+    double compute_reliability(sef::Ellipse2D<double> &el);
 
-    sef::EyeModelFitter::Circle unproject(const cv::Mat &img, sef::Ellipse2D<double> &el, std::vector<cv::Point2f> &inlier_pts);
+    sef::EyeModelFitter::Circle unproject(sef::Ellipse2D<double> &el);
 
-    bool add_observation(const cv::Mat &image, sef::Ellipse2D<double> &pupil, std::vector<cv::Point2f> &pupil_inliers, bool force);
+    bool add_observation(const cv::Mat &image, sef::Ellipse2D<double> &pupil, const std::vector<cv::Point2f> &pupil_inliers, bool force);
 
     cv::RotatedRect toImgCoordInv(const cv::RotatedRect &rect, const cv::Mat &m, float scale = 1);
 
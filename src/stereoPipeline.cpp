@@ -0,0 +1,64 @@
+#include "stereoPipeline.h"
+
+#include <opencv2/calib3d.hpp>
+#include <tbb/parallel_invoke.h>
+#include <cmath>
+#include <stdexcept>
+
+StereoPupilPipeline::StereoPupilPipeline(PupilDetectionMethod *detector, PupilDetectionMethod *detectorSecondary,
+                                         const cv::Mat &cameraMatrix, const cv::Mat &distCoeffs, const cv::Mat &rectificationTransform, const cv::Mat &projectionMatrix,
+                                         const cv::Mat &cameraMatrixSecondary, const cv::Mat &distCoeffsSecondary, const cv::Mat &rectificationTransformSecondary, const cv::Mat &projectionMatrixSecondary)
+    : detector(detector), detectorSecondary(detectorSecondary),
+      cameraMatrix(cameraMatrix.clone()), distCoeffs(distCoeffs.clone()), rectificationTransform(rectificationTransform.clone()), projectionMatrix(projectionMatrix.clone()),
+      cameraMatrixSecondary(cameraMatrixSecondary.clone()), distCoeffsSecondary(distCoeffsSecondary.clone()), rectificationTransformSecondary(rectificationTransformSecondary.clone()), projectionMatrixSecondary(projectionMatrixSecondary.clone()) {
+
+    if (detector == nullptr || detectorSecondary == nullptr)
+        throw std::invalid_argument("StereoPupilPipeline requires two detectors.");
+    // Detectors are not thread-safe and both cameras are detected concurrently
+    if (detector == detectorSecondary)
+        throw std::invalid_argument("The main and secondary camera need separate detector instances.");
+}
+
+double StereoPupilPipeline::run(const cv::Mat &frame, const cv::Mat &frameSecondary, Pupil &pupil, Pupil &pupilSecondary) {
+
+    tbb::parallel_invoke(
+        [&] { detector->runWithConfidence(frame, pupil); },
+        [&] { detectorSecondary->runWithConfidence(frameSecondary, pupilSecondary); });
+
+    double diameter = triangulate(pupil, pupilSecondary);
+    pupil.physicalDiameter = (float) diameter;
+    pupilSecondary.physicalDiameter = (float) diameter;
+    return diameter;
+}
+
+double StereoPupilPipeline::triangulate(const Pupil &pupil, const Pupil &pupilSecondary) const {
+
+    if (!pupil.valid(-2) || !pupilSecondary.valid(-2))
+        return -1.0;
+
+    // Corners of the bounding boxes at angle 360, topLeft and topRight if the major axis of the main pupil is
+    // horizontal, else topLeft and bottomLeft
+    cv::Point2f corners[4], cornersSecondary[4];
+    cv::RotatedRect(pupil.center, pupil.size, 360).points(corners);
+    cv::RotatedRect(pupilSecondary.center, pupilSecondary.size, 360).points(cornersSecondary);
+    int secondPoint = pupil.width() > pupil.height() ? 2 : 0;
+
+    std::vector<cv::Point2f> points = {corners[1], corners[secondPoint]};
+    std::vector<cv::Point2f> pointsSecondary = {cornersSecondary[1], cornersSecondary[secondPoint]};
+
+    std::vector<cv::Point2f> undistPoints, undistPointsSecondary;
+    cv::undistortPoints(points, undistPoints, cameraMatrix, distCoeffs, rectificationTransform, projectionMatrix);
+    cv::undistortPoints(pointsSecondary, undistPointsSecondary, cameraMatrixSecondary, distCoeffsSecondary, rectificationTransformSecondary, projectionMatrixSecondary);
+
+    cv::Mat homogenPoints;
+    cv::triangulatePoints(projectionMatrix, projectionMatrixSecondary, undistPoints, undistPointsSecondary, homogenPoints);
+
+    cv::Point3f worldPoints[2];
+    for (int i = 0; i < 2; i++) {
+        float scale = homogenPoints.at<float>(3, i) != 0 ? homogenPoints.at<float>(3, i) : 1.0f;
+        worldPoints[i] = cv::Point3f(homogenPoints.at<float>(0, i) / scale, homogenPoints.at<float>(1, i) / scale, homogenPoints.at<float>(2, i) / scale);
+    }
+
+    cv::Point3f delta = worldPoints[0] - worldPoints[1];
+    return std::sqrt((double) delta.x * delta.x + (double) delta.y * delta.y + (double) delta.z * delta.z);
+}
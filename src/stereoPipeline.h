@@ -0,0 +1,32 @@
+#ifndef PUPILALGOSIMPLE_STEREOPIPELINE_H
+#define PUPILALGOSIMPLE_STEREOPIPELINE_H
+
+#include "pupil-detection-methods/PupilDetectionMethod.h"
+#include <opencv2/core/mat.hpp>
+
+// Pupil detection on the frames of a stereo camera pair with triangulation of the physical pupil diameter.
+// Both frames are detected concurrently with one detector per camera, the pupils are then undistorted,
+// rectified and triangulated with the matrices of the stereo calibration. The detectors are not owned.
+class StereoPupilPipeline {
+
+public:
+    StereoPupilPipeline(PupilDetectionMethod *detector, PupilDetectionMethod *detectorSecondary,
+                        const cv::Mat &cameraMatrix, const cv::Mat &distCoeffs, const cv::Mat &rectificationTransform, const cv::Mat &projectionMatrix,
+                        const cv::Mat &cameraMatrixSecondary, const cv::Mat &distCoeffsSecondary, const cv::Mat &rectificationTransformSecondary, const cv::Mat &projectionMatrixSecondary);
+
+    // Detects the pupils with outline confidence and returns the physical pupil diameter in mm, which is also
+    // set as physicalDiameter of both pupils. Returns -1 if one of the pupils is invalid.
+    double run(const cv::Mat &frame, const cv::Mat &frameSecondary, Pupil &pupil, Pupil &pupilSecondary);
+
+    // Physical pupil diameter in mm of a pupil pair, computed like StereoCalibration.triangulatePupilSize
+    double triangulate(const Pupil &pupil, const Pupil &pupilSecondary) const;
+
+private:
+    PupilDetectionMethod *detector;
+    PupilDetectionMethod *detectorSecondary;
+
+    cv::Mat cameraMatrix, distCoeffs, rectificationTransform, projectionMatrix;
+    cv::Mat cameraMatrixSecondary, distCoeffsSecondary, rectificationTransformSecondary, projectionMatrixSecondary;
+};
+
+#endif //PUPILALGOSIMPLE_STEREOPIPELINE_H
@@ -4,6 +4,8 @@
 
 #include "type_converter.h"
 
+#include <atomic>
+
 #define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
 #include <numpy/ndarrayobject.h>
 
@@ -165,7 +167,24 @@ public:
 
 NumpyAllocator g_numpyAllocator;
 
+static std::atomic<bool> g_allowCopy(true);
+
+void NDArrayConverter::setAllowCopy(bool allowCopy)
+{
+    g_allowCopy = allowCopy;
+}
+
+bool NDArrayConverter::allowCopy()
+{
+    return g_allowCopy;
+}
+
 bool NDArrayConverter::toMat(PyObject *o, Mat &m)
+{
+    return toMat(o, m, g_allowCopy);
+}
+
+bool NDArrayConverter::toMat(PyObject *o, Mat &m, bool allowCopy)
 {
     bool allowND = true;
     if(!o || o == Py_None)
@@ -275,6 +294,11 @@ bool NDArrayConverter::toMat(PyObject *o, Mat &m)
     if( ismultichannel && _strides[1] != (npy_intp)elemsize*_sizes[2] )
         needcopy = true;
 
+    // Strided 2-D views (i.e. frame[y0:y1, x0:x1]) are referenced as they are, only views with a pixel
+    // stride (i.e. a single channel frame[:, :, 1]), flipped or transposed arrays and casts need a copy
+    if (needcopy && !allowCopy)
+        throw pybind11::type_error("array cannot be used without a copy: its pixels are not contiguous within a row or its type needs a cast");
+
     if (needcopy)
     {
         //if (info.outputarg)
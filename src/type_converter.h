@@ -11,6 +11,12 @@ public:
     static bool init_numpy();
 
     static bool toMat(PyObject* o, cv::Mat &m);
+    // With allowCopy false, arrays whose layout cannot be referenced by a cv::Mat raise a TypeError instead of being copied
+    static bool toMat(PyObject* o, cv::Mat &m, bool allowCopy);
+
+    // Default used by the cv::Mat type caster
+    static void setAllowCopy(bool allowCopy);
+    static bool allowCopy();
     static PyObject* toNDArray(const cv::Mat& mat);
 };
 
@@ -0,0 +1,120 @@
+#include "videoPipeline.h"
+#include "dataWriter.h"
+#include "binaryDataWriter.h"
+#include "borrowedResource.h"
+
+#include <opencv2/imgproc.hpp>
+#include <opencv2/videoio.hpp>
+#include <tbb/tbb.h>
+#include <limits>
+#include <memory>
+#include <stdexcept>
+
+namespace {
+
+struct VideoFrame {
+    size_t index;
+    uint64 timestamp;
+    cv::Mat image;
+    Pupil pupil;
+};
+
+}
+
+size_t processVideo(const std::string &videoPath, const std::string &outPath, const std::vector<PupilDetectionMethod *> &detectors, size_t queueSize,
+                    size_t firstFrame, size_t frameCount, size_t warmup) {
+
+    if (detectors.empty())
+        throw std::invalid_argument("At least one detector is required.");
+
+    cv::VideoCapture capture(videoPath);
+    if (!capture.isOpened())
+        throw std::runtime_error("Could not open video: " + videoPath);
+
+    // The backend seeks to the preceding keyframe and decodes up to the requested frame
+    size_t nextFrame = firstFrame > warmup ? firstFrame - warmup : 0;
+    if (nextFrame > 0) {
+        if (!capture.set(cv::CAP_PROP_POS_FRAMES, (double) nextFrame) || (size_t) capture.get(cv::CAP_PROP_POS_FRAMES) != nextFrame)
+            throw std::runtime_error("Could not seek to frame " + std::to_string(nextFrame) + " of video: " + videoPath);
+    }
+    size_t endFrame = frameCount > std::numeric_limits<size_t>::max() - firstFrame ? std::numeric_limits<size_t>::max() : firstFrame + frameCount;
+
+    // Results are written to a binary .npy file or to a csv file, depending on the file extension
+    std::unique_ptr<DataWriter> csvWriter;
+    std::unique_ptr<BinaryDataWriter> binaryWriter;
+    if (outPath.size() >= 4 && outPath.compare(outPath.size() - 4, 4, ".npy") == 0)
+        binaryWriter.reset(new BinaryDataWriter(outPath));
+    else
+        csvWriter.reset(new DataWriter(outPath));
+
+    // Detectors are not thread-safe, each frame borrows an idle one for the duration of its detection
+    tbb::concurrent_bounded_queue<PupilDetectionMethod *> idleDetectors;
+    for (PupilDetectionMethod *detector : detectors)
+        idleDetectors.push(detector);
+
+    if (queueSize == 0)
+        queueSize = 2 * detectors.size();
+
+    // The frames in flight are owned by a pool of queueSize frames, the pipeline passes them on as raw pointers.
+    // A cancelled pipeline drops its frames between the filters, the pool still releases them.
+    std::vector<std::unique_ptr<VideoFrame>> framePool;
+    tbb::concurrent_bounded_queue<VideoFrame *> idleFrames;
+    for (size_t i = 0; i < queueSize; i++) {
+        framePool.emplace_back(new VideoFrame());
+        idleFrames.push(framePool.back().get());
+    }
+
+    size_t written = 0;
+
+    tbb::task_arena arena((int) detectors.size());
+    arena.execute([&] {
+        tbb::parallel_pipeline(queueSize,
+            tbb::make_filter<void, VideoFrame *>(tbb::filter_mode::serial_in_order, [&](tbb::flow_control &fc) -> VideoFrame * {
+                cv::Mat image;
+                if (nextFrame >= endFrame || !capture.read(image)) {
+                    fc.stop();
+                    return nullptr;
+                }
+
+                // The pipeline keeps at most queueSize frames in flight, one of them has already been returned
+                VideoFrame *frame;
+                if (!idleFrames.try_pop(frame))
+                    throw std::logic_error("No idle frame in the video pipeline.");
+                *frame = VideoFrame();
+                frame->index = nextFrame++;
+                frame->timestamp = (uint64) capture.get(cv::CAP_PROP_POS_MSEC);
+                if (image.channels() > 1)
+                    cv::cvtColor(image, frame->image, cv::COLOR_BGR2GRAY);
+                else
+                    frame->image = image;
+                return frame;
+            }) &
+            tbb::make_filter<VideoFrame *, VideoFrame *>(tbb::filter_mode::parallel, [&](VideoFrame *frame) -> VideoFrame * {
+                BorrowedResource<PupilDetectionMethod> detector(idleDetectors);
+                detector.isolate([&] {
+                    detector->runWithConfidence(frame->image, frame->pupil);
+                });
+
+                frame->image.release();
+                return frame;
+            }) &
+            tbb::make_filter<VideoFrame *, void>(tbb::filter_mode::serial_in_order, [&](VideoFrame *frame) {
+                // Warm-up frames are not written
+                if (frame->index >= firstFrame) {
+                    if (binaryWriter)
+                        binaryWriter->appendPupilData(frame->timestamp, frame->pupil);
+                    else
+                        csvWriter->appendPupilData(frame->timestamp, frame->pupil, std::to_string(frame->index));
+                    written++;
+                }
+                idleFrames.push(frame);
+            }));
+    });
+
+    if (binaryWriter)
+        binaryWriter->close();
+    else
+        csvWriter->close();
+
+    return written;
+}
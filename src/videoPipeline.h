@@ -0,0 +1,20 @@
+#ifndef PUPILALGOSIMPLE_VIDEOPIPELINE_H
+#define PUPILALGOSIMPLE_VIDEOPIPELINE_H
+
+#include "pupil-detection-methods/PupilDetectionMethod.h"
+#include <limits>
+#include <string>
+#include <vector>
+
+// Offline pupil detection on a video file. Frames are decoded in order, detected in parallel with one
+// detector instance per thread and written in frame order using the BinaryDataWriter if outPath ends with .npy
+// and to a csv file using the DataWriter otherwise.
+// At most queueSize frames are in flight at a time, 0 selects twice the number of detectors.
+// Only the frameCount frames from firstFrame on are written, so that chunks of a video can be processed
+// independently. The warmup frames before firstFrame are detected without being written, which lets the state of
+// tracking detectors like PuReST converge before the chunk starts.
+// Returns the number of written frames.
+size_t processVideo(const std::string &videoPath, const std::string &outPath, const std::vector<PupilDetectionMethod *> &detectors, size_t queueSize = 0,
+                    size_t firstFrame = 0, size_t frameCount = std::numeric_limits<size_t>::max(), size_t warmup = 0);
+
+#endif //PUPILALGOSIMPLE_VIDEOPIPELINE_H
@@ -1,7 +1,23 @@
-import cmake_example as m
+import os
+
+import cv2
+
+import pypupilext as pp
+
+IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '1.bmp')
 
 
 def test_main():
-    assert m.__version__ == "0.0.1"
-    assert m.add(1, 2) == 3
-    assert m.subtract(1, 2) == -1
+    assert pp._pypupil.__version__
+    pupil = pp.Pupil()
+    assert pupil.confidence == -1
+    assert not pupil.valid(-2)
+
+
+def test_pure():
+    image = cv2.imread(IMAGE, cv2.IMREAD_GRAYSCALE)
+    pure = pp.PuRe()
+    pure.maxPupilDiameterMM = 7
+    pupil = pure.runWithConfidence(image)
+    assert pupil.valid(-2)
+    assert pupil.outline_confidence > 0.5
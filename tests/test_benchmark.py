@@ -0,0 +1,24 @@
+import json
+import os
+import sys
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks')
+sys.path.insert(0, BENCHMARKS)
+
+import benchmark  # noqa: E402
+
+
+def test_no_accuracy_regressions():
+    # reduced run of the suite against the stored baseline. performance depends on the machine, only the accuracy
+    # metrics are compared, which are reproducible for the frames and seed of the baseline
+    with open(os.path.join(BENCHMARKS, 'baseline.json')) as f:
+        baseline = json.load(f)
+    resolutions = sorted({tuple(int(v) for v in key.split('@')[1].split('x')) for key in baseline['results']})
+    assert resolutions == [(320, 240)]
+
+    results = benchmark.runSuite(benchmark.CASES, resolutions, baseline['meta']['frames'], baseline['meta']['seed'], log=None)
+    assert set(results['results']) == set(baseline['results'])
+
+    regressions = [regression for regression in benchmark.compare(results, baseline)
+                   if benchmark.METRICS[regression[1]][1] == 'accuracy']
+    assert regressions == []
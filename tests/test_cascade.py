@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import pypupilext as pp
+
+SIZE = (320, 240)
+
+
+def eyeFrame():
+    frame, _ = next(iter(pp.syntheticEyes(1, SIZE, seed=5)))
+    return frame
+
+
+def test_cascade_first_stage():
+    frame = eyeFrame()
+    pure = pp.PuRe()
+    cascade = pp.DetectorCascade()
+    cascade.addStage(pure, 0.66)
+    cascade.addStage(pp.ElSe(), 0.0)
+    assert cascade.stageCount() == 2
+    assert cascade.title() == 'Cascade PuRe > ElSe'
+
+    # a confident first stage skips the later stages
+    pupil = cascade.runWithConfidence(frame)
+    assert pupil.algorithmName == pure.title()
+    assert cascade.lastStage() == 0
+    assert cascade.stageRuns() == [1, 0]
+    assert cascade.stageResults() == [1, 0]
+
+    cascade.resetCounters()
+    assert cascade.stageRuns() == [0, 0]
+    assert cascade.stageResults() == [0, 0]
+
+
+def test_cascade_later_stage():
+    frame = eyeFrame()
+    # a maximum diameter far below the pupil makes the first stage miss
+    miss = pp.PuRe()
+    miss.maxPupilDiameterMM = 0.5
+    cascade = pp.DetectorCascade()
+    cascade.addStage(miss, 0.66)
+    cascade.addStage(pp.ElSe(), 0.0)
+
+    pupil = cascade.runWithConfidence(frame)
+    assert pupil.algorithmName == 'ElSe'
+    assert pupil.valid(-2)
+    assert cascade.lastStage() == 1
+    assert cascade.stageRuns() == [1, 1]
+    assert cascade.stageResults() == [0, 1]
+
+
+def test_cascade_best_below_threshold():
+    # no stage reaches its threshold, the most confident pupil of all stages is returned
+    frame = eyeFrame()
+    cascade = pp.DetectorCascade()
+    cascade.addStage(pp.PuRe(), 2.0)
+    cascade.addStage(pp.ElSe(), 2.0)
+    pupil = cascade.runWithConfidence(frame)
+    title, expected = max(((detector.title(), detector.runWithConfidence(frame)) for detector in (pp.PuRe(), pp.ElSe())),
+                          key=lambda result: result[1].outline_confidence)
+    assert pupil.algorithmName == title
+    assert pupil.outline_confidence == expected.outline_confidence
+    assert cascade.stageRuns() == [1, 1]
+
+
+def test_cascade_seeds_tracking_stage():
+    # PuReST misses the first frame itself and tracks the pupil of the later stage from then on
+    frame = eyeFrame()
+    purest = pp.PuReST()
+    purest.fullFrameFallback = False
+    purest.maxPupilDiameterMM = 0.5
+    cascade = pp.DetectorCascade()
+    cascade.addStage(purest, 0.66)
+    cascade.addStage(pp.PuRe(), 0.66)
+
+    assert cascade.runWithConfidence(frame).algorithmName == 'PuRe'
+    assert cascade.lastStage() == 1
+    pupil = cascade.runWithConfidence(frame)
+    assert pupil.algorithmName == purest.title()
+    assert purest.lastBranch() != pp.PuReST.Branch.Detection
+    assert cascade.stageRuns() == [2, 1]
+    assert cascade.stageResults() == [1, 1]
+
+
+def test_cascade_errors():
+    with pytest.raises(RuntimeError):
+        pp.DetectorCascade().runWithConfidence(eyeFrame())
+    with pytest.raises(ValueError):
+        pp.DetectorCascade().addStage(None, 0.5)
+    # blank frames run all stages without a result
+    cascade = pp.DetectorCascade()
+    cascade.addStage(pp.PuRe(), 0.66)
+    assert not cascade.runWithConfidence(np.full((SIZE[1], SIZE[0]), 180, np.uint8)).valid(-2)
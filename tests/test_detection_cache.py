@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+import pypupilext as pp
+from pypupilext.detection_cache import PUPIL_RECORD
+
+SIZE = (320, 240)
+
+
+@pytest.fixture
+def frames():
+    return [frame for frame, _ in pp.syntheticEyes(4, SIZE, seed=9)]
+
+
+def test_cached_detector_hits(tmp_path, frames):
+    path = str(tmp_path / 'cache.db')
+    pure = pp.PuRe()
+    detector = pp.CachedDetector(pure, path)
+    first = [detector.runWithConfidence(frame) for frame in frames]
+    second = [detector.runWithConfidence(frame) for frame in frames]
+    stats = detector.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (4, 4, 4)
+    assert stats['hitRate'] == 0.5
+    assert stats['bytes'] == 4 * PUPIL_RECORD.itemsize
+    assert [pupil.__getstate__() for pupil in second] == [pupil.__getstate__() for pupil in first]
+
+    # run and runWithConfidence are separate entries
+    detector.run(frames[0])
+    assert detector.cache.stats()['misses'] == 5
+
+    # entries are shared with other cache objects on the same database
+    with pp.DetectionCache(path) as cache:
+        other = pp.CachedDetector(pp.PuRe(), cache)
+        assert other.runWithConfidence(frames[1]).__getstate__() == first[1].__getstate__()
+        assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 0)
+
+
+def test_cache_key_parameters(tmp_path, frames):
+    cache = pp.DetectionCache(str(tmp_path / 'cache.db'))
+    pure = pp.PuRe()
+    key = cache.key(pure, frames[0])
+    assert cache.key(pure, frames[0].copy()) == key
+    assert cache.key(pure, frames[1]) != key
+    assert cache.key(pure, frames[0], 'run') != key
+    assert cache.key(pp.ElSe(), frames[0]) != key
+
+    # the profiler and the settings of the inactive latency target mode do not change the result
+    pure.profiler.enabled = True
+    pure.resolution.targetMs = 2.0
+    assert cache.key(pure, frames[0]) == key
+    pure.maxPupilDiameterMM = 6.0
+    assert cache.key(pure, frames[0]) != key
+
+    # parameters set through the wrapper change the key as well
+    detector = pp.CachedDetector(pp.PuRe(), cache)
+    detector.runWithConfidence(frames[0])
+    detector.maxPupilDiameterMM = 6.0
+    detector.runWithConfidence(frames[0])
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (0, 2)
+
+
+def test_cache_lru_eviction(tmp_path, frames):
+    # room for 5 records, evicted down to 90% of it
+    cache = pp.DetectionCache(str(tmp_path / 'cache.db'), max_bytes=5 * PUPIL_RECORD.itemsize)
+    pupil = pp.PuRe().runWithConfidence(frames[0])
+    keys = [bytes([i]) * 32 for i in range(6)]
+    for key in keys[:5]:
+        cache.put(key, pupil)
+    assert cache.stats()['evictions'] == 0
+    # the first entry is used again and therefore kept
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[5], pupil)
+
+    stats = cache.stats()
+    assert stats['evictions'] == 2
+    assert stats['entries'] == 4
+    assert stats['bytes'] <= 0.9 * cache.max_bytes
+    assert cache.get(keys[1]) is None and cache.get(keys[2]) is None
+    assert all(cache.get(key) is not None for key in (keys[0], keys[3], keys[4], keys[5]))
+
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_rejects_frame_dependent_detectors(tmp_path, frames):
+    cache = pp.DetectionCache(str(tmp_path / 'cache.db'))
+    with pytest.raises(ValueError):
+        cache.key(pp.PuReST(), frames[0])
+    with pytest.raises(ValueError):
+        pp.CachedDetector(pp.PuReST(), cache)
+
+    pure = pp.PuRe()
+    pure.resolution.enabled = True
+    with pytest.raises(ValueError):
+        pp.CachedDetector(pure, cache)
+
+    # trackers and cascades carry state between frames and have no pickle state
+    with pytest.raises(TypeError):
+        pp.CachedDetector(pp.PupilTracker(pp.PuRe()), cache)
+    with pytest.raises(TypeError):
+        pp.CachedDetector(pp.DetectorCascade(), cache)
@@ -0,0 +1,91 @@
+import copy
+import pickle
+
+import numpy as np
+import pytest
+
+import pypupilext as pp
+from pypupilext.parallel import map_frames
+
+# non-default values of the parameters of each detector
+PARAMETERS = {
+    'PuRe': {'meanCanthiDistanceMM': 30.0, 'maxPupilDiameterMM': 7.0, 'minPupilDiameterMM': 1.5, 'baseSize': (240, 180)},
+    'PuReST': {'maxPupilDiameterMM': 6.0, 'baseSize': (160, 120), 'fullFrameFallback': False},
+    'ElSe': {'minAreaRatio': 0.01, 'maxAreaRatio': 0.15, 'threads': 2},
+    'ExCuSe': {'max_ellipse_radi': 40, 'good_ellipse_threshold': 20, 'threads': 2},
+    'Starburst': {'edge_threshold': 30, 'rays': 24, 'min_feature_candidates': 8, 'corneal_reflection_ratio_to_image_size': 12,
+                  'crWindowSize': 251, 'ransac_seed': 7, 'ransac_confidence': 0.95, 'ransac_max_iterations': 500},
+    'Swirski2D': {},
+}
+
+
+def configured(name):
+    detector = getattr(pp, name)()
+    for attribute, value in PARAMETERS[name].items():
+        setattr(detector, attribute, value)
+    detector.profiler.enabled = True
+    detector.resolution.targetMs = 4.0
+    detector.resolution.minScale = 0.5
+    return detector
+
+
+@pytest.mark.parametrize('name', sorted(PARAMETERS))
+def test_detector_round_trip(name):
+    detector = configured(name)
+    for restored in (pickle.loads(pickle.dumps(detector)), copy.deepcopy(detector)):
+        assert type(restored) is type(detector)
+        assert pickle.dumps(restored) == pickle.dumps(detector)
+        for attribute, value in PARAMETERS[name].items():
+            assert getattr(restored, attribute) == pytest.approx(value)
+        assert restored.profiler.enabled
+        assert restored.resolution.targetMs == 4.0
+        assert restored.resolution.minScale == 0.5
+
+
+def test_tracker_params_round_trip():
+    detector = pp.Swirski2D()
+    detector.params.Radius_Max = 60
+    detector.params.CannyThreshold1 = 25.0
+    detector.params.EarlyRejection = False
+    detector.params.Seed = 3
+    restored = pickle.loads(pickle.dumps(detector))
+    assert restored.params.__getstate__() == detector.params.__getstate__()
+    assert (restored.params.Radius_Max, restored.params.Seed, restored.params.EarlyRejection) == (60, 3, False)
+
+
+def test_pupil_round_trip():
+    pupil = pp.PuRe().runWithConfidence(pp.syntheticFrame(0, (320, 240), 4.0, 0)[0])
+    pupil.eyelid = 0.5
+    pupil.physicalDiameter = 3.25
+    pupil.undistortedDiameter = 41.0
+    pupil.workingScale = 0.75
+    pupil.algorithmName = 'PuRe'
+    for restored in (pickle.loads(pickle.dumps(pupil)), copy.deepcopy(pupil)):
+        assert restored.__getstate__() == pupil.__getstate__()
+
+
+def test_stateful_objects_not_picklable():
+    for detector in (pp.PupilTracker(pp.PuRe()), pp.DetectorCascade()):
+        with pytest.raises(TypeError):
+            pickle.dumps(detector)
+
+
+def test_map_frames_matches_serial():
+    frames = np.stack([frame for frame, _ in pp.syntheticEyes(10, (320, 240), seed=7)])
+    detector = configured('PuRe')
+    pupils = map_frames(detector, frames, workers=2, chunksize=3)
+    serial = [detector.runWithConfidence(frame) for frame in frames]
+    assert [pupil.__getstate__() for pupil in pupils] == [pupil.__getstate__() for pupil in serial]
+
+
+def test_map_frames_sizes_and_tracking():
+    # frames of different sizes, and a tracking detector which starts over at every chunk
+    frames = [frame for frame, _ in pp.syntheticEyes(4, (320, 240), seed=7)]
+    frames += [frame for frame, _ in pp.syntheticEyes(4, (240, 180), seed=8)]
+    pupils = map_frames(pp.PuReST(), frames, workers=2, chunksize=4)
+    expected = []
+    for start in (0, 4):
+        purest = pp.PuReST()
+        expected += [purest.runWithConfidence(frame).center for frame in frames[start:start + 4]]
+    assert [pupil.center for pupil in pupils] == expected
+    assert map_frames(pp.PuRe(), [], workers=2) == []
@@ -0,0 +1,68 @@
+import numpy as np
+
+import pypupilext as pp
+
+
+def makePupil(i):
+    pupil = pp.Pupil()
+    pupil.center = (100.0 + i, 80.5 - i)
+    pupil.size = (30.0 + i, 20.0)
+    pupil.angle = 10.0 * i
+    pupil.confidence = 0.5
+    pupil.outline_confidence = 0.25 + 0.05 * i
+    pupil.physicalDiameter = 3.5
+    return pupil
+
+
+def test_binary_round_trip(tmp_path):
+    path = str(tmp_path / 'pupils.npy')
+    pupils = [makePupil(i) for i in range(10)]
+    writer = pp.BinaryDataWriter(path, 4)
+    for i, pupil in enumerate(pupils):
+        writer.appendPupilData(1000 + 33 * i, pupil)
+    writer.close()
+    assert writer.size() == 10
+
+    for mmap in (True, False):
+        data = pp.readPupilData(path, mmap=mmap)
+        assert len(data) == 10
+        np.testing.assert_array_equal(data['timestamp'], [1000 + 33 * i for i in range(10)])
+        np.testing.assert_allclose(data['center'], [[p.center[0], p.center[1]] for p in pupils])
+        np.testing.assert_allclose(data['width'], [p.width() for p in pupils])
+        np.testing.assert_allclose(data['height'], [p.height() for p in pupils])
+        np.testing.assert_allclose(data['diameter'], [p.diameter() for p in pupils])
+        np.testing.assert_allclose(data['circumference'], [p.circumference() for p in pupils], rtol=1e-6)
+        np.testing.assert_allclose(data['angle'], [p.angle for p in pupils])
+        np.testing.assert_allclose(data['outline_confidence'], [p.outline_confidence for p in pupils])
+        np.testing.assert_allclose(data['physicalDiameter'], 3.5)
+
+    # the header of a closed file holds the row count, numpy reads it as is
+    np.testing.assert_array_equal(np.load(path), pp.readPupilData(path, mmap=False))
+
+
+def test_binary_unclosed_writer(tmp_path):
+    # the row count in the header stays 0 until close, the rows of the flushed blocks are read anyway
+    path = str(tmp_path / 'unclosed.npy')
+    writer = pp.BinaryDataWriter(path, 4)
+    for i in range(10):
+        writer.appendPupilData(i, makePupil(i))
+    assert len(np.load(path)) == 0
+
+    data = pp.readPupilData(path)
+    np.testing.assert_array_equal(data['timestamp'], range(8))
+    writer.flush()
+    np.testing.assert_array_equal(pp.readPupilData(path, mmap=False)['timestamp'], range(10))
+
+    writer.close()
+    np.testing.assert_array_equal(np.load(path)['timestamp'], range(10))
+
+
+def test_write_pupil_data(tmp_path):
+    # writePupilData numbers the rows by their position
+    path = str(tmp_path / 'list.npy')
+    writer = pp.BinaryDataWriter(path)
+    writer.writePupilData([makePupil(i) for i in range(3)])
+    writer.close()
+    data = pp.readPupilData(path)
+    np.testing.assert_array_equal(data['timestamp'], [0, 1, 2])
+    np.testing.assert_allclose(data['angle'], [0, 10, 20])
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import pytest
+
+import pypupilext as pp
+
+
+async def burst(count, age=None):
+    # frames arriving faster than any detection: the source does not wait, so all of them are queued before the
+    # workers take the first one. age[i] seconds are subtracted from the capture time of frame i
+    for index in range(count):
+        frame, _ = pp.syntheticFrame(index, (320, 240), 4.0, 0)
+        if age is None:
+            yield frame
+        else:
+            yield frame, time.perf_counter() - age[index]
+
+
+async def collect(source, **kwargs):
+    return [result async for result in pp.stream(source, 'PuRe', **kwargs)]
+
+
+def test_stream_block():
+    results = asyncio.run(collect(burst(6), queue_size=2, policy='block'))
+    assert [result.index for result in results] == list(range(6))
+    assert all(result.dropped == 0 for result in results)
+    assert all(result.pupil.valid(-2) for result in results)
+    assert all(result.resultTime >= result.captureTime and result.latency >= 0 for result in results)
+
+
+def test_stream_drop_oldest():
+    results = asyncio.run(collect(burst(6), queue_size=2, policy='drop-oldest'))
+    assert [result.index for result in results] == [4, 5]
+    assert [result.dropped for result in results] == [4, 4]
+
+
+def test_stream_drop_newest():
+    results = asyncio.run(collect(burst(6), queue_size=2, policy='drop-newest'))
+    assert [result.index for result in results] == [0, 1]
+    assert [result.dropped for result in results] == [4, 4]
+
+
+def test_stream_latency_budget():
+    # frames captured a second ago exceed the budget when a worker takes them
+    age = [0, 1.0, 0, 1.0, 1.0, 0]
+    results = asyncio.run(collect(burst(6, age), queue_size=6, policy='block', latency_budget=500))
+    assert [result.index for result in results] == [0, 2, 5]
+    assert results[-1].dropped == 3
+
+
+def test_stream_workers_in_order():
+    results = asyncio.run(collect(burst(8), workers=2, queue_size=8, policy='block', params={'maxPupilDiameterMM': 7}))
+    assert [result.index for result in results] == list(range(8))
+    pure = pp.PuRe()
+    pure.maxPupilDiameterMM = 7
+    for result in results:
+        frame, _ = pp.syntheticFrame(result.index, (320, 240), 4.0, 0)
+        assert result.pupil.center == pure.runWithConfidence(frame).center
+
+
+def test_stream_early_break():
+    detector = pp.PuRe()
+
+    async def main():
+        results = pp.stream(pp.syntheticFrames(fps=0), detector, queue_size=2)
+        indices = []
+        async for result in results:
+            indices.append(result.index)
+            if len(indices) == 3:
+                break
+        # closing the stream stops the endless source and waits for running detections
+        await results.aclose()
+        return indices
+
+    indices = asyncio.run(main())
+    assert len(indices) == 3 and indices == sorted(indices)
+    # the detector is free again once the stream is closed
+    assert detector.runWithConfidence(pp.syntheticFrame(0, (320, 240), 4.0, 0)[0]).valid(-2)
+
+
+def test_stream_arguments():
+    with pytest.raises(ValueError):
+        asyncio.run(collect(burst(1), policy='drop-all'))
+    with pytest.raises(ValueError):
+        asyncio.run(collect(burst(1), queue_size=0))
+    with pytest.raises(ValueError):
+        asyncio.run(collect(burst(1), workers=0))
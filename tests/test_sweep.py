@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import pypupilext as pp
+
+GRIDS = {
+    'PuRe': {'maxPupilDiameterMM': [5.0, 8.0], 'minPupilDiameterMM': [1.0, 2.5]},
+    'ElSe': {'minAreaRatio': [0.005, 0.02], 'maxAreaRatio': [0.02, 0.1]},
+    'ExCuSe': {'max_ellipse_radi': [20, 50], 'good_ellipse_threshold': [15, 1000]},
+}
+
+
+@pytest.fixture(scope='module')
+def frames():
+    return np.stack([frame for frame, _ in pp.syntheticEyes(6, (320, 240), seed=11)])
+
+
+@pytest.mark.parametrize('method', sorted(GRIDS))
+@pytest.mark.parametrize('workers', [1, 2])
+def test_shared_stages_match_detect_batch(frames, method, workers):
+    # the stages shared between configurations give the same pupils as a standalone detector of each configuration
+    rows = pp.sweepParameters(method, frames, GRIDS[method], workers=workers, share_stages=True, keep_pupils=True)
+    assert [{name: row[name] for name in GRIDS[method]} for row in rows] == pp.parameterGrid(GRIDS[method])
+    # the grids include configurations with different results
+    assert len({row['pupils'].tobytes() for row in rows}) > 1
+
+    for row in rows:
+        detector = getattr(pp, method)()
+        for name in GRIDS[method]:
+            setattr(detector, name, row[name])
+        np.testing.assert_array_equal(row['pupils'], detector.detect_batch(frames))
+
+
+def test_shared_stages_match_unshared(frames):
+    shared = pp.sweepParameters('PuRe', frames, GRIDS['PuRe'], workers=1, share_stages=True, keep_pupils=True)
+    unshared = pp.sweepParameters('PuRe', frames, GRIDS['PuRe'], workers=1, share_stages=False, keep_pupils=True)
+    for a, b in zip(shared, unshared):
+        np.testing.assert_array_equal(a['pupils'], b['pupils'])
+        assert a['detected'] == b['detected'] and a['confidence'] == b['confidence']
+
+
+def test_sweep_rejects_tracking_detector(frames):
+    with pytest.raises(ValueError):
+        pp.sweepParameters('PuReST', frames, {'maxPupilDiameterMM': [5.0, 8.0]})
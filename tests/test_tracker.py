@@ -0,0 +1,59 @@
+import numpy as np
+
+import pypupilext as pp
+
+SIZE = (320, 240)
+
+
+def expectedWindow(tracker, pupil, misses):
+    # square around the last confident pupil, grown per miss and clipped to the frame
+    side = max(tracker.roiScale * pupil.majorAxis(), tracker.minRoiSize) * tracker.roiGrowth ** misses
+    half = int(round(0.5 * side))
+    x, y = int(round(pupil.center[0])) - half, int(round(pupil.center[1])) - half
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + 2 * half, SIZE[0]), min(y + 2 * half, SIZE[1])
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def test_tracker_counters_and_window():
+    tracker = pp.PupilTracker(pp.PuRe())
+    tracker.maxMisses = 3
+    assert not tracker.isTracking()
+    assert tracker.searchWindow(SIZE) == (0, 0) + SIZE
+
+    for frame, truth in pp.syntheticEyes(4, SIZE, seed=5):
+        pupil = tracker.runWithConfidence(frame)
+        assert pupil.outline_confidence >= tracker.minConfidence
+        assert np.hypot(pupil.center[0] - truth[0][0], pupil.center[1] - truth[0][1]) < 5
+        assert tracker.isTracking()
+        assert tracker.searchWindow(SIZE) == expectedWindow(tracker, pupil, 0)
+    assert (tracker.hitCount(), tracker.missCount(), tracker.resetCount()) == (4, 0, 0)
+
+    # frames without a pupil grow the window around the last pupil until maxMisses is reached
+    blank = np.full((SIZE[1], SIZE[0]), 180, np.uint8)
+    for misses in range(1, tracker.maxMisses):
+        assert not tracker.runWithConfidence(blank).valid(-2)
+        assert tracker.isTracking()
+        assert tracker.searchWindow(SIZE) == expectedWindow(tracker, pupil, misses)
+    assert (tracker.hitCount(), tracker.missCount(), tracker.resetCount()) == (4, 2, 0)
+
+    tracker.runWithConfidence(blank)
+    assert not tracker.isTracking()
+    assert tracker.searchWindow(SIZE) == (0, 0) + SIZE
+    assert (tracker.hitCount(), tracker.missCount(), tracker.resetCount()) == (4, 3, 1)
+
+    # misses without a tracked pupil do not reset again
+    tracker.runWithConfidence(blank)
+    assert (tracker.hitCount(), tracker.missCount(), tracker.resetCount()) == (4, 4, 1)
+
+
+def test_tracker_reset():
+    tracker = pp.PupilTracker(pp.PuRe())
+    frame, _ = next(iter(pp.syntheticEyes(1, SIZE, seed=5)))
+    tracker.runWithConfidence(frame)
+    assert tracker.isTracking()
+    tracker.reset()
+    assert not tracker.isTracking()
+    assert tracker.searchWindow(SIZE) == (0, 0) + SIZE
+    assert tracker.runWithConfidence(frame).outline_confidence >= tracker.minConfidence
+    assert (tracker.hitCount(), tracker.missCount(), tracker.resetCount()) == (2, 0, 0)
@@ -0,0 +1,57 @@
+import csv
+
+import cv2
+import pytest
+
+import pypupilext as pp
+
+FRAMES = 8
+
+
+@pytest.fixture(scope='module')
+def video(tmp_path_factory):
+    # short video of synthetic eye images
+    path = str(tmp_path_factory.mktemp('video') / 'eyes.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (320, 240), False)
+    assert writer.isOpened()
+    for frame, _ in pp.syntheticEyes(FRAMES, (320, 240), seed=3):
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def readRows(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_process_video_frame_order(video, tmp_path):
+    out = str(tmp_path / 'pupils.csv')
+    assert pp.process_video(video, 'PuRe', None, out) == FRAMES
+    rows = readRows(out)
+    assert [int(row['filename']) for row in rows] == list(range(FRAMES))
+    timestamps = [float(row['timestamp[ms]']) for row in rows]
+    assert timestamps == sorted(timestamps)
+    assert all(float(row['outline_confidence']) > 0 for row in rows)
+
+
+def test_process_video_range(video, tmp_path):
+    out = str(tmp_path / 'range.csv')
+    assert pp.process_video(video, 'PuRe', None, out, first_frame=3, frame_count=4, warmup=2) == 4
+    assert [int(row['filename']) for row in readRows(out)] == [3, 4, 5, 6]
+
+
+def test_process_video_threads(video, tmp_path):
+    # frames detected by several detector instances are written in the same order and with the same results
+    serial = str(tmp_path / 'serial.csv')
+    threaded = str(tmp_path / 'threaded.csv')
+    params = {'maxPupilDiameterMM': 7}
+    assert pp.process_video(video, pp.PuRe, params, serial, threads=1) == FRAMES
+    assert pp.process_video(video, pp.PuRe, params, threaded, threads=2) == FRAMES
+    assert readRows(threaded) == readRows(serial)
+
+
+def test_process_video_tracking_single_thread(video, tmp_path):
+    with pytest.raises(ValueError):
+        pp.process_video(video, 'PuReST', None, str(tmp_path / 'purest.csv'), threads=2)
+    assert pp.process_video(video, 'PuReST', None, str(tmp_path / 'purest.csv'), threads=1) == FRAMES